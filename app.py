@@ -1,5 +1,7 @@
 from router import route
+from rag.engine import get_engine
 import json
+get_engine().warm_up()
 print('KIT719 QA System – Member C')
 while True:
  q=input('\nYou> ').strip()
@@ -7,13 +7,20 @@ os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
 import gradio as gr
 
-from router import route
+from rag.engine import get_engine
+from router import aroute_stream
 
+NO_TOOL = "<no tool output>"
 
-def ask(q: str):
-    if not q.strip():
-        return "Please enter a question.", "", "", ""
-    r = route(q.strip())
+
+def _format_citations(cs) -> str:
+    return "\n".join(
+        f'[{i+1}] {(c.get("source") or c.get("role_title"))} (chunk {c.get("chunk_id")}): {c.get("preview","")}'
+        for i, c in enumerate(cs or [])
+    )
+
+
+def _format_result(r) -> tuple:
     route_txt = f'Route: {r.get("route","<unknown>")}'
     rag_ans = ""
     cits = ""
@@ -21,18 +28,43 @@ def ask(q: str):
     if "rag" in r:
         rag = r["rag"] or {}
         rag_ans = rag.get("answer", "")
-        cs = rag.get("citations", [])
-        if cs:
-            lines = [
-                f'[{i+1}] {(c.get("source") or c.get("role_title"))} (chunk {c.get("chunk_id")}): {c.get("preview","")}'
-                for i, c in enumerate(cs)
-            ]
-            cits = "\n".join(lines)
+        cits = _format_citations(rag.get("citations", []))
     if "tool" in r:
         tool_json = json.dumps(r["tool"], indent=2)
     if "tools" in r:
         tool_json = json.dumps(r["tools"], indent=2)
-    return route_txt, rag_ans, cits, tool_json or "<no tool output>"
+    return route_txt, rag_ans, cits, tool_json or NO_TOOL
+
+
+async def ask(q: str):
+    """
+    Streams into the four boxes as the route progresses: routing first, then
+    citations when retrieval returns, the composed answer, and the salary
+    tool output whenever that branch finishes.
+    """
+    if not q.strip():
+        yield "Please enter a question.", "", "", ""
+        return
+    route_txt, rag_ans, cits, tool_json = "Routing…", "", "", ""
+    yield route_txt, rag_ans, cits, tool_json
+    async for event, payload in aroute_stream(q.strip()):
+        if event == "route":
+            route_txt = f'Route: {payload.get("route") or "<unknown>"}'
+            if payload.get("route") in {"rag", "both"}:
+                rag_ans = "Retrieving…"
+            if payload.get("route") in {"salary", "both"}:
+                tool_json = "Looking up salary data…"
+        elif event == "citations":
+            cits = _format_citations(payload)
+            rag_ans = "Composing answer…"
+        elif event == "rag":
+            rag_ans = payload.get("answer", "")
+            cits = _format_citations(payload.get("citations", [])) or cits
+        elif event == "tool":
+            tool_json = json.dumps(payload, indent=2)
+        elif event == "done":
+            route_txt, rag_ans, cits, tool_json = _format_result(payload)
+        yield route_txt, rag_ans, cits, tool_json
 
 
 with gr.Blocks(title="KIT719 QA System – Member C") as demo:
@@ -48,4 +80,9 @@ with gr.Blocks(title="KIT719 QA System – Member C") as demo:
     btn.click(fn=ask, inputs=[q], outputs=[route_box, rag_box, cits_box, tool_box])
     q.submit(fn=ask, inputs=[q], outputs=[route_box, rag_box, cits_box, tool_box])
 if __name__ == "__main__":
-    demo.launch(server_name="127.0.0.1", server_port=7860)
+    # load the embedding model / open Chroma once, before the first question
+    engine = get_engine()
+    if not engine.warm_up():
+        print("Vector retrieval unavailable, using BM25 fallback:", engine.error)
+    # generators stream through the queue
+    demo.queue().launch(server_name="127.0.0.1", server_port=7860)
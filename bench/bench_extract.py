@@ -0,0 +1,44 @@
+# bench/bench_extract.py — per-chunk cost of rag.generate.extract_bullets
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.bm25_index import DATA_FILE, split_role_chunks
+from rag.generate import extract_bullets, make_answer_from_hits, pack_bullets
+
+
+def time_per_call(fn, items, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for it in items:
+            fn(it)
+        best = min(best, time.perf_counter() - t0)
+    return best / max(1, len(items))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args(argv)
+
+    with open(DATA_FILE, encoding="utf-8") as f:
+        chunks = split_role_chunks(f.read())
+    lines = sum(len(c.splitlines()) for c in chunks)
+    hits = [{"doc": c, "meta": {"source": "bench", "chunk_id": i}} for i, c in enumerate(chunks[:4])]
+    indexed = [dict(h, meta=dict(h["meta"], bullets=pack_bullets(extract_bullets(h["doc"])))) for h in hits]
+
+    per_chunk = time_per_call(extract_bullets, chunks, args.repeat)
+    per_answer = time_per_call(make_answer_from_hits, [hits], args.repeat)
+    per_indexed = time_per_call(make_answer_from_hits, [indexed], args.repeat)
+    print(f"chunks: {len(chunks)} ({lines} lines)")
+    print(f"extract_bullets:       {per_chunk * 1e6:8.1f} us/chunk")
+    print(f"make_answer_from_hits: {per_answer * 1e6:8.1f} us/answer (4 hits)")
+    print(f"  with indexed bullets: {per_indexed * 1e6:8.1f} us/answer (4 hits)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+# bench/bench_stages.py — per-stage latency/memory benchmark over real and synthetic corpora
+"""
+Times each pipeline stage over the ground-truth question sets and writes one
+JSON report (p50/p95/p99 in ms, peak traced memory in MB per stage).
+
+    python bench/bench_stages.py                          # all stages, scales 1,10,100,1000
+    python bench/bench_stages.py --stages bm25_build bm25_query --scales 1 10
+    python bench/bench_stages.py --compare bench/results/old.json   # exit 1 on p95 regressions
+
+Synthetic corpora are built by copying the OSCA role blocks with new codes,
+renamed titles and shuffled/mutated bullets. Vector search, answer_with_rag and
+router.route only run against the real index, because embedding a 1000x
+corpus is an ingest job, not something to benchmark here.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.bm25_index import DATA_FILE, PROJECT_DIR, build_bm25_index, split_role_chunks
+from rag.config import CONFIG_PATH, read_settings
+from rag.generate import extract_bullets
+
+GT_DIR = os.path.join(PROJECT_DIR, "ground_truth")
+RESULTS_DIR = os.path.join(PROJECT_DIR, "bench", "results")
+
+STAGES = ["config_load", "bm25_build", "bm25_query", "vector_query", "extract_bullets",
+          "answer_with_rag", "route"]
+SCALED = {"bm25_build", "bm25_query", "extract_bullets"}
+
+
+def load_queries():
+    with open(os.path.join(GT_DIR, "baseline.json"), encoding="utf-8") as f:
+        qs = [json.loads(b)["question"] for b in re.split(r"\n\s*\n", f.read()) if b.strip()]
+    for name in ("baseline_tool.json", "difficult_tool.json"):
+        with open(os.path.join(GT_DIR, name), encoding="utf-8") as f:
+            qs += [c["question"] for c in json.load(f)]
+    return qs
+
+
+# --- synthetic corpora -------------------------------------------------------
+
+_CODE = re.compile(r"^(\s*(?:-\s*)?)(\d{6})(\s+)(.+)$", re.M)
+_FILLERS = ["and", "the", "for", "with", "to", "of"]
+
+
+def _mutate_block(block: str, code: int, variant: int, rng: random.Random) -> str:
+    lines = _CODE.sub(lambda m: f"{m.group(1)}{code:06d}{m.group(3)}{m.group(4)} {variant}", block, count=1)
+    lines = lines.split("\n")
+    bullets = [i for i, ln in enumerate(lines) if ln.lstrip().startswith("*")]
+    order = bullets[:]
+    rng.shuffle(order)
+    out = list(lines)
+    for dst, src in zip(bullets, order):
+        words = lines[src].split()
+        if len(words) > 4:  # drop one filler word or swap two neighbours
+            j = rng.randrange(2, len(words) - 1)
+            if words[j] in _FILLERS:
+                del words[j]
+            else:
+                words[j - 1], words[j] = words[j], words[j - 1]
+        out[dst] = " ".join(words)
+    return "\n".join(out)
+
+
+def synth_corpus(text: str, factor: int, seed: int = 0) -> str:
+    """`factor` copies of the role blocks; copy 0 is the original text."""
+    if factor <= 1:
+        return text
+    rng = random.Random(seed)
+    blocks = split_role_chunks(text)
+    parts, code = [text], 100000
+    for variant in range(1, factor):
+        for b in blocks:
+            parts.append(_mutate_block(b, code, variant, rng))
+            code = code + 1 if code < 999999 else 100000
+    return "\n\n".join(parts)
+
+
+# --- measurement -------------------------------------------------------------
+
+def _summary(samples_s, peak_bytes=None):
+    ms = np.asarray(samples_s, dtype=np.float64) * 1000.0
+    out = {
+        "n": int(ms.size),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "mean_ms": round(float(ms.mean()), 4),
+    }
+    if peak_bytes is not None:
+        out["peak_mb"] = round(peak_bytes / 2**20, 3)
+    return out
+
+
+def measure(fn, items, repeat: int = 1, warmup: int = 1):
+    """
+    Latency per call over `items` x `repeat`, then one extra traced pass for
+    peak memory (tracemalloc slows calls down, so it never overlaps timing).
+    """
+    items = list(items)
+    for it in items[:warmup]:
+        fn(it)
+    samples = []
+    for _ in range(repeat):
+        for it in items:
+            t0 = time.perf_counter()
+            fn(it)
+            samples.append(time.perf_counter() - t0)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        for it in items:
+            fn(it)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return _summary(samples, peak)
+
+
+def _max_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+# --- stages ------------------------------------------------------------------
+
+def run_stages(stages, scales, queries, repeat, seed):
+    report = {}
+    with open(DATA_FILE, encoding="utf-8") as f:
+        text = f.read()
+
+    if "config_load" in stages:
+        report["config_load"] = measure(lambda _: read_settings(CONFIG_PATH), range(20), repeat)
+
+    with tempfile.TemporaryDirectory(prefix="bench_corpus_") as tmp:
+        for scale in scales:
+            if not SCALED & set(stages):
+                break
+            path = os.path.join(tmp, f"osca_x{scale}.utf8.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(synth_corpus(text, scale, seed))
+            key = f"x{scale}"
+            build_repeat = 1 if scale >= 100 else repeat
+            if "bm25_build" in stages:
+                r = measure(build_bm25_index, [path], build_repeat, warmup=0)
+                r["corpus_mb"] = round(os.path.getsize(path) / 2**20, 3)
+                report.setdefault("bm25_build", {})[key] = r
+            index = build_bm25_index(path)
+            report.setdefault("corpus_chunks", {})[key] = len(index["chunks"])
+            if "bm25_query" in stages:
+                bm, k = index["bm25"], 12
+                report.setdefault("bm25_query", {})[key] = measure(
+                    lambda q: bm.top_k(q.split(), k), queries, repeat)
+            if "extract_bullets" in stages:
+                chunks = index["chunks"][: 2000]
+                report.setdefault("extract_bullets", {})[key] = measure(extract_bullets, chunks, 1)
+            del index
+            gc.collect()
+
+    if "vector_query" in stages:
+        report["vector_query"] = _guarded(_vector_stage, queries, repeat)
+    if "answer_with_rag" in stages:
+        from tools.rag_tool import answer_with_rag
+
+        report["answer_with_rag"] = _guarded(lambda qs, r: measure(answer_with_rag, qs, r), queries, repeat)
+    if "route" in stages:
+        report["route"] = _guarded(_route_stage, queries, repeat)
+    return report
+
+
+def _guarded(stage, queries, repeat):
+    try:
+        return stage(queries, repeat)
+    except Exception as e:  # missing index / model / network: report, keep going
+        return {"error": f"{type(e).__name__}: {e}"}
+
+
+def _vector_stage(queries, repeat):
+    from rag.engine import get_engine
+    from rag.search import load_cfg, vector_search
+
+    engine = get_engine()
+    if not engine.warm_up():
+        raise RuntimeError(engine.error or "retrieval engine not ready")
+    col, k = engine.collection(), load_cfg().top_k
+    out = {"embed+query": measure(lambda q: vector_search(col, q, k), queries, repeat)}
+    engine.embed(queries)  # memoized: what's left is the Chroma query itself
+    out["query_only"] = measure(lambda q: vector_search(col, q, k, engine.embed([q])[0]), queries, repeat)
+    return out
+
+
+def _route_stage(queries, repeat):
+    import router
+
+    def cold(q):
+        cache = router.answer_cache()
+        if cache is not None:
+            cache.clear()
+        return router.route(q)
+
+    out = {"cold": measure(cold, queries, repeat)}
+    if router.answer_cache() is not None:
+        for q in queries:
+            router.route(q)
+        out["cached"] = measure(router.route, queries, repeat)
+    return out
+
+
+# --- comparison --------------------------------------------------------------
+
+def _flatten(node, prefix=""):
+    for k, v in node.items():
+        if isinstance(v, dict) and "p95_ms" in v:
+            yield f"{prefix}{k}", v
+        elif isinstance(v, dict):
+            yield from _flatten(v, f"{prefix}{k}.")
+
+
+def compare(old, new, tolerance: float):
+    """Stages whose p95 grew by more than `tolerance` (a ratio, e.g. 1.25)."""
+    before = dict(_flatten(old.get("stages", {})))
+    regressions = []
+    for name, cur in _flatten(new.get("stages", {})):
+        prev = before.get(name)
+        if prev and prev["p95_ms"] > 0 and cur["p95_ms"] > prev["p95_ms"] * tolerance:
+            regressions.append((name, prev["p95_ms"], cur["p95_ms"]))
+    return regressions
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Per-stage latency benchmark.")
+    ap.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    ap.add_argument("--scales", nargs="+", type=int, default=[1, 10, 100, 1000])
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", help="report path (default bench/results/stages-<time>.json)")
+    ap.add_argument("--compare", help="earlier report; exit 1 if a p95 regressed")
+    ap.add_argument("--tolerance", type=float, default=1.25)
+    args = ap.parse_args(argv)
+
+    queries = load_queries()
+    t0 = time.perf_counter()
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "queries": len(queries),
+        "repeat": args.repeat,
+        "scales": args.scales,
+        "stages": run_stages(set(args.stages), args.scales, queries, args.repeat, args.seed),
+    }
+    report["max_rss_mb"] = _max_rss_mb()
+    report["wall_s"] = round(time.perf_counter() - t0, 2)
+
+    out = args.out or os.path.join(RESULTS_DIR, time.strftime("stages-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    for name, s in _flatten(report["stages"]):
+        print(f"{name:32s} p50 {s['p50_ms']:9.3f}  p95 {s['p95_ms']:9.3f}  p99 {s['p99_ms']:9.3f} ms"
+              f"  peak {s.get('peak_mb', 0):8.2f} MB")
+    for name, v in report["stages"].items():
+        if isinstance(v, dict) and "error" in v:
+            print(f"{name:32s} skipped: {v['error']}")
+    print(f"max RSS {report['max_rss_mb']} MB, {report['wall_s']}s -> {out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        for name, a, b in regressions:
+            print(f"REGRESSION {name}: p95 {a:.3f} -> {b:.3f} ms")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
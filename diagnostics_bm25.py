@@ -1,10 +1,12 @@
 import os
 import re
 
-from rag.search import DATA_FILE, _load_bm25_corpus
+from rag.bm25_index import DATA_FILE, INDEX_FILE, get_bm25_index
 
 print("BM25 data file:", DATA_FILE)
-raw_chunks, bm = _load_bm25_corpus()
+index = get_bm25_index(DATA_FILE)
+raw_chunks, bm = index["chunks"], index["bm25"]
+print("BM25 index file:", INDEX_FILE, f"(sha256 {index['sha256'][:12]})")
 print("Total chunks:", len(raw_chunks))
 
 # Show a couple of chunks that contain "ICT Business Analyst" and "Main tasks"
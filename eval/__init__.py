@@ -0,0 +1 @@
+# eval
@@ -0,0 +1,335 @@
+# eval/evaluate.py — parallel evaluation over the ground-truth sets, with an answer cache
+"""
+    python -m eval.evaluate                                   # all ground_truth sets
+    python -m eval.evaluate --threshold 70 --cit-threshold 85 # rescoring only: answers come from the cache
+    python -m eval.evaluate --workers 8 --json report.json
+    python -m eval.evaluate --no-cache                        # force fresh answers
+
+Cases with gold_citation / gold_answer (baseline.json) go through
+answer_with_rag; cases with expected_route (the *_tool.json sets) go through
+router.route with its answer cache bypassed. Answers are cached on disk per
+(question, index version, code version), so only a re-ingest, a config change
+under rag:/models: (plus routing:, tools.salary_tool and cache: for route
+cases) or an edit to rag/, tools/ or router.py re-runs them.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import string
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from rag import bm25_index, roles
+from rag.config import PROJECT_DIR, get_config
+
+try:
+    from rapidfuzz import fuzz, process
+    USE_RF = True
+except Exception:
+    USE_RF = False
+
+GT_DIR = os.path.join(PROJECT_DIR, "ground_truth")
+DEFAULT_SETS = [os.path.join(GT_DIR, n) for n in ("baseline.json", "baseline_tool.json", "difficult_tool.json")]
+CACHE_PATH = os.path.join(PROJECT_DIR, "index", "eval_cache.sqlite3")
+CODE_DIRS = ("rag", "tools")
+CODE_FILES = ("router.py",)
+
+ROUTES = {"tool:salary": "salary", "tool:both": "both", "rag": "rag"}
+
+
+# --- cases -------------------------------------------------------------------
+
+def _read_records(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8-sig") as f:
+        text = f.read()
+    try:
+        data = json.loads(text)
+        return data if isinstance(data, list) else [data]
+    except ValueError:
+        pass
+    # baseline.json: JSON objects separated by blank lines; *.jsonl: one per line
+    sep = r"\n" if path.endswith(".jsonl") else r"\n\s*\n"
+    return [json.loads(b) for b in re.split(sep, text) if b.strip() and not b.lstrip().startswith("#")]
+
+
+def load_cases(paths: List[str]) -> List[Dict[str, Any]]:
+    cases = []
+    for path in paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        for i, rec in enumerate(_read_records(path), 1):
+            case = dict(rec)
+            case["id"] = rec.get("qid") or f"{stem}:{i}"
+            case["kind"] = "route" if "expected_route" in rec else "rag"
+            cases.append(case)
+    return cases
+
+
+# --- versions / cache ----------------------------------------------------------
+
+# config sections a case's answer depends on, besides the index itself
+VERSION_SECTIONS = {
+    "rag": (("rag",), ("models", "embeddings")),
+    "route": (("rag",), ("models", "embeddings"), ("routing",), ("tools", "salary_tool"), ("cache",)),
+}
+
+
+def index_version(cfg=None, kind: str = "rag") -> str:
+    """Changes when the corpus, an index format, or config the `kind` of case depends on changes."""
+    cfg = cfg or get_config()
+    h = hashlib.sha256()
+    h.update(bm25_index.file_sha256(bm25_index.DATA_FILE).encode())
+    h.update(f"bm25:{bm25_index.INDEX_VERSION};roles:{roles.INDEX_VERSION}".encode())
+    index_dir = cfg.index_dir if os.path.isabs(cfg.index_dir) else os.path.join(PROJECT_DIR, cfg.index_dir)
+    db = os.path.join(index_dir, "chroma.sqlite3")
+    if os.path.exists(db):
+        st = os.stat(db)
+        h.update(f"chroma:{st.st_mtime_ns}:{st.st_size}".encode())
+    if cfg.vector_provider == "flat":
+        from rag.flat_index import index_dir as flat_dir
+
+        manifest = os.path.join(flat_dir(cfg), "manifest.json")
+        if os.path.exists(manifest):
+            st = os.stat(manifest)
+            h.update(f"flat:{st.st_mtime_ns}:{st.st_size}".encode())
+    for sec in VERSION_SECTIONS[kind]:
+        h.update(json.dumps(cfg.section(*sec), sort_keys=True, default=str).encode())
+    return h.hexdigest()[:16]
+
+
+def code_version() -> str:
+    """Content hash of the answering code (uncommitted edits count)."""
+    h = hashlib.sha256()
+    files = [os.path.join(PROJECT_DIR, f) for f in CODE_FILES]
+    for d in CODE_DIRS:
+        for root, _, names in os.walk(os.path.join(PROJECT_DIR, d)):
+            files += [os.path.join(root, n) for n in names if n.endswith(".py")]
+    for path in sorted(files):
+        h.update(os.path.relpath(path, PROJECT_DIR).encode())
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+class AnswerStore:
+    """SQLite (key -> answer, latency); one connection per call, like tools/salary_cache."""
+
+    def __init__(self, path: str = CACHE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        con = self._connect()
+        try:
+            with con:
+                con.execute(
+                    "CREATE TABLE IF NOT EXISTS answers ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, latency_s REAL NOT NULL)"
+                )
+        finally:
+            con.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5.0)
+
+    @staticmethod
+    def key(kind: str, question: str, index_ver: str, code_ver: str) -> str:
+        return hashlib.sha256("\0".join((kind, question, index_ver, code_ver)).encode()).hexdigest()
+
+    def get(self, key: str):
+        con = self._connect()
+        try:
+            row = con.execute("SELECT value, latency_s FROM answers WHERE key = ?", (key,)).fetchone()
+        finally:
+            con.close()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def put(self, key: str, value: Dict[str, Any], latency_s: float) -> None:
+        con = self._connect()
+        try:
+            with con:
+                con.execute("INSERT OR REPLACE INTO answers (key, value, latency_s) VALUES (?, ?, ?)",
+                            (key, json.dumps(value, default=str), latency_s))
+        finally:
+            con.close()
+
+
+# --- running -------------------------------------------------------------------
+
+def _answer(case: Dict[str, Any]) -> Dict[str, Any]:
+    if case["kind"] == "rag":
+        from tools.rag_tool import answer_with_rag
+
+        res = answer_with_rag(case["question"]) or {}
+        return {"route": "rag", "answer": res.get("answer", ""), "citations": res.get("citations", []),
+                "error": res.get("error")}
+    from router import route
+
+    res = route(case["question"], trace=False, cache=False)
+    tool = res.get("tool") or (res.get("tools") or [{}])[0]
+    output = tool.get("output") or {}
+    # a failed live lookup is an error too, so it is retried instead of cached
+    return {"route": res.get("route"), "answer": (res.get("rag") or {}).get("answer", ""),
+            "estimate_aud": output.get("estimate_aud"),
+            "error": res.get("error") or res.get("rag_error") or tool.get("error") or output.get("error")}
+
+
+def run_case(case: Dict[str, Any], store: Optional[AnswerStore], index_ver: str, code_ver: str) -> Dict[str, Any]:
+    key = AnswerStore.key(case["kind"], case["question"], index_ver, code_ver)
+    hit = store.get(key) if store is not None else None
+    if hit is not None:
+        out, latency = hit
+        return dict(out, latency_s=latency, cached=True)
+    t0 = time.perf_counter()
+    out = _answer(case)
+    latency = time.perf_counter() - t0
+    if store is not None and not out.get("error"):
+        store.put(key, out, latency)
+    return dict(out, latency_s=latency, cached=False)
+
+
+# --- scoring -------------------------------------------------------------------
+
+def _strip_references(text: str) -> str:
+    return (text or "").split("References:")[0]
+
+
+_PUNCT = str.maketrans("", "", string.punctuation)
+
+
+def normalize(s: str) -> str:
+    s = (s or "").lower().translate(_PUNCT)
+    return re.sub(r"\s+", " ", s).strip()
+
+
+def _pairwise(scorer, preds: List[str], golds: List[str]) -> np.ndarray:
+    """scorer(preds[i], golds[i]) for all i in one vectorized rapidfuzz call."""
+    if not preds:
+        return np.zeros(0)
+    cpdist = getattr(process, "cpdist", None)  # rapidfuzz >= 3.6: pairwise cdist
+    if cpdist is not None:
+        return np.asarray(cpdist(preds, golds, scorer=scorer, workers=-1), dtype=np.float64)
+    return np.diagonal(process.cdist(preds, golds, scorer=scorer, workers=-1)).astype(np.float64)
+
+
+def answer_scores(answers: List[str], golds: List[str]) -> np.ndarray:
+    preds = [normalize(_strip_references(a)) for a in answers]
+    golds = [normalize(g) for g in golds]
+    empty = np.array([not p or not g for p, g in zip(preds, golds)], dtype=bool)
+    if USE_RF:
+        scores = (0.7 * _pairwise(fuzz.partial_token_set_ratio, preds, golds)
+                  + 0.3 * _pairwise(fuzz.token_set_ratio, preds, golds)).astype(int)
+    else:
+        scores = np.array([100 if all(w in set(p.split()) for w in g.split()[:8]) else 0
+                           for p, g in zip(preds, golds)], dtype=int)
+    scores[empty] = 0
+    return scores
+
+
+def citation_scores(answers: List[str], golds: List[str]) -> np.ndarray:
+    preds = [normalize(a) for a in answers]
+    golds = [normalize(g) for g in golds]
+    empty = np.array([not p or not g for p, g in zip(preds, golds)], dtype=bool)
+    if USE_RF:
+        scores = _pairwise(fuzz.partial_ratio, preds, golds).astype(int)
+    else:
+        scores = np.array([100 if all(w in p for w in g.split()[:8]) else 0
+                           for p, g in zip(preds, golds)], dtype=int)
+    scores[empty] = 0
+    return scores
+
+
+def _percentiles(latencies: List[float]) -> Dict[str, Any]:
+    if not latencies:
+        return {"n": 0}
+    ms = np.asarray(latencies) * 1000.0
+    return {"n": int(ms.size), **{f"p{p}_ms": round(float(np.percentile(ms, p)), 2) for p in (50, 95, 99)},
+            "mean_ms": round(float(ms.mean()), 2)}
+
+
+def score(cases, results, threshold: int = 74, cit_threshold: int = 80) -> Dict[str, Any]:
+    rag = [i for i, c in enumerate(cases) if c["kind"] == "rag"]
+    ans = answer_scores([results[i]["answer"] for i in rag], [cases[i].get("gold_answer", "") for i in rag])
+    cit = citation_scores([results[i]["answer"] for i in rag], [cases[i].get("gold_citation", "") for i in rag])
+    for j, i in enumerate(rag):
+        results[i].update(answer_score=int(ans[j]), answer_ok=bool(ans[j] >= threshold),
+                          citation_score=int(cit[j]), citation_ok=bool(cit[j] >= cit_threshold))
+    routed = [i for i, c in enumerate(cases) if c["kind"] == "route"]
+    for i in routed:
+        want = cases[i]["expected_route"]
+        results[i]["route_ok"] = results[i]["route"] == ROUTES.get(want, want)
+
+    live = [r for r in results if not r["cached"]]
+    by_route: Dict[str, List[float]] = {}
+    for r in results:
+        by_route.setdefault(r["route"] or "error", []).append(r["latency_s"])
+    return {
+        "cases": len(cases),
+        "citations_ok": int(sum(results[i]["citation_ok"] for i in rag)),
+        "answers_ok": int(sum(results[i]["answer_ok"] for i in rag)),
+        "rag_cases": len(rag),
+        "routes_ok": int(sum(results[i]["route_ok"] for i in routed)),
+        "route_cases": len(routed),
+        "errors": sum(1 for r in results if r.get("error")),
+        "cached": len(results) - len(live),
+        # fresh calls only; cached answers keep the latency they were measured with
+        "latency": _percentiles([r["latency_s"] for r in live]),
+        "latency_recorded": _percentiles([r["latency_s"] for r in results]),
+        "by_route": {k: _percentiles(v) for k, v in sorted(by_route.items())},
+    }
+
+
+def run_eval(paths=None, threshold: int = 74, cit_threshold: int = 80, workers: int = 4,
+             use_cache: bool = True, show: bool = True) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    cases = load_cases(paths or DEFAULT_SETS)
+    index_ver = {kind: index_version(kind=kind) for kind in VERSION_SECTIONS}
+    code_ver = code_version()
+    store = AnswerStore() if use_cache else None
+    with ThreadPoolExecutor(max(1, workers), thread_name_prefix="eval") as pool:
+        results = list(pool.map(lambda c: run_case(c, store, index_ver[c["kind"]], code_ver), cases))
+    summary = score(cases, results, threshold, cit_threshold)
+    summary.update(index_version=index_ver, code_version=code_ver, wall_s=round(time.perf_counter() - t0, 2))
+
+    if show:
+        for c, r in zip(cases, results):
+            tag = " (cached)" if r["cached"] else ""
+            if c["kind"] == "rag":
+                print(f"{c['id']}: citation={'OK' if r['citation_ok'] else 'MISS'}, "
+                      f"answer={'OK' if r['answer_ok'] else 'MISS'} (score={r['answer_score']}) "
+                      f"{r['latency_s'] * 1000:.0f}ms{tag}")
+            else:
+                print(f"{c['id']}: route={r['route']} expected={c['expected_route']} "
+                      f"{'OK' if r['route_ok'] else 'MISS'} {r['latency_s'] * 1000:.0f}ms{tag}")
+        s = summary
+        print(f"Summary: {s['citations_ok']}/{s['rag_cases']} citations OK, {s['answers_ok']}/{s['rag_cases']} "
+              f"answers OK, {s['routes_ok']}/{s['route_cases']} routes OK, {s['cached']} cached, {s['wall_s']}s")
+        lat = s["latency"]
+        if lat["n"]:
+            print(f"Latency ({lat['n']} fresh): p50 {lat['p50_ms']}ms  p95 {lat['p95_ms']}ms  p99 {lat['p99_ms']}ms")
+        for name, v in s["by_route"].items():
+            print(f"  {name:8s} n={v['n']:3d}  p50 {v['p50_ms']}ms  p95 {v['p95_ms']}ms")
+    return {"summary": summary, "results": [dict(r, id=c["id"]) for c, r in zip(cases, results)]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--path", action="append", help="eval set (repeatable); default: ground_truth/*")
+    parser.add_argument("--threshold", type=int, default=74, help="answer similarity threshold")
+    parser.add_argument("--cit-threshold", type=int, default=80, help="citation fuzzy threshold")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--no-cache", action="store_true", help="ignore and don't write cached answers")
+    parser.add_argument("--json", help="write the full report here")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+    report = run_eval(args.path, args.threshold, args.cit_threshold, args.workers,
+                      use_cache=not args.no_cache, show=not args.quiet)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=str)
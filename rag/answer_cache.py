@@ -0,0 +1,167 @@
+# rag/answer_cache.py — two-tier (exact + semantic) LRU cache for routed answers
+from __future__ import annotations
+
+import copy
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+DEFAULT_TTL_S = {"rag": 24 * 3600, "both": 15 * 60, "salary": 15 * 60}
+
+_WS = re.compile(r"\s+")
+_TRAILING = re.compile(r"[\s?!]+$")
+
+
+def normalize_query(q: str) -> str:
+    # case, whitespace and trailing ?/! only: symbols carry meaning ("C#" vs "C++", ".NET")
+    q = _WS.sub(" ", (q or "").lower()).strip()
+    return _TRAILING.sub("", q)
+
+
+class AnswerCache:
+    """
+    LRU cache of router results with two lookup tiers:
+
+    * exact    — normalized query text
+    * semantic — cosine similarity of the query embedding against cached
+                 queries (only when an `embed` callable is available)
+
+    Entries expire after a per-route TTL, so salary answers can be kept for
+    less time than OSCA answers. With `route_of`, a semantic hit is only
+    served when the new query would take the same route as the cached one
+    ("role of a nurse" must not answer "role and salary of a nurse").
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        semantic_threshold: float = 0.95,
+        ttl_s: Optional[Dict[str, float]] = None,
+        embed: Optional[Callable[[str], Optional[np.ndarray]]] = None,
+        clock: Callable[[], float] = time.monotonic,
+        route_of: Optional[Callable[[str], str]] = None,
+    ):
+        self.max_entries = max_entries
+        self.semantic_threshold = semantic_threshold
+        self.ttl_s = dict(DEFAULT_TTL_S, **(ttl_s or {}))
+        self.embed = embed
+        self.clock = clock
+        self.route_of = route_of
+        self._lock = threading.Lock()
+        # key -> {"result", "expires", "vec", "route"}
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None  # rows = unit vectors of _vec_keys
+        self._vec_keys: list = []
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    @classmethod
+    def from_config(cls, cfg, embed=None, route_of=None) -> "AnswerCache":
+        sec = cfg.section("cache")
+        return cls(
+            max_entries=int(sec.get("max_entries", 512)),
+            semantic_threshold=float(sec.get("semantic_threshold", 0.95)),
+            ttl_s={k: float(v) for k, v in (sec.get("ttl_s") or {}).items()},
+            embed=embed if sec.get("semantic", True) else None,
+            route_of=route_of,
+        )
+
+    # ------------------------------------------------------------------
+    def _unit(self, q: str) -> Optional[np.ndarray]:
+        if self.embed is None:
+            return None
+        try:
+            v = self.embed(q)
+        except Exception:
+            return None
+        if v is None:
+            return None
+        v = np.asarray(v, dtype=np.float32).ravel()
+        n = float(np.linalg.norm(v))
+        return v / n if n else None
+
+    def _drop(self, key: str) -> None:
+        e = self._entries.pop(key, None)
+        if e is not None and e["vec"] is not None:
+            self._matrix = None
+
+    def _semantic_index(self):
+        if self._matrix is None:
+            self._vec_keys = [k for k, e in self._entries.items() if e["vec"] is not None]
+            self._matrix = (
+                np.vstack([self._entries[k]["vec"] for k in self._vec_keys])
+                if self._vec_keys else None
+            )
+        return self._vec_keys, self._matrix
+
+    def _hit(self, key: str, kind: str) -> Dict[str, Any]:
+        self._entries.move_to_end(key)
+        self.stats[kind] += 1
+        out = copy.deepcopy(self._entries[key]["result"])
+        out["cache"] = kind.replace("_hits", "")
+        return out
+
+    # ------------------------------------------------------------------
+    def get(self, query: str) -> Optional[Dict[str, Any]]:
+        key = normalize_query(query)
+        now = self.clock()
+        with self._lock:
+            e = self._entries.get(key)
+            if e is not None:
+                if e["expires"] > now:
+                    return self._hit(key, "exact_hits")
+                self._drop(key)
+                self.stats["expired"] += 1
+
+        vec = self._unit(query)
+        want = self.route_of(query) if vec is not None and self.route_of is not None else None
+        with self._lock:
+            if vec is not None:
+                keys, mat = self._semantic_index()
+                if mat is not None and mat.shape[1] == vec.shape[0]:
+                    sims = mat @ vec
+                    for i in np.argsort(-sims):
+                        if sims[i] < self.semantic_threshold:
+                            break
+                        cand = self._entries.get(keys[i])
+                        if cand is None:
+                            continue
+                        if cand["expires"] <= now:
+                            continue
+                        if want is not None and cand["route"] != want:
+                            continue
+                        return self._hit(keys[i], "semantic_hits")
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, query: str, result: Dict[str, Any]) -> None:
+        ttl = self.ttl_s.get(result.get("route") or "rag")
+        if not ttl or ttl <= 0:
+            return
+        key = normalize_query(query)
+        vec = self._unit(query)
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = {
+                "result": copy.deepcopy(result),
+                "expires": self.clock() + ttl,
+                "vec": vec,
+                "route": result.get("route"),
+            }
+            if vec is not None:
+                self._matrix = None
+            while len(self._entries) > self.max_entries:
+                old, _ = next(iter(self._entries.items()))
+                self._drop(old)
+                self.stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
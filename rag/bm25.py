@@ -0,0 +1,112 @@
+# rag/bm25.py — sparse (CSR) BM25 scorer, score-compatible with rank_bm25.BM25Okapi
+from __future__ import annotations
+
+import math
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+
+class SparseBM25:
+    """
+    Okapi BM25 over an inverted index stored as a CSR term x document matrix.
+
+    Uses the same formula and constants as rank_bm25.BM25Okapi (k1=1.5,
+    b=0.75, epsilon=0.25 floor for negative IDF), but the per-posting term
+    weight tf*(k1+1)/(tf + k1*(1-b+b*dl/avgdl)) is precomputed at build time,
+    so a query only touches the postings of its own terms.
+    """
+
+    def __init__(self, corpus: List[List[str]], k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.k1, self.b, self.epsilon = k1, b, epsilon
+        self.corpus_size = len(corpus)
+        doc_len = np.array([len(d) for d in corpus], dtype=np.float64)
+        self.avgdl = float(doc_len.sum()) / self.corpus_size if self.corpus_size else 0.0
+
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        for doc_id, doc in enumerate(corpus):
+            for term, tf in Counter(doc).items():
+                postings.setdefault(term, []).append((doc_id, tf))
+
+        # vocabulary order = first occurrence, which is also rank_bm25's idf order
+        self.vocab: Dict[str, int] = {t: i for i, t in enumerate(postings)}
+        indptr = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        indices: List[int] = []
+        tfs: List[int] = []
+        for i, plist in enumerate(postings.values()):
+            for doc_id, tf in plist:
+                indices.append(doc_id)
+                tfs.append(tf)
+            indptr[i + 1] = len(indices)
+        self.indptr = indptr
+        self.indices = np.asarray(indices, dtype=np.int32)
+
+        tf_arr = np.asarray(tfs, dtype=np.float64)
+        dl = doc_len[self.indices] if len(self.indices) else np.zeros(0)
+        self.data = tf_arr * (k1 + 1) / (tf_arr + k1 * (1 - b + b * dl / self.avgdl))
+
+        df = np.diff(indptr).astype(np.float64)
+        idf = np.array(
+            [math.log(self.corpus_size - n + 0.5) - math.log(n + 0.5) for n in df],
+            dtype=np.float64,
+        )
+        if len(idf):
+            eps = epsilon * (sum(idf.tolist()) / len(idf))
+            idf[idf < 0] = eps
+        self.idf = idf
+
+    # ------------------------------------------------------------------
+    def _accumulate(self, query: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Dense score vector plus the ids of documents any query term touched."""
+        scores = np.zeros(self.corpus_size, dtype=np.float64)
+        touched = []
+        n_post = 0
+        for q in query:
+            t = self.vocab.get(q)
+            if t is None:
+                continue
+            lo, hi = self.indptr[t], self.indptr[t + 1]
+            docs = self.indices[lo:hi]
+            scores[docs] += self.idf[t] * self.data[lo:hi]
+            touched.append(docs)
+            n_post += hi - lo
+        if not touched:
+            return scores, np.zeros(0, dtype=np.int32)
+        if len(touched) == 1:
+            return scores, touched[0]
+        if n_post * 8 > self.corpus_size:
+            # common terms cover most documents: a linear mask beats sorting the postings
+            return scores, np.flatnonzero(scores).astype(np.int32)
+        return scores, np.unique(np.concatenate(touched))
+
+    def get_scores(self, query: List[str]) -> np.ndarray:
+        return self._accumulate(query)[0]
+
+    def top_k(self, query: List[str], k: int) -> Tuple[np.ndarray, np.ndarray, float]:
+        """
+        Best k document ids and scores, ordered like a stable
+        sorted(enumerate(scores), key=score, reverse=True): score descending,
+        ties by document id. Also returns max(scores) over the whole corpus.
+        """
+        k = max(0, min(k, self.corpus_size))
+        scores, cand = self._accumulate(query)
+        cand = cand[scores[cand] > 0]
+        cs = scores[cand]
+        mx = float(cs.max()) if len(cs) else 0.0
+
+        if len(cand) > k:
+            # partial selection: keep everything >= the k-th largest (ties included), then order
+            kth = np.partition(cs, len(cs) - k)[len(cs) - k] if k else np.inf
+            keep = cs >= kth
+            cand, cs = cand[keep], cs[keep]
+        order = np.lexsort((cand, -cs))[:k]
+        ids, top = cand[order], cs[order]
+
+        if len(ids) < k:
+            # pad with zero-score documents in id order, as the stable sort would
+            rest = np.setdiff1d(np.arange(self.corpus_size, dtype=np.int32), ids, assume_unique=True)
+            rest = rest[: k - len(ids)]
+            ids = np.concatenate([ids, rest])
+            top = np.concatenate([top, scores[rest]])
+        return ids, top, mx
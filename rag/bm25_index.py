@@ -0,0 +1,176 @@
+# rag/bm25_index.py — prebuilt BM25 index persisted next to the vector index
+from __future__ import annotations
+
+import hashlib
+import os
+import pickle
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from rag.bm25 import SparseBM25
+from rag.generate import extract_bullets
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_FILE = os.path.join(PROJECT_DIR, "data_processed", "osca_ict_roles.utf8.txt")
+INDEX_FILE = os.path.join(PROJECT_DIR, "index", "bm25_osca_ict_roles.pkl")
+
+# bump when the chunking/tokenisation below changes so old pickles are rebuilt
+INDEX_VERSION = 3
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def split_role_chunks(text: str) -> List[str]:
+    # Normalize newlines and bullets
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = (
+        text.replace("•", "* ").replace("·", "* ").replace("‧", "* ").replace("∙", "* ")
+    )
+
+    # Primary split: start of a role line like "- 273232 ICT Business Analyst" or "273232 ICT Business Analyst"
+    blocks = re.split(r"(?m)(?=^\s*(?:-\s*)?\d{6}\s+[A-Z].+)", text)
+
+    # Fallback if the above didn’t work well
+    if len(blocks) < 5:
+        blocks = re.split(r"\n{2,}", text)
+
+    return [b.strip() for b in blocks if b and b.strip()]
+
+
+def infer_role_title(txt: str) -> str:
+    m = re.search(r"(?m)^\s*(\d{6}\s+[A-Za-z].+)$", txt) or re.search(
+        r"(?m)^\s*-\s*(\d{6}\s+[A-Za-z].+)$", txt
+    )
+    if m:
+        return m.group(1).strip()
+    for line in txt.splitlines():
+        if line.strip() and any(
+            w in line.lower()
+            for w in ["ict", "analyst", "developer", "manager", "engineer"]
+        ):
+            return line.strip()
+    return "OSCA ICT Roles"
+
+
+def build_bm25_index(path: str = DATA_FILE) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"osca_ict_roles.utf8.txt not found at: {path}")
+
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        text = f.read()
+
+    raw_chunks = split_role_chunks(text)
+    tokenized = [c.split() for c in raw_chunks]
+    return {
+        "version": INDEX_VERSION,
+        "source": os.path.basename(path),
+        "sha256": file_sha256(path),
+        "chunks": raw_chunks,
+        # per-chunk answer material, computed once here instead of per query
+        "bullets": [extract_bullets(c) for c in raw_chunks],
+        "role_titles": [infer_role_title(c) for c in raw_chunks],
+        "bm25": SparseBM25(tokenized),
+    }
+
+
+def save_bm25_index(index: Dict[str, Any], out_path: str = INDEX_FILE) -> None:
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp = f"{out_path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, out_path)
+
+
+def _read_index(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "rb") as f:
+            index = pickle.load(f)
+    except Exception:
+        return None
+    if not isinstance(index, dict) or index.get("version") != INDEX_VERSION:
+        return None
+    return index
+
+
+def load_or_build(path: str = DATA_FILE, index_path: str = INDEX_FILE) -> Dict[str, Any]:
+    """Load the on-disk index if it matches the data file's hash, else rebuild and save it."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"osca_ict_roles.utf8.txt not found at: {path}")
+    digest = file_sha256(path)
+    index = _read_index(index_path)
+    if index is not None and index.get("sha256") == digest:
+        return index
+    index = build_bm25_index(path)
+    try:
+        save_bm25_index(index, index_path)
+    except OSError:
+        pass  # read-only checkout: keep the in-memory index
+    return index
+
+
+# --- process-wide cache ---------------------------------------------------
+# The data file is only re-hashed when its (mtime, size) changes, so the hot
+# path is a single os.stat().
+
+_LOCK = threading.Lock()
+_CACHE: Optional[Tuple[Any, Dict[str, Any]]] = None  # (stat key, index)
+
+
+def _stat_key(path: str) -> Tuple[str, int, int]:
+    st = os.stat(path)
+    return (path, st.st_mtime_ns, st.st_size)
+
+
+def get_bm25_index(path: str = DATA_FILE) -> Dict[str, Any]:
+    global _CACHE
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"osca_ict_roles.utf8.txt not found at: {path}")
+    key = _stat_key(path)
+    cached = _CACHE
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    with _LOCK:
+        if _CACHE is None or _CACHE[0] != key:
+            _CACHE = (key, load_or_build(path))
+        return _CACHE[1]
+
+
+def check_against_okapi(index: Dict[str, Any], queries: List[str], k: int = 12) -> int:
+    """Count queries whose top-k differs from rank_bm25.BM25Okapi (should be 0)."""
+    from rank_bm25 import BM25Okapi
+
+    okapi = BM25Okapi([c.split() for c in index["chunks"]])
+    mismatches = 0
+    for q in queries:
+        scores = okapi.get_scores(q.split())
+        ref = [i for i, _ in sorted(enumerate(scores), key=lambda t: t[1], reverse=True)[:k]]
+        ids, _, _ = index["bm25"].top_k(q.split(), k)
+        if ids.tolist() != ref:
+            mismatches += 1
+            print("MISMATCH:", q)
+    return mismatches
+
+
+if __name__ == "__main__":
+    import sys
+
+    idx = load_or_build()
+    print(f"BM25 index: {len(idx['chunks'])} chunks, sha256={idx['sha256'][:12]} -> {INDEX_FILE}")
+    if "--check" in sys.argv:
+        import json
+
+        gt = os.path.join(PROJECT_DIR, "ground_truth")
+        with open(os.path.join(gt, "baseline.json"), encoding="utf-8") as f:
+            qs = [json.loads(b)["question"] for b in re.split(r"\n\s*\n", f.read()) if b.strip()]
+        for name in ("baseline_tool.json", "difficult_tool.json"):
+            with open(os.path.join(gt, name), encoding="utf-8") as f:
+                qs += [c["question"] for c in json.load(f)]
+        bad = check_against_okapi(idx, qs)
+        print(f"rank parity vs BM25Okapi: {len(qs) - bad}/{len(qs)} identical")
@@ -0,0 +1,203 @@
+# rag/config.py — typed, cached view of config.yml (reloaded only when the file changes)
+from __future__ import annotations
+
+import os
+import threading
+import warnings
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, Optional, Tuple
+
+import yaml
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG_PATH = os.path.join(PROJECT_DIR, "config.yml")
+
+RETRIEVER_MODES = {"vector", "bm25", "hybrid"}
+EMBED_PROVIDERS = {"sentence-transformers", "onnx-int8"}
+VECTOR_PROVIDERS = {"chroma", "flat"}
+
+
+class ConfigError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Settings:
+    # retrieval / index
+    embed_model: str = "all-MiniLM-L6-v2"
+    embed_provider: str = "sentence-transformers"  # or onnx-int8 (rag/onnx_embed.py)
+    embed_batch_size: int = 64
+    vector_provider: str = "chroma"  # or flat (read-only export, rag/flat_index.py)
+    collection: str = "kit719_rag"
+    index_dir: str = "index/chroma"
+    top_k: int = 4
+    retriever_mode: str = "vector"  # vector | bm25 | hybrid
+    use_bm25: bool = False
+    vector_timeout_s: float = 2.0
+    bm25_timeout_s: float = 1.0
+    rrf_k: int = 60
+    mmr: bool = False
+    mmr_lambda: float = 0.5
+    mmr_fetch_k: int = 16
+    score_threshold: Optional[float] = None
+    low_conf_score: float = 0.55
+    # ingest
+    data_raw_dir: str = "data_raw"
+    data_processed_dir: str = "data_processed"
+    source_name: str = "osca_roles"
+    chunk_size: int = 800
+    overlap: int = 120
+    # the parsed YAML, for sections without a typed field (app, tools, ui, ...)
+    raw: Dict[str, Any] = field(default_factory=dict, compare=False, repr=False)
+
+    # dict-style access so older call sites (cfg["top_k"], cfg.get(...)) keep working
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in _FIELD_NAMES:
+            return getattr(self, key)
+        return self.raw.get(key, default)
+
+    def __getitem__(self, key: str) -> Any:
+        if key in _FIELD_NAMES:
+            return getattr(self, key)
+        return self.raw[key]
+
+    def section(self, *path: str) -> Dict[str, Any]:
+        node: Any = self.raw
+        for p in path:
+            node = node.get(p) if isinstance(node, dict) else None
+        return node if isinstance(node, dict) else {}
+
+
+_FIELD_NAMES = {f.name for f in fields(Settings)} - {"raw"}
+
+# config.yml (nested) -> Settings field. Flat top-level keys, as used by the
+# older per-member configs, are also accepted and take precedence.
+_NESTED_KEYS = {
+    "embed_model": ("models", "embeddings", "model"),
+    "embed_provider": ("models", "embeddings", "provider"),
+    "embed_batch_size": ("models", "embeddings", "batch_size"),
+    "vector_provider": ("rag", "vector_db", "provider"),
+    "collection": ("rag", "vector_db", "collection"),
+    "index_dir": ("rag", "vector_db", "persist_path"),
+    "source_name": ("rag", "vector_db", "source_name"),
+    "top_k": ("rag", "retriever", "top_k"),
+    "retriever_mode": ("rag", "retriever", "mode"),
+    "use_bm25": ("rag", "retriever", "use_bm25"),
+    "vector_timeout_s": ("rag", "retriever", "vector_timeout_s"),
+    "bm25_timeout_s": ("rag", "retriever", "bm25_timeout_s"),
+    "rrf_k": ("rag", "retriever", "rrf_k"),
+    "mmr": ("rag", "retriever", "mmr"),
+    "mmr_lambda": ("rag", "retriever", "mmr_lambda"),
+    "mmr_fetch_k": ("rag", "retriever", "mmr_fetch_k"),
+    "score_threshold": ("rag", "retriever", "score_threshold"),
+    "low_conf_score": ("rag", "retriever", "low_conf_score"),
+    "data_raw_dir": ("rag", "corpus_path"),
+    "data_processed_dir": ("rag", "processed_path"),
+    "chunk_size": ("rag", "chunking", "chunk_size"),
+    "overlap": ("rag", "chunking", "chunk_overlap"),
+}
+
+_MISSING = object()
+
+
+def _lookup(raw: Dict[str, Any], path: Tuple[str, ...]) -> Any:
+    node: Any = raw
+    for p in path:
+        if not isinstance(node, dict) or p not in node:
+            return _MISSING
+        node = node[p]
+    return node
+
+
+def _coerce(name: str, value: Any, default: Any) -> Any:
+    if value is None:
+        if default is None:
+            return None
+        raise ConfigError(f"config: '{name}' must not be null")
+    try:
+        if isinstance(default, bool):
+            if isinstance(value, str):
+                return value.strip().lower() in {"1", "true", "yes", "on"}
+            return bool(value)
+        if isinstance(default, int):
+            return int(value)
+        if isinstance(default, float) or default is None:
+            return float(value)
+        return str(value)
+    except (TypeError, ValueError) as e:
+        raise ConfigError(f"config: '{name}' has invalid value {value!r}") from e
+
+
+def parse_settings(raw: Optional[Dict[str, Any]]) -> Settings:
+    raw = raw or {}
+    if not isinstance(raw, dict):
+        raise ConfigError("config: top level must be a mapping")
+    defaults = Settings()
+    values: Dict[str, Any] = {}
+    for name in _FIELD_NAMES:
+        v = raw.get(name, _MISSING)
+        if v is _MISSING and name in _NESTED_KEYS:
+            v = _lookup(raw, _NESTED_KEYS[name])
+        if v is not _MISSING:
+            values[name] = _coerce(name, v, getattr(defaults, name))
+
+    s = Settings(raw=raw, **values)
+    if s.retriever_mode not in RETRIEVER_MODES:
+        raise ConfigError(f"config: retriever mode must be one of {sorted(RETRIEVER_MODES)}")
+    if s.embed_provider not in EMBED_PROVIDERS:
+        raise ConfigError(f"config: embeddings provider must be one of {sorted(EMBED_PROVIDERS)}")
+    if s.vector_provider not in VECTOR_PROVIDERS:
+        raise ConfigError(f"config: vector_db provider must be one of {sorted(VECTOR_PROVIDERS)}")
+    if s.top_k < 1:
+        raise ConfigError("config: top_k must be >= 1")
+    if not 0.0 <= s.mmr_lambda <= 1.0:
+        raise ConfigError("config: mmr_lambda must be between 0 and 1")
+    if s.overlap >= s.chunk_size:
+        raise ConfigError("config: chunk overlap must be smaller than chunk_size")
+    return s
+
+
+def read_settings(path: str = CONFIG_PATH) -> Settings:
+    if not os.path.exists(path):
+        return Settings()
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_settings(yaml.safe_load(f))
+
+
+# --- process-wide cache ---------------------------------------------------
+
+_LOCK = threading.Lock()
+_CACHE: Dict[str, Tuple[Any, Settings]] = {}  # path -> (stat key, settings)
+
+
+def _stat_key(path: str) -> Any:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def get_config(path: str = CONFIG_PATH) -> Settings:
+    """
+    Parsed settings for `path`. The YAML is only re-read when the file's
+    mtime/size changes; if a reload fails validation the last good settings
+    stay in use.
+    """
+    key = _stat_key(path)
+    cached = _CACHE.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    with _LOCK:
+        cached = _CACHE.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        try:
+            settings = read_settings(path)
+        except (ConfigError, yaml.YAMLError) as e:
+            if cached is None:
+                raise
+            warnings.warn(f"config reload failed, keeping previous settings: {e}")
+            settings = cached[1]
+        _CACHE[path] = (key, settings)
+        return settings
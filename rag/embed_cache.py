@@ -0,0 +1,202 @@
+# rag/embed_cache.py — disk-backed query-embedding cache (memory-mapped float32 rows + SQLite index)
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# recency is only written back when a row's last_used is older than this, so
+# repeat hits stay read-only
+TOUCH_INTERVAL_S = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS rows (
+    key       INTEGER PRIMARY KEY,   -- 63-bit hash of (model, normalized query)
+    row       INTEGER NOT NULL UNIQUE,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rows_last_used ON rows (last_used);
+"""
+
+
+_WS = re.compile(r"\s+")
+KEY_VERSION = 2  # v1 keys folded punctuation ("c#" == "c++"); bumping it orphans them
+
+
+def canonical_query(query: str) -> str:
+    # only what the (uncased, whitespace-splitting) encoder ignores anyway: case and spacing
+    return _WS.sub(" ", (query or "").lower()).strip()
+
+
+def query_key(model: str, query: str) -> int:
+    text = f"{model}\0v{KEY_VERSION}\0{canonical_query(query)}"
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") >> 1 or 1  # positive, non-zero (0 marks an empty row)
+
+
+class EmbeddingCache:
+    """
+    Query embeddings on disk, shared by every process that opens the same
+    directory. Vectors live in a fixed-size memory-mapped float32 matrix
+    (`capacity` x dim); SQLite maps key -> row and tracks recency, and a full
+    cache overwrites its least recently used row.
+
+    Each row also records its key in a parallel int64 memmap. A reader checks
+    it after copying the vector, so a row that another process recycled
+    mid-read is treated as a miss.
+    """
+
+    def __init__(self, directory: str, model: str, capacity: int = 20000):
+        self.directory = directory
+        self.model = model
+        self.capacity = capacity
+        slug = re.sub(r"\W+", "-", model).strip("-").lower()
+        self._base = os.path.join(directory, f"query_emb_{slug}")
+        self._db = self._base + ".sqlite3"
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.dim: Optional[int] = None
+        self._vecs: Optional[np.memmap] = None
+        self._keys: Optional[np.memmap] = None
+        self.stats = {"hits": 0, "misses": 0, "puts": 0, "evictions": 0}
+
+        os.makedirs(directory, exist_ok=True)
+        con = self._connect()
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.executescript(_SCHEMA)
+            # capacity may have been lowered since the rows were written
+            con.execute("DELETE FROM rows WHERE row >= ?", (capacity,))
+            row = con.execute("SELECT v FROM meta WHERE k = 'dim'").fetchone()
+        finally:
+            con.close()
+        if row is not None:
+            self._open(int(row[0]))
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self._db, timeout=5.0, isolation_level=None)
+
+    def _reader(self) -> sqlite3.Connection:
+        # lookups are the hot path: one long-lived connection per thread
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = self._local.con = self._connect()
+        return con
+
+    def _open(self, dim: int) -> None:
+        vec_path, key_path = f"{self._base}.{dim}d.f32", f"{self._base}.{dim}d.keys"
+        for path, itemsize, width in ((vec_path, 4, dim), (key_path, 8, 1)):
+            size = self.capacity * width * itemsize
+            if not os.path.exists(path) or os.path.getsize(path) < size:
+                with open(path, "ab") as f:
+                    f.truncate(size)  # sparse; zero rows are "empty"
+        self._vecs = np.memmap(vec_path, dtype=np.float32, mode="r+", shape=(self.capacity, dim))
+        self._keys = np.memmap(key_path, dtype=np.int64, mode="r+", shape=(self.capacity,))
+        self.dim = dim
+
+    # ------------------------------------------------------------------
+    def get_many(self, queries: Sequence[str]) -> List[Optional[np.ndarray]]:
+        out: List[Optional[np.ndarray]] = [None] * len(queries)
+        if self._vecs is None or not queries:
+            self.stats["misses"] += len(queries)
+            return out
+        keys = [query_key(self.model, q) for q in queries]
+        now = time.time()
+        con = self._reader()
+        marks = ",".join("?" * len(set(keys)))
+        found = {k: (r, t) for k, r, t in con.execute(
+            f"SELECT key, row, last_used FROM rows WHERE key IN ({marks})", list(set(keys)))}
+        touch = []
+        for i, k in enumerate(keys):
+            hit = found.get(k)
+            if hit is None:
+                continue
+            v = np.array(self._vecs[hit[0]])
+            if int(self._keys[hit[0]]) != k:  # recycled while we read it
+                continue
+            out[i] = v
+            if now - hit[1] > TOUCH_INTERVAL_S:
+                touch.append((now, k))
+        if touch:
+            con.executemany("UPDATE rows SET last_used = ? WHERE key = ?", touch)
+        n_hit = sum(v is not None for v in out)
+        self.stats["hits"] += n_hit
+        self.stats["misses"] += len(out) - n_hit
+        return out
+
+    def get(self, query: str) -> Optional[np.ndarray]:
+        return self.get_many([query])[0]
+
+    def put_many(self, items: Sequence[Tuple[str, np.ndarray]]) -> None:
+        if not items:
+            return
+        dim = int(np.asarray(items[0][1]).shape[-1])
+        with self._lock:
+            con = self._connect()
+            try:
+                con.execute("BEGIN IMMEDIATE")  # one writer across processes
+                try:
+                    row = con.execute("SELECT v FROM meta WHERE k = 'dim'").fetchone()
+                    if row is None:
+                        con.execute("INSERT INTO meta (k, v) VALUES ('dim', ?)", (str(dim),))
+                    elif int(row[0]) != dim:
+                        raise ValueError(f"embedding cache holds {row[0]}-d vectors, got {dim}-d")
+                    if self._vecs is None:
+                        self._open(dim)
+                    self._put_locked(con, items)
+                    con.execute("COMMIT")
+                except BaseException:
+                    con.execute("ROLLBACK")
+                    raise
+            finally:
+                con.close()
+
+    def _put_locked(self, con: sqlite3.Connection, items) -> None:
+        now = time.time()
+        used = con.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+        for query, vec in items:
+            k = query_key(self.model, query)
+            if con.execute("SELECT 1 FROM rows WHERE key = ?", (k,)).fetchone():
+                continue
+            if used < self.capacity:
+                row = con.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM rows").fetchone()[0]
+                used += 1
+            else:
+                old_key, row = con.execute(
+                    "SELECT key, row FROM rows ORDER BY last_used LIMIT 1").fetchone()
+                con.execute("DELETE FROM rows WHERE key = ?", (old_key,))
+                self.stats["evictions"] += 1
+            self._keys[row] = 0
+            self._vecs[row] = np.asarray(vec, dtype=np.float32)
+            self._keys[row] = k
+            con.execute("INSERT INTO rows (key, row, last_used) VALUES (?, ?, ?)", (k, row, now))
+            self.stats["puts"] += 1
+        self._vecs.flush()
+        self._keys.flush()
+
+    def put(self, query: str, vec: np.ndarray) -> None:
+        self.put_many([(query, vec)])
+
+    def clear(self) -> None:
+        con = self._connect()
+        try:
+            con.execute("DELETE FROM rows")
+        finally:
+            con.close()
+        if self._keys is not None:
+            self._keys[:] = 0
+            self._keys.flush()
+
+    def __len__(self) -> int:
+        con = self._connect()
+        try:
+            return con.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+        finally:
+            con.close()
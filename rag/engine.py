@@ -0,0 +1,245 @@
+# rag/engine.py — process-wide retrieval engine (Chroma collection + embedding model)
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from rag.config import Settings, get_config
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_MEMO_SIZE = 256
+
+
+def embedding_id(cfg: Settings) -> str:
+    """Model + backend: vectors from different backends are not interchangeable byte for byte."""
+    if cfg.embed_provider == "sentence-transformers":
+        return cfg.embed_model
+    return f"{cfg.embed_model}@{cfg.embed_provider}"
+
+
+def embedding_function(cfg: Settings):
+    if cfg.embed_provider == "onnx-int8":
+        from rag.onnx_embed import load_embedder
+
+        return load_embedder(cfg)
+    from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+
+    return SentenceTransformerEmbeddingFunction(model_name=cfg.embed_model)
+
+
+def chroma_client(cfg: Settings, embed=None):
+    # imported lazily so the BM25 fallback still works without chromadb installed
+    import chromadb
+
+    index_dir = cfg.index_dir
+    if not os.path.isabs(index_dir):
+        index_dir = os.path.join(PROJECT_DIR, index_dir)
+
+    if embed is None:
+        embed = embedding_function(cfg)
+    client = chromadb.PersistentClient(path=index_dir)
+    col = client.get_or_create_collection(
+        name=cfg.collection, embedding_function=embed
+    )
+    return col
+
+
+def vector_store(cfg: Settings, embed=None):
+    """The collection queries run against: Chroma, or its read-only flat export."""
+    if cfg.vector_provider == "flat":
+        from rag.flat_index import load_index
+
+        return load_index(cfg, embed if embed is not None else embedding_function(cfg))
+    return chroma_client(cfg, embed)
+
+
+def _engine_key(cfg: Settings) -> tuple:
+    # the settings a warmed-up engine depends on; the engine reloads when they change
+    flat = json.dumps(cfg.section("rag", "vector_db", "flat"), sort_keys=True, default=str)
+    return (embedding_id(cfg), cfg.vector_provider, cfg.collection, cfg.index_dir, flat)
+
+
+def _disk_key(cfg: Settings) -> tuple:
+    sec = cfg.section("models", "embeddings", "query_cache")
+    return (embedding_id(cfg), json.dumps(sec, sort_keys=True, default=str))
+
+
+class RetrievalEngine:
+    """
+    Holds the Chroma collection (and with it the embedding model) for the
+    lifetime of the process. Call warm_up() once at startup; queries then
+    reuse the open collection instead of reloading the model per request.
+    """
+
+    def __init__(self, cfg: Optional[Settings] = None):
+        self._cfg = cfg
+        self._lock = threading.Lock()
+        self._col = None
+        self._embed = None
+        self._error: Optional[Exception] = None
+        self.warmup_seconds: Optional[float] = None
+        # recent query -> embedding, so the answer cache and vector search share one encode
+        self._memo: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._memo_lock = threading.Lock()
+        self._disk: Any = None  # EmbeddingCache, False when disabled/unusable
+        self._disk_key: Optional[tuple] = None
+        self._key: Optional[tuple] = None  # _engine_key of the settings last warmed up with
+        self._seen_cfg: Optional[Settings] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._col is not None
+
+    @property
+    def error(self) -> Optional[str]:
+        e = self._error
+        return f"{type(e).__name__}: {e}" if e else None
+
+    def _load_cfg(self) -> Settings:
+        return self._cfg if self._cfg is not None else get_config()
+
+    def warm_up(self) -> bool:
+        """Open the collection and load the model. Safe to call repeatedly."""
+        with self._lock:
+            if self._col is not None:
+                return True
+            t0 = time.perf_counter()
+            try:
+                cfg = self._load_cfg()
+                self._key = _engine_key(cfg)
+                embed = embedding_function(cfg)
+                col = vector_store(cfg, embed)
+                # touch the model once so the first real query doesn't pay for it
+                col.query(query_texts=["warm up"], n_results=1, include=["distances"])
+            except Exception as e:
+                self._error = e
+                return False
+            self._col = col
+            self._embed = embed
+            self._error = None
+            self.warmup_seconds = time.perf_counter() - t0
+            return True
+
+    def collection(self):
+        if self._col is None and self._error is None:
+            self.warm_up()
+        if self._col is None:
+            raise RuntimeError(f"retrieval engine unavailable: {self.error}")
+        return self._col
+
+    def refresh(self) -> None:
+        """Drop the collection / model / caches if config.yml changed the settings they came from."""
+        if self._cfg is not None:
+            return
+        cfg = get_config()
+        if cfg is self._seen_cfg:
+            return
+        self._seen_cfg = cfg
+        if self._key is not None and _engine_key(cfg) != self._key:
+            self.reset()  # the next query warms up again with the new settings
+
+    def _disk_cache(self):
+        cfg = self._load_cfg()
+        if self._disk is None or self._disk_key != _disk_key(cfg):
+            self._disk_key = _disk_key(cfg)
+            sec = cfg.section("models", "embeddings", "query_cache")
+            disk: Any = False
+            if sec.get("enabled", True):
+                path = sec.get("path") or "index/query_cache"
+                if not os.path.isabs(path):
+                    path = os.path.join(PROJECT_DIR, path)
+                try:
+                    from rag.embed_cache import EmbeddingCache
+
+                    disk = EmbeddingCache(path, embedding_id(cfg), int(sec.get("capacity", 20000)))
+                except Exception:
+                    disk = False  # read-only checkout: memo only
+            self._disk = disk
+        return self._disk if self._disk is not False else None
+
+    def _encode(self, texts: List[str]) -> List[np.ndarray]:
+        """Encoder behind the disk cache: cached rows skip the model entirely."""
+        disk = self._disk_cache()
+        cached: List[Optional[np.ndarray]] = [None] * len(texts)
+        if disk is not None:
+            try:
+                cached = disk.get_many(texts)
+            except Exception:
+                pass
+        todo = [i for i, v in enumerate(cached) if v is None]
+        if todo:
+            vecs = self._embed([texts[i] for i in todo])
+            fresh = [(texts[i], np.asarray(v, dtype=np.float32)) for i, v in zip(todo, vecs)]
+            for i, (_, v) in zip(todo, fresh):
+                cached[i] = v
+            if disk is not None:
+                try:
+                    disk.put_many(fresh)
+                except Exception:
+                    pass
+        return cached
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Query embeddings (float32, one row per text) from the loaded model."""
+        self.collection()
+        out: List[Optional[np.ndarray]] = [None] * len(texts)
+        todo = []
+        with self._memo_lock:
+            for i, t in enumerate(texts):
+                v = self._memo.get(t)
+                if v is None:
+                    todo.append(i)
+                else:
+                    self._memo.move_to_end(t)
+                    out[i] = v
+        if todo:
+            vecs = self._encode([texts[i] for i in todo])
+            with self._memo_lock:
+                for i, v in zip(todo, vecs):
+                    v = np.asarray(v, dtype=np.float32)
+                    out[i] = v
+                    self._memo[texts[i]] = v
+                while len(self._memo) > _MEMO_SIZE:
+                    self._memo.popitem(last=False)
+        return np.vstack(out) if out else np.zeros((0, 0), dtype=np.float32)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._col = None
+            self._embed = None
+            self._error = None
+            self._key = None
+            self.warmup_seconds = None
+        with self._memo_lock:
+            self._memo.clear()
+        self._disk = None
+
+    def status(self) -> Dict[str, Any]:
+        disk = self._disk if self._disk is not False else None
+        return {
+            "ready": self.ready,
+            "error": self.error,
+            "warmup_seconds": self.warmup_seconds,
+            "index": self._col.info() if hasattr(self._col, "info") else None,
+            "query_cache": dict(disk.stats) if disk is not None else None,
+        }
+
+
+_ENGINE: Optional[RetrievalEngine] = None
+_ENGINE_LOCK = threading.Lock()
+
+
+def get_engine() -> RetrievalEngine:
+    global _ENGINE
+    if _ENGINE is None:
+        with _ENGINE_LOCK:
+            if _ENGINE is None:
+                _ENGINE = RetrievalEngine()
+    _ENGINE.refresh()
+    return _ENGINE
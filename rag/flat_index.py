@@ -0,0 +1,523 @@
+# rag/flat_index.py — read-only vector index exported from Chroma, served from memory-mapped numpy
+"""
+    python -m rag.flat_index --export    # dump the Chroma collection to rag.vector_db.flat.path
+    python -m rag.flat_index --check     # top-k + distance agreement, latency vs the Chroma collection
+
+Selected with `rag.vector_db.provider: "flat"`. Chroma (and chromadb itself)
+is then only needed to build the export; rag/ingest.py refreshes it after
+each run. An export is one directory:
+
+    manifest.json   count, dim, distance space, embedding id, source collection
+    vectors.npy     float32 (count x dim), opened with mmap_mode="r"
+    sqnorms.npy     squared row norms (l2 space)
+    vectors.float16.npy / vectors.int8.npy + scales.npy
+                    optional reduced-precision copies (flat.storage)
+    records.jsonl   one {"id", "doc", "meta"} line per row; offsets.npy indexes it
+    hnsw.bin        optional hnswlib graph for large corpora (built at export time)
+
+Startup only maps files; a query is one matrix product per block of rows
+(exact) or a graph walk (hnsw), plus reading the k matching records.
+Distances follow the collection's space (Chroma's default "l2" is squared
+L2), so scores come out the same as from the Chroma path.
+
+With storage float16 or int8 the exact scan reads the smaller copy (half or
+a quarter of the pages every worker keeps resident), takes `rescore` x k
+candidates, and re-ranks those against their float32 rows, which are the
+only full-precision pages a query touches. Returned distances are always
+full precision. The hnsw graph keeps its own float32 copy, so storage only
+applies to exact search.
+
+    python -m rag.flat_index --storage-report   # memory + recall per storage on the eval sets
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import mmap
+import os
+import re
+import shutil
+import time
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag.config import PROJECT_DIR, Settings, get_config
+from rag.engine import chroma_client, embedding_function, embedding_id
+
+FORMAT_VERSION = 1
+SPACES = {"l2", "ip", "cosine"}
+ANN_MODES = {"exact", "hnsw", "auto"}
+STORAGES = ("float32", "float16", "int8")
+BLOCK_ROWS = 1 << 14  # exact search scores this many rows per matrix product
+EXPORT_BATCH = 1000
+
+
+def index_dir(cfg: Settings) -> str:
+    path = cfg.section("rag", "vector_db", "flat").get("path") or "index/flat"
+    return path if os.path.isabs(path) else os.path.join(PROJECT_DIR, path)
+
+
+# --- export ----------------------------------------------------------------------
+
+def _collection_batches(col, batch: int = EXPORT_BATCH) -> Iterable[Tuple[list, list, list, list]]:
+    for offset in range(0, col.count(), batch):
+        got = col.get(include=["embeddings", "documents", "metadatas"], limit=batch, offset=offset)
+        yield got["ids"], got["embeddings"], got["documents"], got["metadatas"]
+
+
+def write_index(out_dir: str, batches: Iterable[Tuple[list, list, list, list]], count: int, *,
+                space: str = "l2", embedding: str = "", collection: str = "",
+                hnsw: Optional[Dict[str, Any]] = None, storage: str = "float32") -> Dict[str, Any]:
+    """
+    Write (ids, embeddings, documents, metadatas) batches as an export at
+    out_dir. Built in a sibling temp dir and swapped in, so a serving process
+    never maps a half-written index.
+    """
+    if space not in SPACES:
+        raise ValueError(f"unsupported distance space {space!r}")
+    tmp = out_dir.rstrip(os.sep) + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    vecs = None
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    n = 0
+    with open(os.path.join(tmp, "records.jsonl"), "wb") as rec:
+        for ids, embs, docs, metas in batches:
+            block = np.asarray(embs, dtype=np.float32)
+            if vecs is None:
+                dim = int(block.shape[1])
+                vecs = np.lib.format.open_memmap(os.path.join(tmp, "vectors.npy"), mode="w+",
+                                                 dtype=np.float32, shape=(count, dim))
+            if n + len(ids) > count:
+                raise ValueError(f"collection grew past {count} rows during export")
+            if space == "cosine":  # hnswlib stores cosine vectors normalized; so do we
+                block = block / np.clip(np.linalg.norm(block, axis=1, keepdims=True), 1e-12, None)
+            vecs[n:n + len(ids)] = block
+            for i, cid in enumerate(ids):
+                line = json.dumps({"id": cid, "doc": docs[i], "meta": metas[i]}, ensure_ascii=False)
+                rec.write(line.encode("utf-8") + b"\n")
+                offsets[n + i + 1] = rec.tell()
+            n += len(ids)
+    if n != count:
+        raise ValueError(f"expected {count} rows, exported {n}")
+    if vecs is None:
+        dim = 0
+        vecs = np.zeros((0, 0), dtype=np.float32)
+        np.save(os.path.join(tmp, "vectors.npy"), vecs)
+    else:
+        vecs.flush()
+    np.save(os.path.join(tmp, "offsets.npy"), offsets)
+    np.save(os.path.join(tmp, "sqnorms.npy"), np.einsum("ij,ij->i", vecs, vecs).astype(np.float32))
+
+    manifest: Dict[str, Any] = {
+        "format": FORMAT_VERSION, "count": count, "dim": dim, "space": space,
+        "embedding": embedding, "collection": collection, "exported_at": time.time(), "hnsw": None,
+        "storage": ["float32"],
+    }
+    if hnsw is not None and count:
+        manifest["hnsw"] = _build_hnsw(os.path.join(tmp, "hnsw.bin"), vecs, space, **hnsw)
+    _write_manifest(tmp, manifest)
+    if storage != "float32":
+        manifest = write_compressed(tmp, storage)
+
+    old = out_dir.rstrip(os.sep) + ".old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(out_dir):
+        os.replace(out_dir, old)
+    os.replace(tmp, out_dir)
+    shutil.rmtree(old, ignore_errors=True)  # open maps of the old files stay valid
+    return manifest
+
+
+def _write_manifest(directory: str, manifest: Dict[str, Any]) -> None:
+    with open(os.path.join(directory, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def quantize(block: np.ndarray, storage: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """(codes, per-row scales or None). int8 is symmetric: row ~= codes * scale."""
+    if storage == "float16":
+        return block.astype(np.float16), None
+    if storage == "int8":
+        scales = np.clip(np.abs(block).max(axis=1), 1e-12, None) / 127.0
+        return np.rint(block / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    raise ValueError(f"storage must be one of {list(STORAGES)}")
+
+
+def write_compressed(directory: str, storage: str) -> Dict[str, Any]:
+    """Add a reduced-precision copy of vectors.npy to an export (idempotent)."""
+    with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if storage in manifest.get("storage", ["float32"]):
+        return manifest
+    vecs = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+    codes_path = os.path.join(directory, f"vectors.{storage}.npy")
+    codes = np.lib.format.open_memmap(codes_path + ".tmp", mode="w+", shape=vecs.shape,
+                                      dtype=np.float16 if storage == "float16" else np.int8)
+    scales = np.zeros(len(vecs), dtype=np.float32)
+    for lo in range(0, len(vecs), BLOCK_ROWS):
+        c, sc = quantize(np.asarray(vecs[lo:lo + BLOCK_ROWS]), storage)
+        codes[lo:lo + len(c)] = c
+        if sc is not None:
+            scales[lo:lo + len(c)] = sc
+    codes.flush()
+    del codes
+    if storage == "int8":
+        np.save(os.path.join(directory, "scales.npy"), scales)
+    os.replace(codes_path + ".tmp", codes_path)
+    manifest["storage"] = manifest.get("storage", ["float32"]) + [storage]
+    _write_manifest(directory, manifest)
+    return manifest
+
+
+def _build_hnsw(path: str, vecs: np.ndarray, space: str, m: int = 16, ef_construction: int = 200) -> Dict[str, Any]:
+    import hnswlib  # ships with chromadb (chroma-hnswlib)
+
+    graph = hnswlib.Index(space=space, dim=vecs.shape[1])
+    graph.init_index(max_elements=len(vecs), ef_construction=ef_construction, M=m)
+    for lo in range(0, len(vecs), BLOCK_ROWS):
+        hi = min(lo + BLOCK_ROWS, len(vecs))
+        graph.add_items(np.asarray(vecs[lo:hi]), np.arange(lo, hi))
+    graph.save_index(path)
+    return {"m": m, "ef_construction": ef_construction}
+
+
+def collection_space(col) -> str:
+    """
+    The collection's distance space. chromadb 1.x keeps it in the collection
+    configuration (metadata is then empty); older collections only have the
+    "hnsw:space" metadata key.
+    """
+    conf = getattr(col, "configuration", None) or getattr(col, "configuration_json", None) or {}
+    for hnsw in (conf.get("hnsw"), (conf.get("vector_index") or {}).get("hnsw")):
+        if isinstance(hnsw, dict) and hnsw.get("space"):
+            return hnsw["space"]
+    return (col.metadata or {}).get("hnsw:space", "l2")
+
+
+def export_collection(cfg: Optional[Settings] = None, out_dir: Optional[str] = None,
+                      build_hnsw: Optional[bool] = None) -> Dict[str, Any]:
+    """Dump the configured Chroma collection. The graph is built when ann needs it."""
+    cfg = cfg or get_config()
+    sec = cfg.section("rag", "vector_db", "flat")
+    col = chroma_client(cfg)
+    count = col.count()
+    if build_hnsw is None:
+        ann = sec.get("ann", "auto")
+        build_hnsw = ann == "hnsw" or (ann == "auto" and count >= int(sec.get("ann_threshold", 50000)))
+    hnsw = {"m": int(sec.get("hnsw_m", 16)), "ef_construction": int(sec.get("ef_construction", 200))}
+    return write_index(
+        out_dir or index_dir(cfg), _collection_batches(col), count,
+        space=collection_space(col),
+        embedding=embedding_id(cfg), collection=cfg.collection,
+        hnsw=hnsw if build_hnsw else None, storage=sec.get("storage", "float32"),
+    )
+
+
+# --- serving ---------------------------------------------------------------------
+
+class FlatIndex:
+    """
+    Query-compatible stand-in for a Chroma collection (query / count), read
+    only. `embed` (an embedding function) is needed only for query_texts.
+    Metadata filters are not supported: query(where=...) raises ValueError
+    rather than return unfiltered neighbours.
+    """
+
+    def __init__(self, directory: str, embed=None, ann: str = "auto", ann_threshold: int = 50000,
+                 ef_search: int = 64, storage: str = "float32", rescore: int = 4):
+        if ann not in ANN_MODES:
+            raise ValueError(f"ann must be one of {sorted(ANN_MODES)}")
+        if storage not in STORAGES:
+            raise ValueError(f"storage must be one of {list(STORAGES)}")
+        self.directory = directory
+        self.embed = embed
+        with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as f:
+            self.manifest: Dict[str, Any] = json.load(f)
+        if self.manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"{directory}: export format {self.manifest.get('format')}, "
+                             f"expected {FORMAT_VERSION}; re-export")
+        self.space = self.manifest["space"]
+        self.count_ = int(self.manifest["count"])
+        self.vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        self.sqnorms = np.load(os.path.join(directory, "sqnorms.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r")
+        self.storage = storage
+        self.rescore = rescore
+        self.codes, self.scales = self.vectors, None
+        if storage != "float32":
+            if storage not in self.manifest.get("storage", ["float32"]):
+                raise FileNotFoundError(f"{directory} has no {storage} copy; run "
+                                        f"python -m rag.flat_index --compress {storage}")
+            self.codes = np.load(os.path.join(directory, f"vectors.{storage}.npy"), mmap_mode="r")
+            if storage == "int8":
+                self.scales = np.load(os.path.join(directory, "scales.npy"), mmap_mode="r")
+        self._records = None
+        if self.count_:
+            with open(os.path.join(directory, "records.jsonl"), "rb") as f:
+                self._records = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.ef_search = ef_search
+        self._graph = None
+        want_graph = ann == "hnsw" or (ann == "auto" and self.count_ >= ann_threshold)
+        if want_graph and self.manifest.get("hnsw"):
+            try:
+                import hnswlib
+
+                graph = hnswlib.Index(space=self.space, dim=int(self.manifest["dim"]))
+                graph.load_index(os.path.join(directory, "hnsw.bin"), max_elements=self.count_)
+                self._graph = graph
+            except ImportError:
+                pass  # exact search is always available
+        self.mode = "hnsw" if self._graph is not None else "exact"
+
+    def count(self) -> int:
+        return self.count_
+
+    def scan_bytes(self) -> int:
+        """Size of what the exact scan reads per query (the pages each worker keeps hot)."""
+        n = self.codes.nbytes + self.sqnorms.nbytes
+        return n + (self.scales.nbytes if self.scales is not None else 0)
+
+    def info(self) -> Dict[str, Any]:
+        return {"provider": "flat", "mode": self.mode, "count": self.count_,
+                "dim": self.manifest["dim"], "space": self.space, "path": self.directory,
+                "storage": self.storage, "scan_mb": round(self.scan_bytes() / 2**20, 2)}
+
+    def _record(self, row: int) -> Dict[str, Any]:
+        return json.loads(self._records[int(self.offsets[row]):int(self.offsets[row + 1])])
+
+    # ------------------------------------------------------------------
+    def _prepare(self, q: np.ndarray) -> np.ndarray:
+        if self.space == "cosine":
+            q = q / np.clip(np.linalg.norm(q, axis=1, keepdims=True), 1e-12, None)
+        return q
+
+    def _distances(self, q: np.ndarray, dots: np.ndarray, sqnorms: np.ndarray) -> np.ndarray:
+        # dots / sqnorms: (queries x rows); sqnorms may broadcast from (1 x rows)
+        if self.space == "l2":
+            return (sqnorms - 2.0 * dots + np.einsum("ij,ij->i", q, q)[:, None]).astype(np.float32)
+        return (1.0 - dots).astype(np.float32)
+
+    def _block_dots(self, q: np.ndarray, lo: int) -> np.ndarray:
+        block = self.codes[lo:lo + BLOCK_ROWS]
+        if self.codes is self.vectors:
+            return q @ block.T  # (queries x rows)
+        dots = q @ block.astype(np.float32).T
+        if self.scales is not None:
+            dots *= self.scales[lo:lo + BLOCK_ROWS][None, :]
+        return dots
+
+    def _exact(self, q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, distances), each (len(q) x k), nearest first."""
+        if self.codes is not self.vectors and self.rescore > 0:
+            rows, _ = self._scan(q, min(self.count_, k * self.rescore))
+            return self._rescore(q, rows, k)
+        return self._scan(q, k)
+
+    def _scan(self, q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        best_d = np.full((len(q), 0), np.inf, dtype=np.float32)
+        best_i = np.zeros((len(q), 0), dtype=np.int64)
+        for lo in range(0, self.count_, BLOCK_ROWS):
+            dots = self._block_dots(q, lo)
+            d = self._distances(q, dots, self.sqnorms[lo:lo + BLOCK_ROWS][None, :])
+            d = np.concatenate([best_d, d], axis=1)
+            rows = np.broadcast_to(np.arange(lo, lo + dots.shape[1]), dots.shape)
+            idx = np.concatenate([best_i, rows], axis=1)
+            if d.shape[1] > k:
+                part = np.argpartition(d, k - 1, axis=1)[:, :k]
+                d = np.take_along_axis(d, part, axis=1)
+                idx = np.take_along_axis(idx, part, axis=1)
+            best_d, best_i = d, idx
+        order = np.argsort(best_d, axis=1, kind="stable")
+        return np.take_along_axis(best_i, order, axis=1), np.take_along_axis(best_d, order, axis=1)
+
+    def _rescore(self, q: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Re-rank candidate rows with their float32 vectors, read from disk on demand."""
+        uniq, inv = np.unique(rows, return_inverse=True)
+        full = np.asarray(self.vectors[uniq])[inv.reshape(rows.shape)]  # (queries x cands x dim)
+        d = self._distances(q, np.einsum("qcd,qd->qc", full, q), self.sqnorms[rows])
+        order = np.argsort(d, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(rows, order, axis=1), np.take_along_axis(d, order, axis=1)
+
+    def _hnsw(self, q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        self._graph.set_ef(max(self.ef_search, k))
+        rows, dists = self._graph.knn_query(q, k=k)
+        return rows.astype(np.int64), dists.astype(np.float32)
+
+    def search(self, embeddings, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        q = self._prepare(np.atleast_2d(np.asarray(embeddings, dtype=np.float32)))
+        k = min(int(k), self.count_)
+        if k <= 0:
+            return np.zeros((len(q), 0), dtype=np.int64), np.zeros((len(q), 0), dtype=np.float32)
+        return self._hnsw(q, k) if self._graph is not None else self._exact(q, k)
+
+    # chromadb Collection.query, for the arguments rag/search.py and rag/engine.py use
+    def query(self, query_embeddings=None, query_texts: Optional[Sequence[str]] = None, n_results: int = 10,
+              include: Sequence[str] = ("documents", "metadatas", "distances"), where=None, **_):
+        if where:
+            raise ValueError("flat index does not support metadata filters (where=); "
+                             "use the chroma provider")
+        if query_embeddings is None:
+            if self.embed is None:
+                raise ValueError("query_texts needs an embedding function")
+            query_embeddings = self.embed(list(query_texts or []))
+        rows, dists = self.search(query_embeddings, n_results)
+        out: Dict[str, Any] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for qi in range(len(rows)):
+            recs = [self._record(r) for r in rows[qi]]  # ids are always returned, as in Chroma
+            out["ids"].append([r["id"] for r in recs])
+            out["documents"].append([r["doc"] for r in recs])
+            out["metadatas"].append([r["meta"] for r in recs])
+            out["distances"].append([float(d) for d in dists[qi]])
+        # full-precision rows (normalized in cosine space, as Chroma returns them)
+        out["embeddings"] = [np.asarray(self.vectors[r]) for r in rows] if "embeddings" in include else None
+        for key in ("documents", "metadatas", "distances"):
+            if key not in include:
+                out[key] = None
+        return out
+
+
+def load_index(cfg: Optional[Settings] = None, embed=None) -> FlatIndex:
+    cfg = cfg or get_config()
+    sec = cfg.section("rag", "vector_db", "flat")
+    path = index_dir(cfg)
+    if not os.path.exists(os.path.join(path, "manifest.json")):
+        raise FileNotFoundError(f"no flat index at {path}; run python -m rag.flat_index --export")
+    idx = FlatIndex(path, embed, ann=sec.get("ann", "auto"),
+                    ann_threshold=int(sec.get("ann_threshold", 50000)),
+                    ef_search=int(sec.get("ef_search", 64)),
+                    storage=sec.get("storage", "float32"), rescore=int(sec.get("rescore", 4)))
+    want, got = embedding_id(cfg), idx.manifest.get("embedding")
+    if got != want or idx.manifest.get("collection") != cfg.collection:
+        raise ValueError(f"flat index at {path} holds {idx.manifest.get('collection')!r} embedded with "
+                         f"{got!r}; config wants {cfg.collection!r} with {want!r} — re-export")
+    return idx
+
+
+# --- check -----------------------------------------------------------------------
+
+def _norm(s: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", (s or "").lower())).strip()
+
+
+def check(cfg: Optional[Settings] = None, k: int = 4, repeat: int = 5) -> Dict[str, Any]:
+    """
+    Top-k overlap, distance agreement on shared ids (max_distance_diff, in
+    each side's own space) and query latency vs Chroma on baseline.json.
+    """
+    cfg = cfg or get_config()
+    with open(os.path.join(PROJECT_DIR, "ground_truth", "baseline.json"), encoding="utf-8") as f:
+        gold = [json.loads(b) for b in re.split(r"\n\s*\n", f.read()) if b.strip()]
+    questions = [g["question"] for g in gold]
+
+    embed = embedding_function(cfg)
+    t0 = time.perf_counter()
+    col = chroma_client(cfg, embed)
+    col.count()
+    chroma_load = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    flat = load_index(cfg, embed)
+    flat_load = time.perf_counter() - t0
+
+    embs = [np.asarray(e, dtype=np.float32) for e in embed(questions)]
+    report: Dict[str, Any] = {"questions": len(gold), "count": flat.count(), "mode": flat.mode,
+                              "space": {"chroma": collection_space(col), "flat": flat.space},
+                              "load_ms": {"chroma": round(chroma_load * 1000, 2), "flat": round(flat_load * 1000, 2)}}
+    results, timings = {}, {}
+    for name, index in (("chroma", col), ("flat", flat)):
+        samples = []
+        for _ in range(repeat):
+            results[name] = []
+            for e in embs:
+                t = time.perf_counter()
+                results[name].append(index.query(query_embeddings=[e.tolist()], n_results=k,
+                                                 include=["documents", "metadatas", "distances"]))
+                samples.append(time.perf_counter() - t)
+        timings[name] = round(float(np.percentile(np.asarray(samples) * 1000.0, 50)), 3)
+    overlap, max_dist_diff, hits = [], 0.0, {"chroma": 0, "flat": 0}
+    for i, g in enumerate(gold):
+        a, b = results["chroma"][i], results["flat"][i]
+        overlap.append(len(set(a["ids"][0]) & set(b["ids"][0])) / k)
+        da, db = dict(zip(a["ids"][0], a["distances"][0])), dict(zip(b["ids"][0], b["distances"][0]))
+        for cid in set(da) & set(db):
+            max_dist_diff = max(max_dist_diff, abs(da[cid] - db[cid]))
+        for name in hits:
+            docs = results[name][i]["documents"][0]
+            hits[name] += any(_norm(g["gold_citation"]) in _norm(d) for d in docs)
+    report[f"top{k}_overlap"] = round(float(np.mean(overlap)), 4)
+    report["max_distance_diff"] = round(max_dist_diff, 6)
+    report[f"recall@{k}"] = hits
+    report["query_p50_ms"] = timings
+    return report
+
+
+def storage_report(cfg: Optional[Settings] = None, k: int = 4, rescore: Optional[int] = None,
+                   paths: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """
+    Exact-scan memory and retrieval quality per storage over the eval sets:
+    recall@k against the float32 results (1.0 = same top-k), with and without
+    rescoring, and gold-citation hits on the cases that carry one. Adds any
+    missing reduced-precision copy to the export.
+    """
+    from eval.evaluate import DEFAULT_SETS, load_cases
+
+    cfg = cfg or get_config()
+    path = index_dir(cfg)
+    if rescore is None:
+        rescore = int(cfg.section("rag", "vector_db", "flat").get("rescore", 4))
+    cases = load_cases(list(paths or DEFAULT_SETS))
+    embed = embedding_function(cfg)
+    q = np.vstack([np.asarray(e, dtype=np.float32) for e in embed([c["question"] for c in cases])])
+    gold = [(i, _norm(c["gold_citation"])) for i, c in enumerate(cases) if c.get("gold_citation")]
+
+    ref = FlatIndex(path, ann="exact")
+    ref_rows, _ = ref.search(q, k)
+    base_mb = ref.scan_bytes() / 2**20
+    report: Dict[str, Any] = {"cases": len(cases), "count": ref.count(), "dim": ref.manifest["dim"], "k": k}
+    for storage in STORAGES:
+        if storage != "float32":
+            write_compressed(path, storage)
+        for r in ([0] if storage == "float32" else [0, rescore]):
+            idx = FlatIndex(path, ann="exact", storage=storage, rescore=r)
+            samples, rows = [], []
+            for qi in range(len(q)):
+                t = time.perf_counter()
+                rows.append(idx.search(q[qi:qi + 1], k)[0][0])
+                samples.append(time.perf_counter() - t)
+            recall = float(np.mean([len(set(a) & set(b)) / len(b) for a, b in zip(rows, ref_rows) if len(b)]))
+            hits = sum(any(g in _norm(idx._record(row)["doc"]) for row in rows[i]) for i, g in gold)
+            name = storage if storage == "float32" else f"{storage}+rescore{r}" if r else storage
+            report[name] = {
+                "scan_mb": round(idx.scan_bytes() / 2**20, 3),
+                "saved_pct": round(100.0 * (1.0 - idx.scan_bytes() / 2**20 / base_mb), 1) if base_mb else 0.0,
+                f"recall@{k}_vs_float32": round(recall, 4),
+                "recall_delta": round(recall - 1.0, 4),
+                "gold_hits": f"{hits}/{len(gold)}",
+                "query_p50_ms": round(float(np.percentile(np.asarray(samples) * 1000.0, 50)), 3),
+            }
+    return report
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="read-only flat/HNSW export of the Chroma collection")
+    ap.add_argument("--export", action="store_true", help="(re)write the export from Chroma")
+    ap.add_argument("--hnsw", action="store_true", default=None, help="also build the HNSW graph")
+    ap.add_argument("--check", action="store_true", help="agreement + latency report vs Chroma")
+    ap.add_argument("--compress", choices=STORAGES[1:], help="add a reduced-precision copy to the export")
+    ap.add_argument("--storage-report", action="store_true", help="memory + recall per storage on the eval sets")
+    ap.add_argument("-k", type=int, default=4)
+    args = ap.parse_args()
+    cfg = get_config()
+    if args.export:
+        m = export_collection(cfg, build_hnsw=args.hnsw)
+        print(f"Exported {m['count']} x {m['dim']} ({m['space']}, hnsw: {bool(m['hnsw'])}) -> {index_dir(cfg)}")
+    if args.compress:
+        m = write_compressed(index_dir(cfg), args.compress)
+        print(f"Storage copies in {index_dir(cfg)}: {', '.join(m['storage'])}")
+    if args.check:
+        print(json.dumps(check(cfg, args.k), indent=2))
+    if args.storage_report:
+        print(json.dumps(storage_report(cfg, args.k), indent=2))
@@ -1,175 +1,207 @@
-# rag/generate.py
-from __future__ import annotations
-from collections import OrderedDict, defaultdict
-from textwrap import shorten
-import re
-
-TASK_SECTION_HEADERS = [
-    r"main\s+tasks?", r"key\s+tasks?", r"typical\s+tasks?",
-    r"duties", r"key\s+responsibilit(y|ies)", r"responsibilit(y|ies)",
-    r"job\s+tasks?", r"what\s+you'?ll\s+do", r"what\s+you\s+will\s+do",
-    r"position\s+duties", r"role\s+responsibilit(y|ies)"
-]
-NON_TASK_HEADERS = [
-    r"alternative\s+title", r"specialisation", r"exclusion", r"not\s+included",
-    r"occupation\s+level", r"classification", r"overview", r"summary"
-]
-
-TASK_VERBS = [
-    "analyse", "analyze", "assess", "evaluate", "elicit", "document",
-    "gather", "map", "model", "design", "specify", "define", "facilitate",
-    "coordinate", "collaborate", "communicate", "liaise", "translate",
-    "plan", "prioritise", "prioritize", "validate", "verify", "test",
-    "recommend", "implement", "monitor", "support", "improve", "optimise",
-    "optimize", "manage", "lead", "present", "report"
-]
-
-_BULLET_LEAD = re.compile(r"^\s*(?:[-*•\u2022]|[0-9]{1,2}[.)]|–|—)\s*")
-_SENT_SPLIT = re.compile(r"[;•\u2022]|(?<=[.?!])\s+(?=[A-Z])", re.UNICODE | re.MULTILINE)
-
-def _normalize_line(s: str) -> str:
-    s = _BULLET_LEAD.sub("", s.strip())
-    s = re.sub(r"\s+", " ", s)
-    s = s.rstrip(" •;,-")
-    return s
-
-def _looks_like_task(line: str) -> bool:
-    if len(line) < 6: 
-        return False
-    low = line.lower()
-    if re.match(rf"^({'|'.join(TASK_VERBS)})\b", low):
-        return True
-    if any(k in low for k in ["requirements", "specification", "user story", "use case",
-                              "process model", "workflow", "backlog", "acceptance criteria",
-                              "gap analysis", "feasibility", "business case"]):
-        return True
-    if any(k in low for k in ["are excluded", "included in occupation", "classification"]):
-        return False
-    return bool(re.match(r"^[a-z][a-z]+(e|ing|es)\b", low))
-
-def _slice_task_sections(text: str) -> list[str]:
-    lines = text.splitlines()
-    blocks, buf, in_task = [], [], False
-    for raw in lines:
-        line = raw.strip()
-        if not line:
-            if in_task and buf:
-                blocks.append("\n".join(buf)); buf = []
-            continue
-
-        if re.match(rf"^({'|'.join(TASK_SECTION_HEADERS)})\b", line.strip().lower()):
-            if in_task and buf:
-                blocks.append("\n".join(buf)); buf = []
-            in_task = True
-            continue
-
-        if re.match(rf"^({'|'.join(NON_TASK_HEADERS)})\b", line.strip().lower()):
-            if in_task and buf:
-                blocks.append("\n".join(buf)); buf = []
-            in_task = False
-            continue
-
-        if in_task:
-            buf.append(line)
-
-    if in_task and buf:
-        blocks.append("\n".join(buf))
-
-    return blocks if blocks else [text]
-
-def extract_bullets(text: str) -> list[str]:
-    results = []
-    for block in _slice_task_sections(text):
-        for raw in block.splitlines():
-            raw = raw.strip()
-            if not raw:
-                continue
-            line = _normalize_line(raw)
-            if not line:
-                continue
-            if _looks_like_task(line):
-                results.append(line)
-
-        if not results:
-            for sent in _SENT_SPLIT.split(block):
-                line = _normalize_line(sent)
-                if _looks_like_task(line):
-                    results.append(line)
-
-    out = list(OrderedDict((r, 1) for r in results if r).keys())
-    return out
-
-def build_context_and_citations(hits: list[dict]) -> tuple[str, list[dict]]:
-    seen = OrderedDict()
-    citations = []
-    for h in hits:
-        meta = h.get("meta", {})
-        doc  = (h.get("doc") or "").strip()
-        key = (meta.get("source"), meta.get("chunk_id"))
-        if key in seen:
-            continue
-        seen[key] = doc
-        citations.append({
-            "source": meta.get("source"),
-            "role_title": meta.get("role_title"),
-            "chunk_id": meta.get("chunk_id"),
-            "preview": shorten(doc, width=140, placeholder="...")
-        })
-    context = "\n\n".join(seen.values())
-    return context, citations
-
-def make_answer_from_hits(hits: list[dict]) -> list[tuple[str, dict]]:
-    scored = []
-    for rank, h in enumerate(hits):
-        meta = h.get("meta", {})
-        doc  = h.get("doc") or ""
-        weight = 1.0 / (1 + rank) 
-        for bullet in extract_bullets(doc):
-            score = weight
-            low = bullet.lower()
-            if any(k in low for k in ["task", "dutie", "responsibilit"]):
-                score += 0.25
-            if re.match(rf"^({'|'.join(TASK_VERBS)})\b", low):
-                score += 0.25
-            scored.append((score, bullet, meta))
-
-    seen = set()
-    points = []
-    for s, b, m in sorted(scored, key=lambda x: x[0], reverse=True):
-        if b in seen: 
-            continue
-        seen.add(b)
-        points.append((b, m))
-        if len(points) >= 8:
-            break
-    return points
-
-def render_answer_with_citations(points_with_meta: list[tuple[str, dict]], citations: list[dict]) -> str:
-    lines = ["**Answer:**"]
-    for p, _ in points_with_meta[:6]:
-        lines.append(f"- {p}")
-
-    used_keys = OrderedDict()
-    for _, m in points_with_meta:
-        used_keys[(m.get("source"), m.get("chunk_id"))] = True
-
-    ordered_cites = []
-    rest_cites = []
-    for c in citations:
-        key = (c.get("source"), c.get("chunk_id"))
-        if key in used_keys:
-            ordered_cites.append(c)
-        else:
-            rest_cites.append(c)
-
-    lines += ["", "References:"]
-    idx = 1
-    for c in ordered_cites + rest_cites:
-        lines.append(f"[{idx}] {c.get('source')} · {c.get('role_title')} · {c.get('chunk_id')} — {c.get('preview')}")
-        idx += 1
-    return "\n".join(lines)
-
-def make_grounded_answer(hits: list[dict]) -> str:
-    _, citations = build_context_and_citations(hits)
-    points = make_answer_from_hits(hits)
-    return render_answer_with_citations(points, citations)
+# rag/generate.py
+from __future__ import annotations
+from collections import OrderedDict, defaultdict
+from textwrap import shorten
+import re
+
+TASK_SECTION_HEADERS = [
+    r"main\s+tasks?", r"key\s+tasks?", r"typical\s+tasks?",
+    r"duties", r"key\s+responsibilit(y|ies)", r"responsibilit(y|ies)",
+    r"job\s+tasks?", r"what\s+you'?ll\s+do", r"what\s+you\s+will\s+do",
+    r"position\s+duties", r"role\s+responsibilit(y|ies)"
+]
+NON_TASK_HEADERS = [
+    r"alternative\s+title", r"specialisation", r"exclusion", r"not\s+included",
+    r"occupation\s+level", r"classification", r"overview", r"summary"
+]
+
+TASK_VERBS = [
+    "analyse", "analyze", "assess", "evaluate", "elicit", "document",
+    "gather", "map", "model", "design", "specify", "define", "facilitate",
+    "coordinate", "collaborate", "communicate", "liaise", "translate",
+    "plan", "prioritise", "prioritize", "validate", "verify", "test",
+    "recommend", "implement", "monitor", "support", "improve", "optimise",
+    "optimize", "manage", "lead", "present", "report"
+]
+
+_BULLET_LEAD = re.compile(r"^\s*(?:[-*•\u2022]|[0-9]{1,2}[.)]|–|—)\s*")
+_SENT_SPLIT = re.compile(r"[;•\u2022]|(?<=[.?!])\s+(?=[A-Z])", re.UNICODE | re.MULTILINE)
+
+# Compiled once at import. A line is classified with a single match against
+# _HEADER (task header / non-task header / content); content lines are then
+# tested against the task patterns below.
+_WS = re.compile(r"\s+")
+_HEADER = re.compile(
+    rf"^(?:(?P<task>{'|'.join(TASK_SECTION_HEADERS)})|(?P<other>{'|'.join(NON_TASK_HEADERS)}))\b"
+)
+_TASK_VERB = re.compile(rf"^(?:{'|'.join(TASK_VERBS)})\b")
+_TASK_KEYWORDS = re.compile(
+    "requirements|specification|user story|use case|process model|workflow|backlog|"
+    "acceptance criteria|gap analysis|feasibility|business case"
+)
+_NOT_TASK = re.compile("are excluded|included in occupation|classification")
+_VERB_LIKE = re.compile(r"^[a-z][a-z]+(e|ing|es)\b")
+
+HEADER_TASK, HEADER_OTHER, CONTENT = 1, 2, 0
+
+def _normalize_line(s: str) -> str:
+    s = _BULLET_LEAD.sub("", s.strip())
+    s = _WS.sub(" ", s)
+    s = s.rstrip(" •;,-")
+    return s
+
+def _looks_like_task(line: str) -> bool:
+    if len(line) < 6: 
+        return False
+    low = line.lower()
+    if _TASK_VERB.match(low):
+        return True
+    if _TASK_KEYWORDS.search(low):
+        return True
+    if _NOT_TASK.search(low):
+        return False
+    return bool(_VERB_LIKE.match(low))
+
+def _classify(line: str) -> int:
+    m = _HEADER.match(line.lower())
+    if m is None:
+        return CONTENT
+    return HEADER_TASK if m.group("task") is not None else HEADER_OTHER
+
+def _tasks_in_block(lines: list[str], block: str, results: list[str]) -> None:
+    for raw in lines:
+        line = _normalize_line(raw)
+        if line and _looks_like_task(line):
+            results.append(line)
+    if not results:
+        for sent in _SENT_SPLIT.split(block):
+            line = _normalize_line(sent)
+            if _looks_like_task(line):
+                results.append(line)
+
+def extract_bullets(text: str) -> list[str]:
+    """
+    Task-like bullets from the task sections of `text` (the whole text when
+    it has no task section). Lines are sliced and classified in one pass.
+    """
+    results: list[str] = []
+    buf: list[str] = []
+    in_task = found_block = False
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line:
+            if in_task and buf:
+                _tasks_in_block(buf, "\n".join(buf), results); buf = []
+                found_block = True
+            continue
+        kind = _classify(line)
+        if kind != CONTENT:
+            if in_task and buf:
+                _tasks_in_block(buf, "\n".join(buf), results); buf = []
+                found_block = True
+            in_task = kind == HEADER_TASK
+            continue
+        if in_task:
+            buf.append(line)
+
+    if in_task and buf:
+        _tasks_in_block(buf, "\n".join(buf), results)
+        found_block = True
+    if not found_block:
+        _tasks_in_block(text.splitlines(), text, results)
+
+    return list(OrderedDict((r, 1) for r in results if r).keys())
+
+def build_context_and_citations(hits: list[dict]) -> tuple[str, list[dict]]:
+    seen = OrderedDict()
+    citations = []
+    for h in hits:
+        meta = h.get("meta", {})
+        doc  = (h.get("doc") or "").strip()
+        key = (meta.get("source"), meta.get("chunk_id"))
+        if key in seen:
+            continue
+        seen[key] = doc
+        citations.append({
+            "source": meta.get("source"),
+            "role_title": meta.get("role_title"),
+            "chunk_id": meta.get("chunk_id"),
+            "preview": shorten(doc, width=140, placeholder="...")
+        })
+    context = "\n\n".join(seen.values())
+    return context, citations
+
+# Bullets are extracted once at index time (ingest / BM25 build) and stored on
+# the chunk. Chroma metadata values must be scalars, so they travel as one
+# newline-joined string.
+BULLET_SEP = "\n"
+
+
+def pack_bullets(bullets: list[str]) -> str:
+    return BULLET_SEP.join(bullets)
+
+
+def hit_bullets(hit: dict) -> list[str]:
+    """Precomputed bullets of a hit; chunks indexed before they existed are extracted here."""
+    stored = (hit.get("meta") or {}).get("bullets")
+    if isinstance(stored, str):
+        return stored.split(BULLET_SEP) if stored else []
+    if isinstance(stored, (list, tuple)):
+        return list(stored)
+    return extract_bullets(hit.get("doc") or "")
+
+
+def make_answer_from_hits(hits: list[dict]) -> list[tuple[str, dict]]:
+    scored = []
+    for rank, h in enumerate(hits):
+        meta = h.get("meta", {})
+        weight = 1.0 / (1 + rank) 
+        for bullet in hit_bullets(h):
+            score = weight
+            low = bullet.lower()
+            if any(k in low for k in ["task", "dutie", "responsibilit"]):
+                score += 0.25
+            if _TASK_VERB.match(low):
+                score += 0.25
+            scored.append((score, bullet, meta))
+
+    seen = set()
+    points = []
+    for s, b, m in sorted(scored, key=lambda x: x[0], reverse=True):
+        if b in seen: 
+            continue
+        seen.add(b)
+        points.append((b, m))
+        if len(points) >= 8:
+            break
+    return points
+
+def render_answer_with_citations(points_with_meta: list[tuple[str, dict]], citations: list[dict]) -> str:
+    lines = ["**Answer:**"]
+    for p, _ in points_with_meta[:6]:
+        lines.append(f"- {p}")
+
+    used_keys = OrderedDict()
+    for _, m in points_with_meta:
+        used_keys[(m.get("source"), m.get("chunk_id"))] = True
+
+    ordered_cites = []
+    rest_cites = []
+    for c in citations:
+        key = (c.get("source"), c.get("chunk_id"))
+        if key in used_keys:
+            ordered_cites.append(c)
+        else:
+            rest_cites.append(c)
+
+    lines += ["", "References:"]
+    idx = 1
+    for c in ordered_cites + rest_cites:
+        lines.append(f"[{idx}] {c.get('source')} · {c.get('role_title')} · {c.get('chunk_id')} — {c.get('preview')}")
+        idx += 1
+    return "\n".join(lines)
+
+def make_grounded_answer(hits: list[dict]) -> str:
+    _, citations = build_context_and_citations(hits)
+    points = make_answer_from_hits(hits)
+    return render_answer_with_citations(points, citations)
@@ -0,0 +1,325 @@
+# rag/ingest.py — incremental ingest: only changed chunks are re-embedded
+import argparse
+import hashlib
+import pathlib
+import re
+import multiprocessing
+import time
+import unicodedata
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from typing import Optional
+
+import chardet
+import numpy as np
+
+from rag import roles
+from rag.config import PROJECT_DIR, get_config
+from rag.engine import chroma_client, embedding_id
+from rag.generate import extract_bullets, pack_bullets
+
+
+def simple_clean(text: str) -> str:
+    lines = []
+    for ln in text.splitlines():
+        t = ln.strip()
+        if not t:
+            continue
+        if not re.match(r"^[\w\s\-\*,.:;/()'’]+$", t):
+            continue
+        lines.append(t)
+    out, last = [], None
+    for t in lines:
+        if t != last:
+            out.append(t)
+            last = t
+    return "\n".join(out)
+
+
+def load_cfg():
+    return get_config()
+
+
+def _abs(path: str) -> pathlib.Path:
+    p = pathlib.Path(path)
+    return p if p.is_absolute() else pathlib.Path(PROJECT_DIR) / p
+
+
+def normalize_to_utf8(p: pathlib.Path, out_dir: pathlib.Path) -> str:
+    raw = p.read_bytes()
+    enc = chardet.detect(raw)["encoding"] or "utf-8"
+    text = raw.decode(enc, errors="replace")
+    text = unicodedata.normalize("NFKC", text)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out = out_dir / (p.stem + ".utf8.txt")
+    out.write_text(text, encoding="utf-8")
+    return str(out)
+
+
+def source_files(cfg):
+    """Raw *.txt files (normalized into data_processed/), else the already-processed *.utf8.txt."""
+    raw_dir = _abs(cfg.data_raw_dir)
+    processed = _abs(cfg.data_processed_dir)
+    raw = sorted(f for f in raw_dir.glob("*.txt") if not f.name.endswith(".utf8.txt")) if raw_dir.is_dir() else []
+    if raw:
+        return [pathlib.Path(normalize_to_utf8(f, processed)) for f in raw]
+    files = sorted(processed.glob("*.utf8.txt"))
+    assert files, f"No source files in {raw_dir} or {processed}"
+    return files
+
+
+def split_sections(text: str):
+
+    blocks = re.split(r"\n(?=\d{5,}\s+[A-Z].+)", text)
+    out = []
+    for b in blocks:
+        if not b.strip(): continue
+
+        m = re.match(r"(\d{5,})\s+([^\n]+)", b)
+        role_code, role_title = (m.group(1), m.group(2).strip()) if m else ("", "Unknown")
+
+        sections = re.split(r"\n(?=Skill level:|Main tasks|Specialisation|Alternative title)", b)
+        for s in sections:
+            s2 = s.strip()
+            if len(s2) < 50: continue
+            out.append({"role_code": role_code, "role_title": role_title, "section": s2})
+    return out
+
+
+def sliding_chunks(text: str, chunk_size=320, overlap=64):
+    words = text.split()
+    i, res = 0, []
+    while i < len(words):
+        res.append(" ".join(words[i:i+chunk_size]))
+        i += max(1, chunk_size - overlap)
+    return res
+
+
+def _section_slug(section: str) -> str:
+    head = section.split("\n", 1)[0]
+    m = re.match(r"(Skill level|Main tasks|Specialisation|Alternative title)", head)
+    return re.sub(r"\W+", "-", m.group(1).lower()) if m else "overview"
+
+
+def content_hash(doc: str, meta: dict, embed_model: str) -> str:
+    # bullets are part of the stored record, so a change in extraction re-upserts the chunk
+    h = hashlib.sha256()
+    for part in (embed_model, meta.get("role_title", ""), meta.get("bullets", ""), doc):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:32]
+
+
+def iter_chunks(cfg, files):
+    """
+    Yields (chunk_id, text, meta), one file at a time. Chunk ids are keyed
+    on role code + section, not position, so an edit in one role block
+    leaves every other chunk id (and its embedding) untouched.
+    """
+    seen = Counter()
+    for sec in (s for f in files for s in split_sections(f.read_text(encoding="utf-8"))):
+        slug = _section_slug(sec["section"])
+        base = f'{cfg.source_name}:{sec["role_code"] or "x"}:{slug}'
+        seen[base] += 1
+        if seen[base] > 1:
+            base = f"{base}-{seen[base]}"
+        for ci, ch in enumerate(sliding_chunks(sec["section"], cfg.chunk_size, cfg.overlap)):
+            cid = f"{base}:{ci}"
+            meta = {
+                "source": cfg.source_name,
+                "role_title": sec["role_title"],
+                "section": slug,
+                "chunk_idx": ci,
+                "chunk_id": cid,
+                # answer bullets, extracted once here rather than on every query
+                "bullets": pack_bullets(extract_bullets(ch)),
+            }
+            meta["content_hash"] = content_hash(ch, meta, embedding_id(cfg))
+            yield cid, ch, meta
+
+
+def build_chunks(cfg, files):
+    return {cid: (ch, meta) for cid, ch, meta in iter_chunks(cfg, files)}
+
+
+_MISSING = object()
+
+
+def existing_hashes(col, source: str):
+    got = col.get(where={"source": source}, include=["metadatas"])
+    return {i: (m or {}).get("content_hash") for i, m in zip(got["ids"], got["metadatas"])}
+
+
+# --- embedding pipeline ------------------------------------------------------
+# Chunks stream through a bounded number of in-flight batches; each batch is
+# encoded in a worker process (own copy of the model) and upserted with its
+# embeddings as soon as it finishes, so memory stays flat as the corpus grows.
+
+_MODEL = None
+
+
+def _init_worker(model_name: str, provider: str = "sentence-transformers",
+                 model_dir: Optional[str] = None) -> None:
+    global _MODEL
+    if provider == "onnx-int8":
+        from rag.onnx_embed import OnnxEmbedder
+
+        # load only: the parent built the export before starting the pool;
+        # one intra-op thread per worker, the pool provides the parallelism
+        _MODEL = OnnxEmbedder(model_dir, threads=1)
+        return
+    from sentence_transformers import SentenceTransformer
+
+    _MODEL = SentenceTransformer(model_name, device="cpu")
+
+
+def _encode(texts):
+    if hasattr(_MODEL, "session"):  # OnnxEmbedder
+        return _MODEL.encode(list(texts))
+    # same model/settings as Chroma's SentenceTransformerEmbeddingFunction
+    return _MODEL.encode(list(texts), batch_size=len(texts), convert_to_numpy=True).astype(np.float32)
+
+
+class Progress:
+    def __init__(self, every_s: float = 2.0):
+        self.start = time.perf_counter()
+        self.done = 0
+        self.every_s = every_s
+        self._last = self.start
+
+    def update(self, n: int) -> None:
+        self.done += n
+        now = time.perf_counter()
+        if now - self._last >= self.every_s:
+            self._last = now
+            print(f"  embedded {self.done} chunks ({self.rate():.1f} chunks/s)", flush=True)
+
+    def rate(self) -> float:
+        dt = time.perf_counter() - self.start
+        return self.done / dt if dt > 0 else 0.0
+
+
+def _batches(items, size: int):
+    batch = []
+    for it in items:
+        batch.append(it)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def embed_and_upsert(col, items, model_name: str, batch_size: int = 64, workers: int = 1,
+                     max_inflight: int = 0, progress: Progress = None,
+                     provider: str = "sentence-transformers") -> int:
+    """
+    Encode (id, text, meta) items in batches of `batch_size` across `workers`
+    processes (0 = in this process) and upsert each batch with its embeddings.
+    At most `max_inflight` batches (default 2 per worker) are queued at once.
+    """
+    progress = progress or Progress()
+    model_dir = None
+    if provider == "onnx-int8":
+        from rag.onnx_embed import ensure_export
+
+        model_dir = ensure_export(load_cfg())  # once, here, not racing in every worker
+
+    def sink(batch, embs):
+        col.upsert(
+            ids=[b[0] for b in batch],
+            documents=[b[1] for b in batch],
+            metadatas=[b[2] for b in batch],
+            embeddings=embs.tolist(),
+        )
+        progress.update(len(batch))
+
+    if workers <= 0:
+        if _MODEL is None:
+            _init_worker(model_name, provider, model_dir)
+        for batch in _batches(items, batch_size):
+            sink(batch, _encode([b[1] for b in batch]))
+        return progress.done
+
+    max_inflight = max_inflight or 2 * workers
+    ctx = multiprocessing.get_context("spawn")  # torch is not fork-safe
+    with ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(model_name, provider, model_dir)) as pool:
+        inflight = {}
+        for batch in _batches(items, batch_size):
+            if len(inflight) >= max_inflight:
+                done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    sink(inflight.pop(fut), fut.result())
+            inflight[pool.submit(_encode, [b[1] for b in batch])] = batch
+        for fut in as_completed(list(inflight)):
+            sink(inflight.pop(fut), fut.result())
+    return progress.done
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Incrementally (re)index the OSCA corpus into Chroma.")
+    ap.add_argument("--dry-run", action="store_true", help="report what would change, write nothing")
+    ap.add_argument("--workers", type=int, default=None, help="embedding processes (0 = in-process)")
+    ap.add_argument("--batch-size", type=int, default=None, help="chunks per embedding batch")
+    args = ap.parse_args(argv)
+
+    cfg = load_cfg()
+    sec = cfg.section("rag", "ingest")
+    workers = args.workers if args.workers is not None else int(sec.get("workers", 1))
+    batch_size = args.batch_size or cfg.embed_batch_size
+
+    files = source_files(cfg)
+    col = chroma_client(cfg)
+    existing = existing_hashes(col, cfg.source_name)
+
+    seen = set()
+    counts = {"added": 0, "updated": 0, "unchanged": 0}
+
+    def changed():
+        # streams only new/changed chunks into the pipeline
+        for cid, ch, meta in iter_chunks(cfg, files):
+            seen.add(cid)
+            old = existing.get(cid, _MISSING)
+            if old is _MISSING:
+                counts["added"] += 1
+            elif old != meta["content_hash"]:
+                counts["updated"] += 1
+            else:
+                counts["unchanged"] += 1
+                continue
+            yield cid, ch, meta
+
+    progress = Progress()
+    if args.dry_run:
+        for _ in changed():
+            pass
+    else:
+        embed_and_upsert(col, changed(), cfg.embed_model, batch_size, workers,
+                         int(sec.get("max_inflight", 0)), progress, cfg.embed_provider)
+    removed = [i for i in existing if i not in seen]
+    if removed and not args.dry_run:
+        col.delete(ids=removed)
+
+    total = counts["added"] + counts["updated"] + counts["unchanged"]
+    print(
+        f"Ingest {'plan' if args.dry_run else 'done'}: {total} chunks from {len(files)} file(s) — "
+        f"added {counts['added']}, updated {counts['updated']}, removed {len(removed)}, "
+        f"unchanged {counts['unchanged']}"
+    )
+    if not args.dry_run and pathlib.Path(roles.DATA_FILE).exists():
+        rix = roles.load_or_build()
+        print(f"Role index: {len(rix['roles'])} roles -> {roles.INDEX_FILE}")
+    if not args.dry_run and cfg.vector_provider == "flat":
+        from rag.flat_index import export_collection, index_dir
+
+        m = export_collection(cfg)
+        print(f"Flat index: {m['count']} x {m['dim']} (hnsw: {bool(m['hnsw'])}) -> {index_dir(cfg)}")
+    if progress.done:
+        print(f"Embedded {progress.done} chunks in {time.perf_counter() - progress.start:.1f}s "
+              f"({progress.rate():.1f} chunks/s, batch {batch_size}, workers {workers})")
+    return dict(counts, removed=len(removed))
+
+
+if __name__ == "__main__":
+    main()
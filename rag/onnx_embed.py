@@ -0,0 +1,253 @@
+# rag/onnx_embed.py — int8-quantized ONNX Runtime encoder for the sentence-transformers model (CPU)
+"""
+    python -m rag.onnx_embed --export    # export + quantize models.embeddings.model
+    python -m rag.onnx_embed --check     # cosine agreement + recall@k vs the PyTorch model
+
+Selected with `models.embeddings.provider: "onnx-int8"`; used by the query
+engine (rag/engine.py) and by rag/ingest.py. The export is built on first use
+if it is missing. It needs torch + transformers (already pulled in by
+sentence-transformers); serving needs only onnxruntime + tokenizers. Neither
+is in requirements.txt: pip install -r requirements-onnx.txt.
+"""
+from __future__ import annotations
+
+import argparse
+import importlib
+import json
+import os
+import re
+import shutil
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from rag.config import PROJECT_DIR, Settings, get_config
+
+PROVIDER = "onnx-int8"
+EXPORT_DIR = os.path.join(PROJECT_DIR, "index", "onnx")
+MAX_SEQ_LEN = 256  # all-MiniLM-L6-v2's sentence-transformers max_seq_length
+
+
+def _require(module: str):
+    try:
+        return importlib.import_module(module)
+    except ImportError as e:
+        raise ImportError(f"embeddings provider {PROVIDER!r} needs {module.split('.')[0]}: "
+                          f"pip install -r requirements-onnx.txt") from e
+
+
+def _hf_name(model: str) -> str:
+    return model if "/" in model else f"sentence-transformers/{model}"
+
+
+def export_dir(cfg: Settings) -> str:
+    path = cfg.section("models", "embeddings").get("onnx_path")
+    if path:
+        return path if os.path.isabs(path) else os.path.join(PROJECT_DIR, path)
+    slug = re.sub(r"\W+", "-", cfg.embed_model).strip("-").lower()
+    return os.path.join(EXPORT_DIR, f"{slug}-int8")
+
+
+def export_int8(model: str, out_dir: str) -> str:
+    """
+    Export the transformer to ONNX and dynamically quantize its weights to
+    int8. Built in a private temp dir and renamed into place, so concurrent
+    exporters never see each other's half-written files.
+    """
+    torch = _require("torch")
+    quant = _require("onnxruntime.quantization")
+    transformers = _require("transformers")
+
+    tmp = f"{out_dir.rstrip(os.sep)}.tmp{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    try:
+        _export_to(torch, quant, transformers, model, tmp)
+        if os.path.exists(out_dir):
+            shutil.rmtree(out_dir)
+        os.replace(tmp, out_dir)
+    except OSError:
+        # another process finished first: keep its export
+        if not os.path.exists(os.path.join(out_dir, "model.int8.onnx")):
+            raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return os.path.join(out_dir, "model.int8.onnx")
+
+
+def _export_to(torch, quant, transformers, model: str, out_dir: str) -> None:
+    tok = transformers.AutoTokenizer.from_pretrained(_hf_name(model))
+    net = transformers.AutoModel.from_pretrained(_hf_name(model)).eval()
+    sample = tok(["warm up"], return_tensors="pt")
+    fp32 = os.path.join(out_dir, "model.fp32.onnx")
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    dyn = {n: {0: "batch", 1: "seq"} for n in names}
+    dyn["last_hidden_state"] = {0: "batch", 1: "seq"}
+    with torch.no_grad():
+        torch.onnx.export(
+            net, tuple(sample[n] for n in names), fp32,
+            input_names=names, output_names=["last_hidden_state"],
+            dynamic_axes=dyn, opset_version=14,
+        )
+    quant.quantize_dynamic(fp32, os.path.join(out_dir, "model.int8.onnx"), weight_type=quant.QuantType.QInt8)
+    os.remove(fp32)
+    tok.save_pretrained(out_dir)
+    with open(os.path.join(out_dir, "export.json"), "w", encoding="utf-8") as f:
+        json.dump({"model": model, "quantization": "dynamic-int8", "max_seq_len": MAX_SEQ_LEN}, f)
+
+
+class OnnxEmbedder:
+    """
+    Drop-in for chromadb's SentenceTransformerEmbeddingFunction: mean-pooled,
+    L2-normalized sentence embeddings (the same pipeline as the
+    sentence-transformers model: Transformer -> Pooling(mean) -> Normalize).
+    """
+
+    def __init__(self, model_dir: str, threads: int = 0):
+        ort = _require("onnxruntime")
+        Tokenizer = _require("tokenizers").Tokenizer
+
+        self.model_dir = model_dir
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(MAX_SEQ_LEN)
+        self.tokenizer.enable_padding()
+        opts = ort.SessionOptions()
+        if threads:
+            opts.intra_op_num_threads = threads
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, "model.int8.onnx"), opts, providers=["CPUExecutionProvider"]
+        )
+        self._inputs = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        enc = self.tokenizer.encode_batch(list(texts))
+        feed = {
+            "input_ids": np.array([e.ids for e in enc], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in enc], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in enc], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {k: v for k, v in feed.items() if k in self._inputs})[0]
+        mask = feed["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+    # chromadb EmbeddingFunction protocol
+    def __call__(self, input: List[str]) -> List[np.ndarray]:
+        return list(self.encode(list(input)))
+
+
+def ensure_export(cfg: Optional[Settings] = None) -> str:
+    """The export directory for cfg, built first if it is missing."""
+    cfg = cfg or get_config()
+    out_dir = export_dir(cfg)
+    if not os.path.exists(os.path.join(out_dir, "model.int8.onnx")):
+        export_int8(cfg.embed_model, out_dir)
+    return out_dir
+
+
+def load_embedder(cfg: Optional[Settings] = None, threads: int = 0) -> OnnxEmbedder:
+    return OnnxEmbedder(ensure_export(cfg), threads)
+
+
+# --- parity check ----------------------------------------------------------------
+
+def _rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return None
+
+
+def _timed_load(fn):
+    # RSS growth while loading, in this process: run the two loads in separate
+    # processes for absolute numbers
+    before = _rss_mb()
+    t0 = time.perf_counter()
+    obj = fn()
+    load_s = time.perf_counter() - t0
+    after = _rss_mb()
+    return obj, load_s, (after - before) if before is not None and after is not None else None
+
+
+def _p50_ms(encode, queries: List[str], repeat: int = 3) -> float:
+    samples = []
+    for _ in range(repeat):
+        for q in queries:
+            t0 = time.perf_counter()
+            encode([q])
+            samples.append(time.perf_counter() - t0)
+    return float(np.percentile(np.asarray(samples) * 1000.0, 50))
+
+
+def _norm(s: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", (s or "").lower())).strip()
+
+
+def parity_check(cfg: Optional[Settings] = None, k: int = 4) -> Dict[str, Any]:
+    """
+    Cosine agreement between reference (PyTorch) and int8 embeddings over the
+    OSCA chunks, and recall@k on ground_truth/baseline.json (a hit = a top-k
+    chunk containing the gold citation) for reference, int8 and mixed setups
+    (int8 queries against a reference-built index).
+    """
+    from sentence_transformers import SentenceTransformer
+
+    from rag.ingest import iter_chunks, source_files
+
+    cfg = cfg or get_config()
+    docs = [ch for _, ch, _ in iter_chunks(cfg, source_files(cfg))]
+    with open(os.path.join(PROJECT_DIR, "ground_truth", "baseline.json"), encoding="utf-8") as f:
+        gold = [json.loads(b) for b in re.split(r"\n\s*\n", f.read()) if b.strip()]
+    questions = [g["question"] for g in gold]
+
+    ref_model, ref_load_s, ref_mb = _timed_load(lambda: SentenceTransformer(cfg.embed_model, device="cpu"))
+    int8_model, int8_load_s, int8_mb = _timed_load(lambda: load_embedder(cfg))
+    ref_enc = lambda t: ref_model.encode(list(t), convert_to_numpy=True, normalize_embeddings=True)
+
+    ref_docs, int8_docs = ref_enc(docs), int8_model.encode(docs)
+    ref_q, int8_q = ref_enc(questions), int8_model.encode(questions)
+    doc_cos = np.sum(ref_docs * int8_docs, axis=1)
+    q_cos = np.sum(ref_q * int8_q, axis=1)
+
+    contains = np.array([[_norm(g["gold_citation"]) in _norm(d) for d in docs] for g in gold])
+
+    def recall(q_emb, d_emb):
+        top = np.argsort(-(q_emb @ d_emb.T), axis=1, kind="stable")[:, :k]
+        return int(sum(contains[i, top[i]].any() for i in range(len(gold)))), top
+
+    ref_hits, ref_top = recall(ref_q, ref_docs)
+    int8_hits, int8_top = recall(int8_q, int8_docs)
+    mixed_hits, mixed_top = recall(int8_q, ref_docs)
+    overlap = float(np.mean([len(set(a) & set(b)) / k for a, b in zip(ref_top, int8_top)]))
+
+    return {
+        "chunks": len(docs),
+        "questions": len(gold),
+        "cosine_docs": {"mean": round(float(doc_cos.mean()), 5), "min": round(float(doc_cos.min()), 5)},
+        "cosine_queries": {"mean": round(float(q_cos.mean()), 5), "min": round(float(q_cos.min()), 5)},
+        f"recall@{k}": {"reference": ref_hits, "int8": int8_hits, "int8_queries_ref_index": mixed_hits},
+        f"top{k}_overlap": round(overlap, 4),
+        "encode_p50_ms": {"reference": round(_p50_ms(ref_enc, questions), 2),
+                          "int8": round(_p50_ms(int8_model.encode, questions), 2)},
+        "load_s": {"reference": round(ref_load_s, 2), "int8": round(int8_load_s, 2)},
+        "rss_delta_mb": {"reference": ref_mb and round(ref_mb, 1), "int8": int8_mb and round(int8_mb, 1)},
+    }
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="int8 ONNX embedding backend")
+    ap.add_argument("--export", action="store_true", help="(re)build the int8 export")
+    ap.add_argument("--check", action="store_true", help="parity report vs the reference model")
+    ap.add_argument("-k", type=int, default=4)
+    args = ap.parse_args()
+    cfg = get_config()
+    if args.export:
+        print("int8 model ->", export_int8(cfg.embed_model, export_dir(cfg)))
+    if args.check:
+        print(json.dumps(parity_check(cfg, args.k), indent=2))
@@ -0,0 +1,194 @@
+# rag/roles.py — structured OSCA role records with direct lookup by code / title
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+from textwrap import shorten
+from typing import Any, Dict, List, Optional, Tuple
+
+from rag.bm25_index import DATA_FILE, PROJECT_DIR, file_sha256
+
+INDEX_FILE = os.path.join(PROJECT_DIR, "index", "roles.json")
+INDEX_VERSION = 1
+SOURCE = "OSCA ICT Roles (role index)"
+
+_ROLE_HEAD = re.compile(r"^\s*(?:-\s*)?(\d{6})\s+([A-Z].*?)\s*$")
+_SECTION_HEAD = re.compile(
+    r"^(alternative\s+titles?|specialisations?|main\s+tasks?)\s*:?\s*$|^skill\s+level\s*:\s*(\d+)", re.I
+)
+_BULLET = re.compile(r"^\s*[*•·‧∙-]\s*(.+?)\s*$")
+_WORD = re.compile(r"[a-z0-9]+")
+
+# task/description questions the role index can answer on its own
+ROLE_QUESTION = re.compile(
+    r"(main\s*tasks?|key\s*tasks?|tasks?|dut(?:y|ies)|responsibilit(?:y|ies)|core\s*duties|"
+    r"role\s+of|what\s+does|what\s+do|describe|explain|overview|summari[sz]e|what\s+is\s+an?\b|kind\s+of\s+work)",
+    re.I,
+)
+
+
+def _norm(s: str) -> Tuple[str, ...]:
+    return tuple(_WORD.findall(s.lower()))
+
+
+def parse_roles(text: str) -> List[Dict[str, Any]]:
+    """Split OSCA text into one record per 6-digit occupation (repeated blocks are merged)."""
+    roles: Dict[str, Dict[str, Any]] = {}
+    cur: Optional[Dict[str, Any]] = None
+    section = "description"
+
+    for raw in text.replace("\r\n", "\n").split("\n"):
+        line = raw.strip()
+        if not line:
+            continue
+        m = _ROLE_HEAD.match(line)
+        if m:
+            code, title = m.group(1), m.group(2)
+            cur = roles.setdefault(code, {
+                "code": code, "title": title, "description": "", "exclusions": [],
+                "alternative_titles": [], "specialisations": [], "skill_level": None,
+                "main_tasks": [],
+            })
+            section = "description"
+            continue
+        if cur is None:
+            continue
+        h = _SECTION_HEAD.match(line)
+        if h:
+            if h.group(2):
+                cur["skill_level"] = int(h.group(2))
+                section = "skill"
+            else:
+                name = h.group(1).lower()
+                section = ("alternative_titles" if name.startswith("alternative")
+                           else "specialisations" if name.startswith("specialisation")
+                           else "main_tasks")
+            continue
+        b = _BULLET.match(line)
+        if b and section in {"alternative_titles", "specialisations", "main_tasks"}:
+            item = b.group(1).rstrip(" .")
+            if item not in cur[section]:
+                cur[section].append(item)
+        elif section == "description":
+            if re.search(r"excluded from this occupation|included in occupation", line, re.I):
+                if line not in cur["exclusions"]:
+                    cur["exclusions"].append(line)
+            elif not cur["description"]:
+                cur["description"] = line
+    return list(roles.values())
+
+
+def build_role_index(path: str = DATA_FILE) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        roles = parse_roles(f.read())
+    names: Dict[str, str] = {}
+    for r in roles:
+        for name in [r["title"]] + r["alternative_titles"]:
+            key = " ".join(_norm(name))
+            if key and key not in names:  # a title wins over another role's alternative title
+                names[key] = r["code"]
+    return {
+        "version": INDEX_VERSION,
+        "sha256": file_sha256(path),
+        "roles": {r["code"]: r for r in roles},
+        "names": names,
+    }
+
+
+def save_role_index(index: Dict[str, Any], out_path: str = INDEX_FILE) -> None:
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp = f"{out_path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, out_path)
+
+
+def load_or_build(path: str = DATA_FILE, index_path: str = INDEX_FILE) -> Dict[str, Any]:
+    digest = file_sha256(path)
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") == INDEX_VERSION and index.get("sha256") == digest:
+            return index
+    except (OSError, ValueError):
+        pass
+    index = build_role_index(path)
+    try:
+        save_role_index(index, index_path)
+    except OSError:
+        pass
+    return index
+
+
+class RoleIndex:
+    def __init__(self, index: Dict[str, Any]):
+        self.roles: Dict[str, Dict[str, Any]] = index["roles"]
+        self.names: Dict[Tuple[str, ...], str] = {tuple(k.split()): v for k, v in index["names"].items()}
+        self.max_len = max((len(k) for k in self.names), default=0)
+
+    def lookup(self, query: str) -> Optional[Dict[str, Any]]:
+        """Role named in the query (6-digit code, title or alternative title), longest name first."""
+        m = re.search(r"\b(\d{6})\b", query)
+        if m and m.group(1) in self.roles:
+            return self.roles[m.group(1)]
+        words = _norm(query)
+        for n in range(min(self.max_len, len(words)), 0, -1):
+            for i in range(len(words) - n + 1):
+                code = self.names.get(words[i:i + n])
+                if code is not None:
+                    return self.roles[code]
+        return None
+
+
+_LOCK = threading.Lock()
+_CACHE: Optional[Tuple[Any, RoleIndex]] = None
+
+
+def get_role_index(path: str = DATA_FILE) -> RoleIndex:
+    global _CACHE
+    st = os.stat(path)
+    key = (path, st.st_mtime_ns, st.st_size)
+    cached = _CACHE
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    with _LOCK:
+        if _CACHE is None or _CACHE[0] != key:
+            _CACHE = (key, RoleIndex(load_or_build(path)))
+        return _CACHE[1]
+
+
+def answer_from_role(role: Dict[str, Any]) -> Dict[str, Any]:
+    """answer_with_rag-shaped result built straight from a role record."""
+    label = f'{role["code"]} {role["title"]}'
+    cite = {
+        "source": SOURCE,
+        "role_title": label,
+        "chunk_id": f'role:{role["code"]}',
+        "preview": shorten(role["description"] or label, width=140, placeholder="..."),
+    }
+    lines = ["**Answer:**", f"- {label}"]
+    if role["description"]:
+        lines.append(f'- {role["description"]}')
+    lines += [f"- {t}" for t in role["main_tasks"]]
+    lines += ["", "References:", f'[1] {SOURCE} · {label} · {cite["chunk_id"]} — {cite["preview"]}']
+    return {"answer": "\n".join(lines), "citations": [cite], "used": True, "score": 1.0, "role": role["code"]}
+
+
+def role_answer(query: str) -> Optional[Dict[str, Any]]:
+    """Direct answer for a task/description question about a known role, else None."""
+    if not ROLE_QUESTION.search(query or ""):
+        return None
+    try:
+        role = get_role_index().lookup(query)
+    except OSError:
+        return None
+    if role is None or not (role["main_tasks"] or role["description"]):
+        return None
+    return answer_from_role(role)
+
+
+if __name__ == "__main__":
+    idx = load_or_build()
+    print(f"Role index: {len(idx['roles'])} roles, {len(idx['names'])} names -> {INDEX_FILE}")
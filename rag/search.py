@@ -1,119 +1,136 @@
 # rag/search.py (patched with BM25 fallback)
-import os
-
-import chromadb
-import yaml
-from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
-from rank_bm25 import BM25Okapi
-
-
-def load_cfg():
-    return yaml.safe_load(open("config.yml", "r", encoding="utf-8"))
-
-
-# --- ABSOLUTE PATH + ROBUST CHUNKING ---
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
 
-# search.py lives in ./rag, project root is one directory up
-PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DATA_FILE = os.path.join(PROJECT_DIR, "data_processed", "osca_ict_roles.utf8.txt")
+import numpy as np
 
+from rag import tracing
+from rag.config import get_config
+from rag.engine import get_engine
 
-def _load_bm25_corpus():
-    path = DATA_FILE
-    if not os.path.exists(path):
-        raise FileNotFoundError(f"osca_ict_roles.utf8.txt not found at: {path}")
 
-    with open(path, "r", encoding="utf-8", errors="ignore") as f:
-        text = f.read()
+def load_cfg():
+    # parsed once and cached; re-read only when config.yml changes
+    return get_config()
 
-    # Normalize newlines and bullets
-    text = text.replace("\r\n", "\n").replace("\r", "\n")
-    text = (
-        text.replace("•", "* ").replace("·", "* ").replace("‧", "* ").replace("∙", "* ")
-    )
 
-    # Primary split: start of a role line like "- 273232 ICT Business Analyst" or "273232 ICT Business Analyst"
-    blocks = re.split(r"(?m)(?=^\s*(?:-\s*)?\d{6}\s+[A-Z].+)", text)
+# --- ABSOLUTE PATH + ROBUST CHUNKING (see rag/bm25_index.py) ---
+from rag.bm25_index import DATA_FILE, get_bm25_index
 
-    # Fallback if the above didn’t work well
-    if len(blocks) < 5:
-        blocks = re.split(r"\n{2,}", text)
 
-    # Clean up
-    raw_chunks = [b.strip() for b in blocks if b and b.strip()]
-    tokenized = [c.split() for c in raw_chunks]
-    return raw_chunks, BM25Okapi(tokenized)
+def _load_bm25_corpus():
+    # chunks + SparseBM25, built once per data-file hash and cached on disk
+    index = get_bm25_index(DATA_FILE)
+    return index["chunks"], index["bm25"]
 
 
 # ---------------------------------------
 
 
-def chroma_client(cfg):
-    embed = SentenceTransformerEmbeddingFunction(model_name=cfg["embed_model"])
-    client = chroma.PersistentClient(path=cfg["index_dir"])
-    col = client.get_or_create_collection(
-        name=cfg["collection"], embedding_function=embed
-    )
-    return col
+def vector_search(col, query, k, embedding=None, with_embeddings=False):
+    # pass a precomputed embedding to skip re-encoding the query inside Chroma
+    embeddings = None if embedding is None else [embedding]
+    return vector_search_many(col, [query], k, embeddings, with_embeddings)[0]
 
 
-def vector_search(col, query, k):
+def vector_search_many(col, queries, k, embeddings=None, with_embeddings=False):
+    """One col.query for all queries; returns one hit list per query."""
+    if embeddings is not None:
+        q = {"query_embeddings": [np.asarray(e, dtype=float).tolist() for e in embeddings]}
+    else:
+        q = {"query_texts": list(queries)}
+    include = ["documents", "metadatas", "distances"]
+    if with_embeddings:
+        include.append("embeddings")
     r = col.query(
-        query_texts=[query],
+        **q,
         n_results=k,
-        include=["documents", "metadatas", "distances"],
+        include=include,
     )
-    hits = []
-    for i, doc in enumerate(r["documents"][0]):
-        meta = r["metadatas"][0][i]
-        dist = r["distances"][0][i]
-        score = max(0.0, min(1.0, 1.0 - dist))
-        hits.append({"doc": doc, "meta": meta, "score": score})
-    return hits
+    out = []
+    for qi in range(len(queries)):
+        hits = []
+        for i, doc in enumerate(r["documents"][qi]):
+            meta = r["metadatas"][qi][i]
+            dist = r["distances"][qi][i]
+            score = max(0.0, min(1.0, 1.0 - dist))
+            hits.append({"doc": doc, "meta": meta, "score": score})
+            if with_embeddings:
+                hits[-1]["embedding"] = r["embeddings"][qi][i]
+        out.append(hits)
+    return out
+
+
+def mmr_select(query_emb, cand_embs, k: int, lam: float = 0.5):
+    """
+    Indices of k candidates picked by maximal marginal relevance:
+    argmax lam * sim(query, c) - (1 - lam) * max sim(c, picked), cosine.
+    All pairwise similarities come from one matrix product; each of the k
+    greedy steps is an argmax over a running max-similarity vector.
+    """
+    c = np.asarray(cand_embs, dtype=np.float32)
+    n = len(c)
+    if n == 0 or k <= 0:
+        return []
+    c = c / np.clip(np.linalg.norm(c, axis=1, keepdims=True), 1e-12, None)
+    q = np.asarray(query_emb, dtype=np.float32).ravel()
+    q = q / max(float(np.linalg.norm(q)), 1e-12)
+    rel = c @ q
+    sim = c @ c.T
+    picked = [int(np.argmax(rel))]
+    taken = np.zeros(n, dtype=bool)
+    taken[picked[0]] = True
+    redundancy = sim[picked[0]].copy()
+    for _ in range(min(k, n) - 1):
+        gain = lam * rel - (1.0 - lam) * redundancy
+        gain[taken] = -np.inf
+        j = int(np.argmax(gain))
+        picked.append(j)
+        taken[j] = True
+        np.maximum(redundancy, sim[j], out=redundancy)
+    return picked
+
+
+def _mmr_hits(hits, query_emb, k: int, lam: float):
+    embs = [h.pop("embedding") for h in hits]
+    if len(hits) <= k:
+        return hits
+    with tracing.span("mmr", fetched=len(hits), k=k):
+        return [hits[i] for i in mmr_select(query_emb, np.vstack(embs), k, lam)]
 
 
 # rag/search.py
 def bm25_search(query: str, k: int):
-    import re
+    with tracing.span("bm25", k=k):
+        return _bm25_search(query, k)
+
 
-    chunks, bm = _load_bm25_corpus()
-    scores = bm.get_scores(query.split())
-    ranked = sorted(list(enumerate(scores)), key=lambda t: t[1], reverse=True)
+def _bm25_search(query: str, k: int):
+    index = get_bm25_index(DATA_FILE)
+    chunks, bm = index["chunks"], index["bm25"]
+    # only the query terms' postings are scored; top candidates by partial selection
+    top_ids, top_scores, mx = bm.top_k(query.split(), max(k * 3, k))
 
     TASK_HINTS = re.compile(
         r"(main\s*tasks?|dut(?:y|ies)|responsibilit(?:y|ies)|key\s*tasks?|core\s*duties?)",
         re.IGNORECASE,
     )
 
-    def infer_role_title(txt: str) -> str:
-        m = re.search(r"(?m)^\s*(\d{6}\s+[A-Za-z].+)$", txt) or re.search(
-            r"(?m)^\s*-\s*(\d{6}\s+[A-Za-z].+)$", txt
-        )
-        if m:
-            return m.group(1).strip()
-        for line in txt.splitlines():
-            if line.strip() and any(
-                w in line.lower()
-                for w in ["ict", "analyst", "developer", "manager", "engineer"]
-            ):
-                return line.strip()
-        return "OSCA ICT Roles"
-
     hits = []
-    mx = max(scores) if scores is not None and len(scores) else 1.0
-    for idx, sc in ranked[: max(k * 3, k)]:  # look a bit deeper before taking top k
+    for idx, sc in zip(top_ids.tolist(), top_scores.tolist()):  # look a bit deeper before taking top k
         doc = chunks[idx]
         bonus = 0.15 if TASK_HINTS.search(doc) else 0.0
         norm = (float(sc) / float(mx) if mx else 0.0) + bonus
-        rt = infer_role_title(doc)
         hits.append(
             {
                 "doc": doc,
                 "meta": {
                     "source": "OSCA ICT Roles (BM25 Fallback)",
-                    "role_title": rt,
+                    "role_title": index["role_titles"][idx],
                     "chunk_id": idx,
+                    "bullets": index["bullets"][idx],
                 },
                 "score": min(norm, 1.0),
             }
@@ -124,12 +141,165 @@ def bm25_search(query: str, k: int):
     return hits[:k]
 
 
-def search(query: str):
+# --- HYBRID: vector + BM25 in parallel, fused with reciprocal rank fusion ---
+_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retriever")
+
+
+def _vector_fetch(cfg, k: int) -> int:
+    # MMR over-fetches and diversifies down to k
+    return max(cfg.mmr_fetch_k, k) if cfg.mmr else k
+
+
+def _vector_hits(query: str, k: int):
     cfg = load_cfg()
-    try:
-        col = chroma_client(cfg)
-        hits = vector_search(col, query, cfg["top_k"])
+    with tracing.span("vector", k=k):
+        engine = get_engine()
+        with tracing.span("embed"):
+            emb = engine.embed([query])[0]
+        hits = vector_search(engine.collection(), query, _vector_fetch(cfg, k), emb, cfg.mmr)
+        if cfg.mmr:
+            hits = _mmr_hits(hits, emb, k, cfg.mmr_lambda)
         hits.sort(key=lambda x: x["score"], reverse=True)
         return hits
+
+
+def _fusion_key(hit: dict) -> str:
+    # both retrievers can surface the same text under different chunk ids
+    return re.sub(r"\s+", " ", (hit.get("doc") or "")).strip()
+
+
+def rrf_fuse(ranked: dict, k: int, rrf_k: int = 60):
+    """
+    Reciprocal rank fusion of {retriever_name: [hit, ...]}. Order is by
+    sum(1 / (rrf_k + rank)); "score" stays the best per-retriever score so the
+    low-confidence threshold in answer_with_rag keeps its meaning.
+    """
+    fused = {}
+    for name, hits in ranked.items():
+        for rank, h in enumerate(hits, 1):
+            key = _fusion_key(h)
+            cur = fused.get(key)
+            if cur is None:
+                cur = {"doc": h.get("doc"), "meta": dict(h.get("meta") or {}), "score": 0.0,
+                       "_rrf": 0.0, "_scores": {}}
+                fused[key] = cur
+            cur["_rrf"] += 1.0 / (rrf_k + rank)
+            cur["_scores"][name] = float(h.get("score", 0.0))
+            cur["score"] = max(cur["score"], float(h.get("score", 0.0)))
+
+    out = sorted(fused.values(), key=lambda x: x["_rrf"], reverse=True)[:k]
+    for h in out:
+        h["meta"]["rrf_score"] = round(h.pop("_rrf"), 6)
+        h["meta"]["retriever_scores"] = h.pop("_scores")
+    return out
+
+
+def _vector_hits_many(queries, k: int):
+    cfg = load_cfg()
+    engine = get_engine()
+    # a single embedding batch and a single Chroma query for the whole list
+    embs = engine.embed(list(queries))
+    lists = vector_search_many(engine.collection(), queries, _vector_fetch(cfg, k), embs, cfg.mmr)
+    if cfg.mmr:
+        lists = [_mmr_hits(hits, e, k, cfg.mmr_lambda) for hits, e in zip(lists, embs)]
+    for hits in lists:
+        hits.sort(key=lambda x: x["score"], reverse=True)
+    return lists
+
+
+def hybrid_search(query: str, k: int, cfg):
+    """
+    Run vector and BM25 retrieval concurrently, each with its own deadline.
+    A retriever that misses its deadline (or errors) is dropped from the
+    fusion instead of holding up the answer.
+    """
+    fetch = max(k * 2, k)
+    timeouts = {
+        "vector": cfg.vector_timeout_s,
+        "bm25": cfg.bm25_timeout_s,
+    }
+    start = time.monotonic()
+    futures = {
+        "vector": _POOL.submit(tracing.bind(_vector_hits), query, fetch),
+        "bm25": _POOL.submit(tracing.bind(bm25_search), query, fetch),
+    }
+    ranked, missed = {}, {}
+    for name in sorted(futures, key=timeouts.get):
+        remaining = start + timeouts[name] - time.monotonic()
+        try:
+            ranked[name] = futures[name].result(timeout=max(0.0, remaining))
+        except FutureTimeout:
+            futures[name].cancel()
+            missed[name] = "timeout"
+        except Exception as e:
+            missed[name] = f"{type(e).__name__}: {e}"
+
+    tracing.note(served="+".join(sorted(ranked)) or None, missed=dict(missed) or None)
+    hits = rrf_fuse(ranked, k, cfg.rrf_k)
+    for h in hits:
+        h["meta"]["retrievers_missed"] = ", ".join(sorted(missed)) or None
+    return hits
+
+
+def retriever_mode(cfg) -> str:
+    if cfg.retriever_mode == "vector" and cfg.use_bm25:
+        return "hybrid"
+    return cfg.retriever_mode
+
+
+def search(query: str):
+    with tracing.span("config"):
+        cfg = load_cfg()
+    k = cfg.top_k
+    mode = retriever_mode(cfg)
+    with tracing.span("search", mode=mode, k=k) as sp:
+        if mode == "bm25":
+            sp["served"] = "bm25"
+            return bm25_search(query, k)
+        if mode == "hybrid":
+            return hybrid_search(query, k, cfg)
+        try:
+            hits = _vector_hits(query, k)
+            sp["served"] = "vector"
+            return hits
+        except Exception as e:
+            sp["served"] = "bm25"
+            sp["fallback"] = f"{type(e).__name__}: {e}"
+            return bm25_search(query, k)
+
+
+def search_many(queries):
+    """search() for a list of queries, batching the vector side into one query."""
+    queries = list(queries)
+    if not queries:
+        return []
+    cfg = load_cfg()
+    k = cfg.top_k
+    mode = retriever_mode(cfg)
+    if mode == "bm25":
+        return [bm25_search(q, k) for q in queries]
+    if mode == "hybrid":
+        fetch = max(k * 2, k)
+        start = time.monotonic()
+        fut = _POOL.submit(_vector_hits_many, queries, fetch)
+        bm25_lists = [bm25_search(q, fetch) for q in queries]
+        try:
+            vec_lists = fut.result(timeout=max(0.0, start + cfg.vector_timeout_s - time.monotonic()))
+            missed = None
+        except FutureTimeout:
+            fut.cancel()
+            vec_lists, missed = [None] * len(queries), "vector"
+        except Exception:
+            vec_lists, missed = [None] * len(queries), "vector"
+        out = []
+        for vec, bm in zip(vec_lists, bm25_lists):
+            ranked = {"vector": vec, "bm25": bm} if vec is not None else {"bm25": bm}
+            hits = rrf_fuse(ranked, k, cfg.rrf_k)
+            for h in hits:
+                h["meta"]["retrievers_missed"] = missed
+            out.append(hits)
+        return out
+    try:
+        return _vector_hits_many(queries, k)
     except Exception:
-        return bm25_search(query, cfg.get("top_k", 4))
+        return [bm25_search(q, k) for q in queries]
@@ -0,0 +1,200 @@
+# rag/tracing.py — opt-in per-request timing spans (route -> search -> answer / salary)
+"""
+A trace is started by router.aroute when tracing is on (config `tracing.enabled`
+or route(query, trace=True)). Code below it opens spans with
+
+    with tracing.span("bm25", k=k) as sp:
+        ...
+        sp["hits"] = len(hits)
+
+and can add attributes to the innermost open span with tracing.note(...).
+With no active trace, span() returns a shared no-op and note() returns
+immediately, so instrumented code costs one ContextVar lookup per call.
+
+The active trace and span live in ContextVars: asyncio tasks and
+asyncio.to_thread inherit them; plain executors need tracing.bind(fn).
+"""
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from rag.config import PROJECT_DIR, get_config
+
+_TRACE: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("rag_trace", default=None)
+_SPAN: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("rag_span", default=None)
+
+
+class Trace:
+    def __init__(self, name: str, **attrs: Any):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = attrs
+        self.spans: List[Dict[str, Any]] = []
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def _ms(self, t: float) -> float:
+        return round((t - self._t0) * 1000.0, 3)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted((dict(s) for s in self.spans), key=lambda s: s["start_ms"])
+        return {"id": self.id, "name": self.name, **self.attrs,
+                "total_ms": self._ms(time.perf_counter()), "spans": spans}
+
+
+class _Span:
+    __slots__ = ("trace", "rec", "_t", "_tok")
+
+    def __init__(self, trace: Trace, stage: str, attrs: Dict[str, Any]):
+        parent = _SPAN.get()
+        self.trace = trace
+        self.rec = {"stage": stage, "parent": parent["stage"] if parent else None, **attrs}
+
+    def __enter__(self) -> Dict[str, Any]:
+        self._t = time.perf_counter()
+        self.rec["start_ms"] = self.trace._ms(self._t)
+        self._tok = _SPAN.set(self.rec)
+        return self.rec
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _SPAN.reset(self._tok)
+        self.rec["duration_ms"] = round((time.perf_counter() - self._t) * 1000.0, 3)
+        if exc_type is not None:
+            self.rec["error"] = f"{exc_type.__name__}: {exc}"
+        with self.trace._lock:
+            self.trace.spans.append(self.rec)
+
+
+class _NoSpan:
+    """Returned when tracing is off: a context manager whose record discards writes."""
+
+    class _Sink(dict):
+        def __setitem__(self, key, value):
+            pass
+
+        def update(self, *a, **kw):
+            pass
+
+    _SINK = _Sink()
+
+    def __enter__(self) -> Dict[str, Any]:
+        return self._SINK
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+
+_NO_SPAN = _NoSpan()
+
+
+def active() -> bool:
+    return _TRACE.get() is not None
+
+
+def span(stage: str, **attrs: Any):
+    trace = _TRACE.get()
+    if trace is None:
+        return _NO_SPAN
+    return _Span(trace, stage, attrs)
+
+
+def note(**attrs: Any) -> None:
+    """Add attributes to the innermost open span (no-op without a trace)."""
+    if _TRACE.get() is None:
+        return
+    rec = _SPAN.get()
+    if rec is not None:
+        rec.update(attrs)
+
+
+def bind(fn: Callable) -> Callable:
+    """fn running in the caller's trace context, for ThreadPoolExecutor.submit."""
+    if _TRACE.get() is None:
+        return fn
+    ctx = contextvars.copy_context()
+    return lambda *a, **kw: ctx.run(fn, *a, **kw)
+
+
+class start:
+    """`with tracing.start("route", query=q) as trace:` activates a new trace."""
+
+    def __init__(self, name: str, **attrs: Any):
+        self.trace = Trace(name, **attrs)
+
+    def __enter__(self) -> Trace:
+        self._tok = _TRACE.set(self.trace)
+        self._span_tok = _SPAN.set(None)
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _SPAN.reset(self._span_tok)
+        _TRACE.reset(self._tok)
+
+
+# --- exporters -----------------------------------------------------------------
+
+
+class JsonlExporter:
+    """Appends one JSON object per finished trace to `path`."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def export(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+_EXPORTER: Any = None  # None = not configured yet, False = no exporter
+_EXPORTER_KEY: Any = None  # `tracing:` section it was built from; None when set_exporter() was used
+_EXPORTER_LOCK = threading.Lock()
+
+
+def set_exporter(exporter: Any) -> None:
+    """Install an object with .export(dict) (or None to disable exporting)."""
+    global _EXPORTER, _EXPORTER_KEY
+    _EXPORTER = exporter if exporter is not None else False
+    _EXPORTER_KEY = None
+
+
+def _configured_exporter() -> Any:
+    global _EXPORTER, _EXPORTER_KEY
+    sec = get_config().section("tracing")
+    if _EXPORTER is None or (_EXPORTER_KEY is not None and _EXPORTER_KEY != sec):
+        with _EXPORTER_LOCK:
+            if _EXPORTER is None or (_EXPORTER_KEY is not None and _EXPORTER_KEY != sec):
+                exp: Any = False
+                if sec.get("exporter", "jsonl") == "jsonl":
+                    path = sec.get("path") or "logs/traces.jsonl"
+                    if not os.path.isabs(path):
+                        path = os.path.join(PROJECT_DIR, path)
+                    try:
+                        exp = JsonlExporter(path)
+                    except OSError:
+                        exp = False  # read-only checkout: traces stay on the result only
+                _EXPORTER, _EXPORTER_KEY = exp, dict(sec)
+    return _EXPORTER or None
+
+
+def export(record: Dict[str, Any]) -> None:
+    exp = _configured_exporter()
+    if exp is None:
+        return
+    try:
+        exp.export(record)
+    except Exception:
+        pass  # tracing must never fail a request
+
+
+def enabled() -> bool:
+    return bool(get_config().section("tracing").get("enabled", False))
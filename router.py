@@ -1,10 +1,17 @@
 # router.py — RAG / Salary router (covers baseline.json as RAG)
 from __future__ import annotations
-from typing import Dict, Any, Tuple
-import re
+from typing import AsyncIterator, Callable, Dict, Any, List, Optional, Tuple
+from concurrent.futures import TimeoutError as FutureTimeout
+import asyncio
+import copy
+import threading
 
-from tools.rag_tool import answer_with_rag
-from tools.salary_tool import salary_tool
+from rag import tracing
+from rag.answer_cache import AnswerCache
+from rag.config import get_config
+from rag.engine import get_engine
+from tools.rag_tool import answer_with_rag, answer_with_rag_batch
+from tools.salary_tool import asalary_tool
 
 DOC_HINTS = [
     "according to", "from the document", "osca", "ict", "job family",
@@ -30,36 +37,265 @@ def _detect_intents(query: str) -> Tuple[bool, bool]:
     doc_like    = any(k in ql for k in DOC_HINTS)
     return salary_like, doc_like
 
-def _safe_rag(query: str) -> Dict[str, Any]:
-    rag = answer_with_rag(query)
+def intent_route(query: str) -> str:
+    """The route aroute will take for `query`: "rag", "salary" or "both"."""
+    salary_like, doc_like = _detect_intents(query)
+    return "both" if salary_like and doc_like else "salary" if salary_like else "rag"
+
+# progress callback used by aroute_stream: emit(event, payload)
+Emit = Callable[[str, Any], None]
+
+def _no_emit(event: str, payload: Any) -> None:
+    pass
+
+def _safe_rag(query: str, on_citations=None) -> Dict[str, Any]:
+    rag = answer_with_rag(query, on_citations=on_citations)
     return {"rag": rag, "rag_error": rag.get("error")}
 
-def _safe_salary(query: str) -> Dict[str, Any]:
-    try:
-        out = salary_tool(query)
-        return {"tool": {"name": "salary_tool", "output": out}}
-    except Exception as e:
-        return {"tool": {"name": "salary_tool", "error": str(e)}}
+async def _arag(query: str, timeout: float, emit: Emit = _no_emit) -> Dict[str, Any]:
+    with tracing.span("rag", timeout_s=timeout) as sp:
+        on_citations = None if emit is _no_emit else (lambda cits: emit("citations", cits))
+        try:
+            out = await asyncio.wait_for(asyncio.to_thread(_safe_rag, query, on_citations), timeout)
+        except asyncio.TimeoutError:
+            sp["timed_out"] = True
+            err = f"timeout after {timeout}s"
+            rag = {"answer": "", "citations": [], "used": False, "score": 0.0, "error": err}
+            out = {"rag": rag, "rag_error": err, "timed_out": ["rag"]}
+        emit("rag", out["rag"])
+        return out
+
+async def _asalary(query: str, timeout: float, emit: Emit = _no_emit) -> Dict[str, Any]:
+    with tracing.span("salary", timeout_s=timeout) as sp:
+        try:
+            out = await asyncio.wait_for(asalary_tool(query), timeout)
+            res = {"tool": {"name": "salary_tool", "output": out}}
+        except asyncio.TimeoutError:
+            sp["timed_out"] = True
+            res = {"tool": {"name": "salary_tool", "error": f"timeout after {timeout}s"},
+                   "timed_out": ["salary"]}
+        except Exception as e:
+            res = {"tool": {"name": "salary_tool", "error": str(e)}}
+        emit("tool", res["tool"])
+        return res
+
+def _cache_embed(query: str):
+    # semantic tier only once the model is loaded; never warm it up from here
+    engine = get_engine()
+    return engine.embed([query])[0] if engine.ready else None
+
+ANSWER_CACHE: Optional[AnswerCache] = None
+_ANSWER_CACHE_KEY: Any = None  # the `cache:` section ANSWER_CACHE was built from
+_ANSWER_CACHE_LOCK = threading.Lock()
+
+def answer_cache() -> Optional[AnswerCache]:
+    """The answer cache for the current `cache:` settings; rebuilt (empty) when they change."""
+    global ANSWER_CACHE, _ANSWER_CACHE_KEY
+    cfg = get_config()
+    sec = cfg.section("cache")
+    if sec != _ANSWER_CACHE_KEY:
+        with _ANSWER_CACHE_LOCK:
+            if sec != _ANSWER_CACHE_KEY:
+                ANSWER_CACHE = (AnswerCache.from_config(cfg, embed=_cache_embed, route_of=intent_route)
+                                if sec.get("enabled", True) else None)
+                _ANSWER_CACHE_KEY = copy.deepcopy(sec)
+    return ANSWER_CACHE
 
-def route(query: str) -> Dict[str, Any]:
-    result: Dict[str, Any] = {}
+def _cacheable(result: Dict[str, Any]) -> bool:
+    if result.get("error") or result.get("rag_error") or result.get("partial"):
+        return False
+    # "salary" route: result["tool"]; "both": result["tools"] — either may carry the error
+    # itself or inside the salary output
+    tools = ([result["tool"]] if "tool" in result else []) + list(result.get("tools") or [])
+    return not any(t.get("error") or (t.get("output") or {}).get("error") for t in tools)
+
+async def aroute(query: str, trace: Optional[bool] = None, cache: bool = True,
+                 emit: Emit = _no_emit) -> Dict[str, Any]:
+    """
+    asyncio entry point. For the "both" route the RAG and salary branches run
+    concurrently, each under its own timeout (routing.rag_timeout_s /
+    routing.salary_timeout_s); a branch that times out is reported with an
+    error and the result is marked {"partial": True, "timed_out": [...]}.
+
+    With tracing on (`trace=True`, or config tracing.enabled when trace is
+    None) the result carries a "trace" dict of timing spans, which is also
+    handed to the configured exporter. `cache=False` bypasses the answer cache;
+    `emit` receives progress events (see aroute_stream).
+    """
     q = (query or "").strip()
     if not q:
         return {"route": "rag", "error": "empty query"}
+    run = _acached if cache else _aroute
+    if not (tracing.enabled() if trace is None else trace):
+        return await run(q, emit)
+
+    with tracing.start("route", query=q) as tr:
+        result = await run(q, emit)
+    result["trace"] = tr.to_dict()
+    result["trace"]["route"] = result.get("route")
+    tracing.export(result["trace"])
+    return result
 
-    salary_like, doc_like = _detect_intents(q)
+async def _acached(q: str, emit: Emit = _no_emit) -> Dict[str, Any]:
+    cache = answer_cache()
+    if cache is None:
+        return await _aroute(q, emit)
 
-    if salary_like and doc_like:
-        result["route"] = "both"
-        result.update(_safe_rag(q))
-        result["tools"] = [{"name": "salary_tool", "output": _safe_salary(q)["tool"].get("output", {})}]
-        return result
+    with tracing.span("cache.get") as sp:
+        cached = await asyncio.to_thread(cache.get, q)
+        sp["hit"] = cached["cache"] if cached is not None else None
+    if cached is not None:
+        emit("route", {"route": cached.get("route"), "cache": cached["cache"]})
+        return cached
+    result = await _aroute(q, emit)
+    if _cacheable(result):
+        with tracing.span("cache.put"):
+            await asyncio.to_thread(cache.put, q, result)
+    return result
+
+async def _aroute(q: str, emit: Emit = _no_emit) -> Dict[str, Any]:
+    sec = get_config().section("routing")
+    rag_timeout = float(sec.get("rag_timeout_s", 15.0))
+    salary_timeout = float(sec.get("salary_timeout_s", 10.0))
 
-    if salary_like and not doc_like:
-        result["route"] = "salary"
-        result.update(_safe_salary(q))
-        return result
+    result: Dict[str, Any] = {"route": intent_route(q)}
+    emit("route", {"route": result["route"]})
 
-    result["route"] = "rag"
-    result.update(_safe_rag(q))
+    if result["route"] == "both":
+        rag, sal = await asyncio.gather(_arag(q, rag_timeout, emit), _asalary(q, salary_timeout, emit))
+        result.update(rag)
+        tool = sal["tool"]
+        entry = {"name": "salary_tool", "output": tool.get("output", {})}
+        if "error" in tool:
+            entry["error"] = tool["error"]
+        result["tools"] = [entry]
+        timed_out = rag.get("timed_out", []) + sal.get("timed_out", [])
+    elif result["route"] == "salary":
+        sal = await _asalary(q, salary_timeout, emit)
+        result["tool"] = sal["tool"]
+        timed_out = sal.get("timed_out", [])
+    else:
+        rag = await _arag(q, rag_timeout, emit)
+        result.update(rag)
+        timed_out = rag.get("timed_out", [])
+
+    result.pop("timed_out", None)
+    if timed_out:
+        result["partial"] = True
+        result["timed_out"] = timed_out
     return result
+
+async def aroute_rag_batch(queries: List[str], cache: bool = True) -> List[Dict[str, Any]]:
+    """
+    aroute for queries that take the "rag" route (see intent_route), with
+    the cache misses answered by one batched retrieval (answer_with_rag_batch)
+    under routing.rag_timeout_s. No tracing or progress events.
+    """
+    qs = [(q or "").strip() for q in queries]
+    store = answer_cache() if cache else None
+    out: List[Any] = [None] * len(qs)
+    if store is not None:
+        out = [await asyncio.to_thread(store.get, q) for q in qs]
+    todo = [i for i, r in enumerate(out) if r is None]
+    if not todo:
+        return out
+
+    timeout = float(get_config().section("routing").get("rag_timeout_s", 15.0))
+    try:
+        rags = await asyncio.wait_for(asyncio.to_thread(answer_with_rag_batch, [qs[i] for i in todo]), timeout)
+    except asyncio.TimeoutError:
+        err = f"timeout after {timeout}s"
+        for i in todo:
+            rag = {"answer": "", "citations": [], "used": False, "score": 0.0, "error": err}
+            out[i] = {"route": "rag", "rag": rag, "rag_error": err, "partial": True, "timed_out": ["rag"]}
+        return out
+    for i, rag in zip(todo, rags):
+        out[i] = {"route": "rag", "rag": rag, "rag_error": rag.get("error")}
+        if store is not None and _cacheable(out[i]):
+            await asyncio.to_thread(store.put, qs[i], out[i])
+    return out
+
+class LoopThread:
+    """
+    An asyncio loop running forever on a daemon thread. Unlike asyncio.run, a
+    coroutine submitted here returns as soon as it finishes: branches that
+    timed out inside asyncio.to_thread keep running in the loop's executor
+    without holding up the caller.
+    """
+
+    def __init__(self, name: str = "router-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True, name=name)
+        self._thread.start()
+
+    def run(self, coro, timeout: Optional[float] = None):
+        fut = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return fut.result(timeout)
+        except FutureTimeout:
+            fut.cancel()
+            raise
+
+    def stop(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+_LOOP: Optional[LoopThread] = None
+_LOOP_LOCK = threading.Lock()
+
+def _run_sync(coro):
+    global _LOOP
+    if _LOOP is None:
+        with _LOOP_LOCK:
+            if _LOOP is None:
+                _LOOP = LoopThread()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is _LOOP.loop:
+        coro.close()
+        raise RuntimeError("route() called from the router loop itself; await aroute() instead")
+    # also fine from inside another event loop (e.g. an async web handler): it only blocks that thread
+    return _LOOP.run(coro)
+
+async def aroute_stream(query: str, trace: Optional[bool] = None) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    aroute as a stream of (event, payload) pairs, in the order they happen:
+
+      "route"     {"route": ...}            right after intent detection (or a cache hit)
+      "citations" [citation, ...]           once retrieval returns (not for role-index answers)
+      "rag"       answer_with_rag result
+      "tool"      {"name": "salary_tool", "output"|"error": ...}
+      "done"      the full aroute result    always last
+
+    Closing the generator early cancels the remaining work.
+    """
+    loop = asyncio.get_running_loop()
+    events: "asyncio.Queue[Tuple[str, Any]]" = asyncio.Queue()
+
+    def emit(event: str, payload: Any) -> None:
+        # also called from the RAG worker thread, possibly after the stream was closed
+        try:
+            loop.call_soon_threadsafe(events.put_nowait, (event, payload))
+        except RuntimeError:
+            pass
+
+    task = asyncio.ensure_future(aroute(query, trace, emit=emit))
+    try:
+        while True:
+            getter = asyncio.ensure_future(events.get())
+            done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                yield getter.result()
+                continue
+            getter.cancel()
+            await asyncio.sleep(0)  # let events scheduled just before completion land
+            while not events.empty():
+                yield events.get_nowait()
+            yield "done", task.result()
+            return
+    finally:
+        task.cancel()
+
+def route(query: str, trace: Optional[bool] = None, cache: bool = True) -> Dict[str, Any]:
+    return _run_sync(aroute(query, trace, cache))
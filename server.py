@@ -0,0 +1,306 @@
+# server.py — headless JSON API over router.route (stdlib only, runs fully locally)
+"""
+    python server.py [--host 127.0.0.1] [--port 8080] [--workers 8] [--allow-degraded]
+
+    POST /route        {"query": "...", "trace": false}      -> router.route(...) dict
+    POST /route/batch  {"queries": ["...", ...]}             -> {"results": [dict, ...]}
+    GET  /healthz                                            -> 200 once warm, else 503
+
+Connections are served by a fixed pool of `workers` threads (HTTP/1.1
+keep-alive; idle connections are closed after keepalive_timeout_s). Beyond
+workers + backlog open connections, new ones get an immediate 503. Every
+request runs on one shared asyncio loop under request_timeout_s; a query that
+runs over it returns 504 (in a batch, just that entry carries an error).
+In an untraced batch, the queries that only need RAG share one batched
+retrieval (router.aroute_rag_batch); any of them that comes back with an
+error is retried on its own, as are all of them if the batch call fails.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from rag import tracing
+from rag.bm25_index import get_bm25_index
+from rag.config import get_config
+from rag.engine import get_engine
+from rag.roles import get_role_index
+from router import LoopThread, aroute, aroute_rag_batch, intent_route
+
+_BUSY = (
+    b"HTTP/1.1 503 Service Unavailable\r\nContent-Type: application/json\r\n"
+    b"Content-Length: 24\r\nConnection: close\r\nRetry-After: 1\r\n\r\n"
+    b'{"error": "server busy"}'
+)
+
+
+class Warmup:
+    """Loads config, BM25 + role indexes and the vector engine in the background."""
+
+    def __init__(self, allow_degraded: bool = False):
+        self.allow_degraded = allow_degraded
+        self.done = threading.Event()
+        self.error: Optional[str] = None
+        self.seconds: Optional[float] = None
+
+    def start(self) -> "Warmup":
+        threading.Thread(target=self._run, daemon=True, name="warmup").start()
+        return self
+
+    def _run(self) -> None:
+        t0 = time.perf_counter()
+        try:
+            get_config()
+            get_bm25_index()
+            get_role_index()
+            get_engine().warm_up()
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+        finally:
+            self.seconds = round(time.perf_counter() - t0, 3)
+            self.done.set()
+
+    def status(self) -> Tuple[bool, Dict[str, Any]]:
+        engine = get_engine()
+        if not self.done.is_set():
+            state = "warming"
+        elif self.error:
+            state = "error"
+        elif engine.ready:
+            state = "ok"
+        else:
+            state = "degraded"  # BM25 fallback only
+        ok = state == "ok" or (state == "degraded" and self.allow_degraded)
+        return ok, {"status": state, "vector": engine.status(), "error": self.error,
+                    "warmup_seconds": self.seconds}
+
+
+def _request_timeout(timeout: float) -> Dict[str, Any]:
+    return {"route": None, "error": f"timeout after {timeout}s", "partial": True, "timed_out": ["request"]}
+
+
+async def _route_one(query: str, timeout: float, trace: Optional[bool],
+                     budget: Optional[float] = None) -> Dict[str, Any]:
+    # budget: time actually left for this query (a batch retry), if less than timeout
+    budget = timeout if budget is None else budget
+    if budget <= 0:
+        return _request_timeout(timeout)
+    try:
+        return await asyncio.wait_for(aroute(query, trace), budget)
+    except asyncio.TimeoutError:
+        return _request_timeout(timeout)
+
+
+async def _route_rag_batch(queries: List[str], timeout: float) -> List[Dict[str, Any]]:
+    if not queries:
+        return []
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    try:
+        results = await asyncio.wait_for(aroute_rag_batch(queries), timeout)
+    except asyncio.TimeoutError:
+        return [_request_timeout(timeout) for _ in queries]
+    except Exception:
+        results = [{"rag_error": "batch failed"}] * len(queries)
+    # per-query fallback for whatever the shared retrieval could not answer
+    retry = [i for i, r in enumerate(results) if r.get("rag_error") and not r.get("partial")]
+    if retry:
+        again = await asyncio.gather(*(_route_one(queries[i], timeout, False, deadline - loop.time()) for i in retry))
+        for i, r in zip(retry, again):
+            results[i] = r
+    return results
+
+
+async def _route_batch(queries: List[str], timeout: float, trace: Optional[bool]) -> List[Dict[str, Any]]:
+    traced = tracing.enabled() if trace is None else trace
+    rag_only = [] if traced else [i for i, q in enumerate(queries) if q.strip() and intent_route(q.strip()) == "rag"]
+    skip = set(rag_only)
+    others = [i for i in range(len(queries)) if i not in skip]
+    batched, *singles = await asyncio.gather(
+        _route_rag_batch([queries[i] for i in rag_only], timeout),
+        *(_route_one(queries[i], timeout, trace) for i in others),
+    )
+    results: List[Any] = [None] * len(queries)
+    for i, r in zip(rag_only + others, list(batched) + singles):
+        results[i] = r
+    return results
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    server: "PooledHTTPServer"
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    def _send(self, code: int, body: Dict[str, Any]) -> None:
+        data = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self) -> Optional[Dict[str, Any]]:
+        try:
+            n = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            n = -1
+        if n < 0 or n > self.server.max_body_bytes:
+            self.close_connection = True  # body left unread
+            self._send(413 if n > 0 else 400, {"error": "missing or oversized body"})
+            return None
+        try:
+            body = json.loads(self.rfile.read(n) or b"{}")
+        except ValueError as e:
+            self._send(400, {"error": f"invalid JSON: {e}"})
+            return None
+        if not isinstance(body, dict):
+            self._send(400, {"error": "body must be a JSON object"})
+            return None
+        return body
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/healthz":
+            return self._send(404, {"error": "not found"})
+        ok, status = self.server.warmup.status()
+        self._send(200 if ok else 503, status)
+
+    def do_POST(self):
+        path = self.path.split("?", 1)[0]
+        if path not in {"/route", "/route/batch"}:
+            return self._send(404, {"error": "not found"})
+        body = self._body()
+        if body is None:
+            return
+        srv = self.server
+        trace = body.get("trace")
+        trace = None if trace is None else bool(trace)
+
+        if path == "/route":
+            query = body.get("query", body.get("question"))
+            if not isinstance(query, str):
+                return self._send(400, {"error": "'query' must be a string"})
+            try:
+                result = srv.loop.run(_route_one(query, srv.request_timeout_s, trace),
+                                      srv.request_timeout_s + 1.0)
+            except FutureTimeout:
+                return self._send(504, {"error": f"timeout after {srv.request_timeout_s}s"})
+            return self._send(504 if "request" in result.get("timed_out", []) else 200, result)
+
+        queries = body.get("queries")
+        if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+            return self._send(400, {"error": "'queries' must be a list of strings"})
+        if len(queries) > srv.max_batch:
+            return self._send(413, {"error": f"at most {srv.max_batch} queries per batch"})
+        try:
+            results = srv.loop.run(_route_batch(queries, srv.request_timeout_s, trace),
+                                   srv.request_timeout_s + 1.0)
+        except FutureTimeout:
+            return self._send(504, {"error": f"timeout after {srv.request_timeout_s}s"})
+        self._send(200, {"results": results})
+
+    def do_PUT(self):
+        self._send(405, {"error": "method not allowed"})
+
+    do_DELETE = do_PATCH = do_PUT
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer whose connections run on a fixed thread pool instead of a thread each."""
+
+    daemon_threads = True
+
+    def __init__(self, addr, handler, *, workers: int, backlog: int, keepalive_timeout_s: float,
+                 request_timeout_s: float, max_batch: int, max_body_bytes: int,
+                 warmup: Warmup, verbose: bool = False):
+        # idle keep-alive connections give their worker back after keepalive_timeout_s
+        handler = type(handler.__name__, (handler,), {"timeout": keepalive_timeout_s})
+        super().__init__(addr, handler)
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="http")
+        self.slots = threading.BoundedSemaphore(workers + backlog)
+        self.loop = LoopThread("route-loop")  # one loop for all requests
+        self.warmup = warmup
+        self.request_timeout_s = request_timeout_s
+        self.max_batch = max_batch
+        self.max_body_bytes = max_body_bytes
+        self.verbose = verbose
+
+    def process_request(self, request, client_address):
+        if not self.slots.acquire(blocking=False):
+            try:
+                request.sendall(_BUSY)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        self.pool.submit(self._serve, request, client_address)
+
+    def _serve(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.loop.stop()
+
+
+def make_server(host: Optional[str] = None, port: Optional[int] = None, workers: Optional[int] = None,
+                allow_degraded: Optional[bool] = None, verbose: bool = False) -> PooledHTTPServer:
+    sec = get_config().section("server")
+    if allow_degraded is None:
+        allow_degraded = bool(sec.get("allow_degraded", False))
+    workers = workers or int(sec.get("workers", 8))
+    return PooledHTTPServer(
+        (host or sec.get("host", "127.0.0.1"), int(sec.get("port", 8080) if port is None else port)),
+        Handler,
+        workers=workers,
+        backlog=int(sec.get("backlog", 2 * workers)),
+        keepalive_timeout_s=float(sec.get("keepalive_timeout_s", 5.0)),
+        request_timeout_s=float(sec.get("request_timeout_s", 30.0)),
+        max_batch=int(sec.get("max_batch", 64)),
+        max_body_bytes=int(sec.get("max_body_bytes", 1 << 20)),
+        warmup=Warmup(allow_degraded).start(),
+        verbose=verbose,
+    )
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Headless JSON API for router.route.")
+    ap.add_argument("--host")
+    ap.add_argument("--port", type=int)
+    ap.add_argument("--workers", type=int, help="connection worker threads")
+    ap.add_argument("--allow-degraded", action="store_true", default=None,
+                    help="report ready on BM25 alone when vector retrieval can't load")
+    ap.add_argument("--verbose", action="store_true", help="log every request")
+    args = ap.parse_args(argv)
+
+    srv = make_server(args.host, args.port, args.workers, args.allow_degraded, args.verbose)
+    host, port = srv.server_address[:2]
+    print(f"Serving on http://{host}:{port} (POST /route, POST /route/batch, GET /healthz)")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+# tests/conftest.py — make the project root importable (rag/, tools/, router.py) under plain `pytest`
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,96 @@
+# tests/test_answer_cache.py — exact / semantic tiers, per-route TTL and LRU eviction
+import numpy as np
+
+from rag.answer_cache import AnswerCache, normalize_query
+
+
+class Clock:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self):
+        return self.t
+
+
+def _result(route="rag", answer="a"):
+    return {"route": route, "rag": {"answer": answer}}
+
+
+def test_normalize_keeps_symbols():
+    assert normalize_query("  What  is a Data Analyst?? ") == "what is a data analyst"
+    assert normalize_query("Average salary for a C# developer?") != \
+        normalize_query("Average salary for a C++ developer?")
+    assert normalize_query(".NET developer salary!") == ".net developer salary"
+
+
+def test_exact_tier_hit_and_copy():
+    cache = AnswerCache()
+    cache.put("What does a DBA do?", _result(answer="dba"))
+    hit = cache.get("what does a dba do")
+    assert hit["rag"]["answer"] == "dba" and hit["cache"] == "exact"
+    hit["rag"]["answer"] = "mutated"
+    assert cache.get("What does a DBA do?")["rag"]["answer"] == "dba"
+    assert cache.stats["exact_hits"] == 2
+
+
+def test_exact_tier_separates_csharp_and_cplusplus():
+    cache = AnswerCache()
+    cache.put("Average salary for a C# developer?", _result("salary", "csharp"))
+    assert cache.get("Average salary for a C++ developer?") is None
+    cache.put("Average salary for a C++ developer?", _result("salary", "cpp"))
+    assert cache.get("average salary for a c# developer")["rag"]["answer"] == "csharp"
+    assert cache.get("average salary for a c++ developer")["rag"]["answer"] == "cpp"
+
+
+def test_semantic_tier():
+    vecs = {
+        "what does a network engineer do": np.array([1.0, 0.0, 0.0]),
+        "describe the network engineer role": np.array([0.99, 0.05, 0.0]),
+        "what does a chef do": np.array([0.0, 1.0, 0.0]),
+    }
+    cache = AnswerCache(semantic_threshold=0.95, embed=lambda q: vecs.get(normalize_query(q)))
+    cache.put("What does a network engineer do", _result(answer="net"))
+    hit = cache.get("Describe the network engineer role")
+    assert hit["cache"] == "semantic" and hit["rag"]["answer"] == "net"
+    assert cache.get("What does a chef do") is None
+
+
+def test_ttl_per_route():
+    clock = Clock()
+    cache = AnswerCache(ttl_s={"rag": 100, "salary": 10, "both": 0}, clock=clock)
+    cache.put("role question", _result("rag"))
+    cache.put("salary question", _result("salary"))
+    cache.put("both question", _result("both"))  # ttl 0: never stored
+    assert len(cache) == 2
+    clock.t += 11
+    assert cache.get("salary question") is None
+    assert cache.get("role question") is not None
+    clock.t += 90
+    assert cache.get("role question") is None
+    assert cache.stats["expired"] == 2
+
+
+def test_lru_eviction():
+    cache = AnswerCache(max_entries=2)
+    cache.put("q1", _result(answer="1"))
+    cache.put("q2", _result(answer="2"))
+    assert cache.get("q1") is not None  # q2 is now least recently used
+    cache.put("q3", _result(answer="3"))
+    assert cache.get("q2") is None
+    assert cache.get("q1") is not None and cache.get("q3") is not None
+    assert cache.stats["evictions"] == 1
+
+
+def test_semantic_tier_requires_same_route():
+    vecs = {
+        "what is the role of a registered nurse": np.array([1.0, 0.0, 0.0]),
+        "what is the role and salary of a registered nurse": np.array([0.98, 0.1, 0.0]),
+        "describe the role of a registered nurse": np.array([0.99, 0.05, 0.0]),
+    }
+    routes = lambda q: "both" if "salary" in q.lower() else "rag"
+    cache = AnswerCache(semantic_threshold=0.95, embed=lambda q: vecs.get(normalize_query(q)),
+                        route_of=routes)
+    cache.put("What is the role of a registered nurse?", _result("rag", "role"))
+    assert cache.get("What is the role and salary of a registered nurse?") is None
+    hit = cache.get("Describe the role of a registered nurse")
+    assert hit["cache"] == "semantic" and hit["rag"]["answer"] == "role"
@@ -0,0 +1,27 @@
+# tests/test_embed_cache.py — disk query-embedding cache keys and round trips
+import numpy as np
+
+from rag.embed_cache import EmbeddingCache, query_key
+
+
+def test_key_keeps_symbols():
+    assert query_key("m", "C# developer") != query_key("m", "C++ developer")
+    assert query_key("m", ".NET developer") != query_key("m", "NET developer")
+    assert query_key("m", "  Data   Analyst ") == query_key("m", "data analyst")
+    assert query_key("m", "data analyst") != query_key("other", "data analyst")
+
+
+def test_round_trip_and_no_cross_hits(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "m", capacity=4)
+    cpp = np.arange(8, dtype=np.float32)
+    cache.put("c++ developer", cpp)
+    assert cache.get("c# developer") is None
+    np.testing.assert_array_equal(cache.get("C++  Developer"), cpp)
+
+
+def test_lru_overwrite_at_capacity(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "m", capacity=2)
+    for i, q in enumerate(["a", "b", "c"]):
+        cache.put(q, np.full(4, i, dtype=np.float32))
+    assert len(cache) == 2 and cache.stats["evictions"] == 1
+    assert cache.get("c") is not None
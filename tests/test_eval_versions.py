@@ -0,0 +1,22 @@
+# tests/test_eval_versions.py — eval answer-cache keys follow the config each kind of case reads
+from eval.evaluate import index_version
+from rag.config import get_config, parse_settings
+
+
+def _with(section, value):
+    raw = dict(get_config().raw)
+    raw[section] = value
+    return parse_settings(raw)
+
+
+def test_routing_change_only_invalidates_route_cases():
+    base = get_config()
+    changed = _with("routing", {"rag_timeout_s": 1.0})
+    assert index_version(base, "rag") == index_version(changed, "rag")
+    assert index_version(base, "route") != index_version(changed, "route")
+
+
+def test_cache_section_is_part_of_route_version():
+    base = get_config()
+    changed = _with("cache", {"enabled": False})
+    assert index_version(base, "route") != index_version(changed, "route")
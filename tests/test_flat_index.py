@@ -0,0 +1,39 @@
+# tests/test_flat_index.py — distance space detection and query contract of the flat export
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from rag.flat_index import FlatIndex, collection_space, write_index
+
+
+def test_space_from_chroma1_configuration():
+    col = SimpleNamespace(configuration={"hnsw": {"space": "cosine", "ef_search": 100}}, metadata=None)
+    assert collection_space(col) == "cosine"
+    col = SimpleNamespace(configuration_json={"vector_index": {"hnsw": {"space": "ip"}}}, metadata={})
+    assert collection_space(col) == "ip"
+
+
+def test_space_falls_back_to_metadata():
+    assert collection_space(SimpleNamespace(configuration={}, metadata={"hnsw:space": "cosine"})) == "cosine"
+    assert collection_space(SimpleNamespace(metadata=None)) == "l2"
+
+
+@pytest.fixture
+def cosine_index(tmp_path):
+    vecs = np.array([[1.0, 0.0], [0.0, 2.0], [3.0, 3.0]], dtype=np.float32)
+    ids = ["a", "b", "c"]
+    batches = [(ids, vecs.tolist(), ["doc a", "doc b", "doc c"], [{"source": i} for i in ids])]
+    write_index(str(tmp_path / "flat"), batches, 3, space="cosine")
+    return FlatIndex(str(tmp_path / "flat"), ann="exact")
+
+
+def test_cosine_distances(cosine_index):
+    got = cosine_index.query(query_embeddings=[[2.0, 0.0]], n_results=3)
+    assert got["ids"][0] == ["a", "c", "b"]
+    np.testing.assert_allclose(got["distances"][0], [0.0, 1.0 - np.sqrt(0.5), 1.0], atol=1e-6)
+
+
+def test_where_rejected(cosine_index):
+    with pytest.raises(ValueError, match="metadata filters"):
+        cosine_index.query(query_embeddings=[[1.0, 0.0]], where={"source": "a"})
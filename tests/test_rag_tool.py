@@ -0,0 +1,21 @@
+# tests/test_rag_tool.py — role-index failures fall back to retrieval, single and batched
+from tools import rag_tool
+
+
+def _broken_role_index(query):
+    raise OSError("roles.json unreadable")
+
+
+def test_batch_falls_back_per_query(monkeypatch):
+    monkeypatch.setattr(rag_tool, "role_answer", _broken_role_index)
+    monkeypatch.setattr(rag_tool, "search_many", lambda qs: [[] for _ in qs])
+    monkeypatch.setattr(rag_tool, "_answer_from_hits", lambda q, hits, cfg: {"answer": q, "used": True})
+    out = rag_tool.answer_with_rag_batch(["q1", "q2"])
+    assert [r["answer"] for r in out] == ["q1", "q2"]
+
+
+def test_single_falls_back(monkeypatch):
+    monkeypatch.setattr(rag_tool, "role_answer", _broken_role_index)
+    monkeypatch.setattr(rag_tool, "search", lambda q: [])
+    monkeypatch.setattr(rag_tool, "_answer_from_hits", lambda q, hits, cfg: {"answer": q, "used": True})
+    assert rag_tool.answer_with_rag("q1")["answer"] == "q1"
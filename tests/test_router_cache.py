@@ -0,0 +1,50 @@
+# tests/test_router_cache.py — failed tool branches are never written to the answer cache
+import pytest
+
+import router
+from rag.answer_cache import AnswerCache
+
+BOTH_QUERY = "Describe the role of a data analyst and the average salary"
+RAG_OK = {"answer": "analyses data", "citations": [], "used": True, "score": 0.9}
+
+
+@pytest.fixture
+def fresh_cache(monkeypatch):
+    cache = AnswerCache()
+    monkeypatch.setattr(router, "answer_cache", lambda: cache)
+    monkeypatch.setattr(router, "answer_with_rag", lambda q, on_citations=None: dict(RAG_OK))
+    return cache
+
+
+def test_both_route_salary_exception_not_cached(monkeypatch, fresh_cache):
+    async def broken_salary(query):
+        raise ConnectionError("search backend down")
+
+    monkeypatch.setattr(router, "asalary_tool", broken_salary)
+    result = router.route(BOTH_QUERY)
+    assert result["route"] == "both" and "error" in result["tools"][0]
+    assert len(fresh_cache) == 0
+
+
+def test_both_route_salary_output_error_not_cached(monkeypatch, fresh_cache):
+    async def erroring_salary(query):
+        return {"estimate_aud": None, "error": "RuntimeError: no results"}
+
+    monkeypatch.setattr(router, "asalary_tool", erroring_salary)
+    assert router.route(BOTH_QUERY)["route"] == "both"
+    assert len(fresh_cache) == 0
+
+
+def test_both_route_success_cached(monkeypatch, fresh_cache):
+    async def ok_salary(query):
+        return {"estimate_aud": 90000, "error": None}
+
+    monkeypatch.setattr(router, "asalary_tool", ok_salary)
+    router.route(BOTH_QUERY)
+    assert router.route(BOTH_QUERY)["cache"] == "exact"
+
+
+def test_cacheable_checks_salary_route_output():
+    assert not router._cacheable({"route": "salary", "tool": {"name": "salary_tool",
+                                                              "output": {"error": "timeout"}}})
+    assert router._cacheable({"route": "salary", "tool": {"name": "salary_tool", "output": {"error": None}}})
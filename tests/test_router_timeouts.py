@@ -0,0 +1,36 @@
+# tests/test_router_timeouts.py — route() returns when aroute does, even with a branch still running
+import time
+
+import pytest
+
+import router
+from rag.config import parse_settings
+
+
+@pytest.fixture
+def short_rag_timeout(monkeypatch):
+    cfg = parse_settings({"routing": {"rag_timeout_s": 0.3, "salary_timeout_s": 0.3}})
+    monkeypatch.setattr(router, "get_config", lambda: cfg)
+
+
+def test_sync_route_does_not_wait_for_timed_out_rag(monkeypatch, short_rag_timeout):
+    def slow_rag(query, on_citations=None):
+        time.sleep(2.0)
+        return {"answer": "late", "citations": [], "used": True, "score": 1.0}
+
+    monkeypatch.setattr(router, "answer_with_rag", slow_rag)
+    t0 = time.perf_counter()
+    result = router.route("What does an ICT project manager do?", cache=False)
+    elapsed = time.perf_counter() - t0
+
+    assert result["partial"] is True and result["timed_out"] == ["rag"]
+    assert elapsed < 1.0
+
+
+def test_route_inside_running_loop():
+    import asyncio
+
+    async def call():
+        return router.route("", cache=False)
+
+    assert asyncio.run(call())["error"] == "empty query"
@@ -0,0 +1,102 @@
+# tests/test_salary_hedging.py — hedged salary search against local stub backends
+import asyncio
+import threading
+import time
+
+import pytest
+
+import router
+from rag import tracing
+from tools import salary_tool as st
+
+FAST_RESULT = [{"title": "Software Engineer salary", "href": "https://example.au", "body": "Average $120,000 per year"}]
+
+
+def slow_backend(q, max_results):
+    time.sleep(2.0)
+    return [{"title": "slow", "href": "", "body": "$99,000"}]
+
+
+def fast_backend(q, max_results):
+    return list(FAST_RESULT)
+
+
+def failing_backend(q, max_results):
+    raise ConnectionError("rate limited")
+
+
+@pytest.fixture
+def stub_backends(monkeypatch):
+    monkeypatch.setattr(st, "_salary_cache", lambda: None)
+
+    def use(*backends):
+        monkeypatch.setattr(st, "default_backends", lambda: list(backends))
+    return use
+
+
+def test_hedge_wins_on_sync_route(stub_backends):
+    stub_backends(("slow", slow_backend), ("fast", fast_backend))
+    t0 = time.perf_counter()
+    result = router.route("Average salary for a software engineer", cache=False)
+    elapsed = time.perf_counter() - t0
+
+    assert result["route"] == "salary"
+    out = result["tool"]["output"]
+    assert out["ddg_impl"] == "fast" and out["estimate_aud"] == 120000
+    assert elapsed < 1.5  # hedge delay (0.4s) + fast backend, not the 2s slow one
+
+
+def test_failure_launches_next_backend_immediately():
+    t0 = time.perf_counter()
+    results, name = asyncio.run(st.ahedged_search(
+        "q", backends=[("bad", failing_backend), ("fast", fast_backend)], hedge_delay_s=5.0))
+    assert name == "fast" and results == FAST_RESULT
+    assert time.perf_counter() - t0 < 1.0
+
+
+def test_all_backends_failing_raises():
+    with pytest.raises(RuntimeError, match="rate limited"):
+        asyncio.run(st.ahedged_search("q", backends=[("bad", failing_backend)], hedge_delay_s=0.1))
+
+
+@pytest.fixture
+def trace_file(tmp_path):
+    # keep test traces out of logs/traces.jsonl; back to config-driven exporting afterwards
+    path = tmp_path / "traces.jsonl"
+    tracing.set_exporter(tracing.JsonlExporter(str(path)))
+    yield path
+    tracing._EXPORTER = None
+    tracing._EXPORTER_KEY = None
+
+
+def test_hedge_attempts_in_route_trace(stub_backends, trace_file):
+    stub_backends(("slow", slow_backend), ("fast", fast_backend))
+    result = router.route("Average salary for a software engineer", trace=True, cache=False)
+    hedge = next(s for s in result["trace"]["spans"] if s["stage"] == "salary.hedge")
+    assert hedge["winner"] == "fast"
+    assert [(a["backend"], a["outcome"]) for a in hedge["attempts"]] == [("slow", "cancelled"), ("fast", "ok")]
+    assert trace_file.exists()
+
+
+def test_cache_io_runs_off_the_event_loop(monkeypatch):
+    calls = []
+
+    class RecordingCache:
+        ttl_s = 3600
+
+        def get(self, key):
+            calls.append(("get", threading.get_ident()))
+            return None
+
+        def put(self, key, value):
+            calls.append(("put", threading.get_ident()))
+
+    async def call():
+        main = threading.get_ident()
+        await st.asalary_tool("Average salary for a software engineer", backends=[("fast", fast_backend)])
+        return main
+
+    monkeypatch.setattr(st, "_salary_cache", lambda: RecordingCache())
+    main = asyncio.run(call())
+    assert [op for op, _ in calls] == ["get", "put"]
+    assert all(tid != main for _, tid in calls)
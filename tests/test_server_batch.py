@@ -0,0 +1,66 @@
+# tests/test_server_batch.py — RAG-only queries in a batch share one retrieval, with per-query fallback
+import asyncio
+
+import pytest
+
+import router
+import server
+from rag import tracing
+
+ROLE_Q = ["What does a data analyst do?", "Describe the role of a nurse"]
+SALARY_Q = "Average salary for a software engineer"
+
+
+def _rag(q, error=None):
+    return {"answer": f"answer: {q}", "citations": [], "used": True, "score": 0.9, "error": error}
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    seen = {"batch": [], "single": [], "salary": []}
+
+    def batch(queries):
+        seen["batch"].append(list(queries))
+        return [_rag(q, "chroma down" if "nurse" in q else None) for q in queries]
+
+    def single(query, on_citations=None):
+        seen["single"].append(query)
+        return _rag(query)
+
+    async def salary(query):
+        seen["salary"].append(query)
+        return {"estimate_aud": 100000, "error": None}
+
+    monkeypatch.setattr(router, "answer_with_rag_batch", batch)
+    monkeypatch.setattr(router, "answer_with_rag", single)
+    monkeypatch.setattr(router, "asalary_tool", salary)
+    monkeypatch.setattr(router, "answer_cache", lambda: None)
+    return seen
+
+
+def test_rag_only_queries_share_one_batch(calls):
+    results = asyncio.run(server._route_batch(ROLE_Q + [SALARY_Q], 5.0, False))
+    assert calls["batch"] == [ROLE_Q]
+    assert calls["salary"] == [SALARY_Q]
+    assert [r["route"] for r in results] == ["rag", "rag", "salary"]
+    assert results[0]["rag"]["answer"] == "answer: What does a data analyst do?"
+
+
+def test_failed_batch_entry_retried_alone(calls):
+    results = asyncio.run(server._route_batch(ROLE_Q, 5.0, False))
+    assert calls["single"] == ["Describe the role of a nurse"]
+    assert results[1]["rag_error"] is None and results[1]["rag"]["answer"] == "answer: Describe the role of a nurse"
+
+
+@pytest.fixture
+def no_export():
+    tracing.set_exporter(None)
+    yield
+    tracing._EXPORTER = None
+    tracing._EXPORTER_KEY = None
+
+
+def test_traced_batch_routes_each_query(calls, no_export):
+    results = asyncio.run(server._route_batch(ROLE_Q, 5.0, True))
+    assert calls["batch"] == [] and sorted(calls["single"]) == sorted(ROLE_Q)
+    assert all("trace" in r for r in results)
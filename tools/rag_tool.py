@@ -4,9 +4,7 @@ from __future__ import annotations
 import os
 import re
 import traceback
-from typing import Any, Dict, List
-
-import yaml
+from typing import Any, Dict, List, Optional
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 os.chdir(BASE_DIR)
@@ -16,7 +14,10 @@ from rag.generate import (
     make_answer_from_hits,
     render_answer_with_citations,
 )
-from rag.search import search
+from rag import tracing
+from rag.config import get_config
+from rag.roles import role_answer
+from rag.search import search, search_many
 
 # --- NEW: robust extractor for "Main tasks / duties / responsibilities" ---
 TASK_HINTS = re.compile(
@@ -74,164 +75,218 @@ def _compose_tasks_answer(tasks: List[str], citations: List[Dict[str, Any]]) ->
 
 
 # tools/rag_tool.py
-def answer_with_rag(query: str) -> Dict[str, Any]:
-    try:
-        cfg = yaml.safe_load(open("config.yml", "r", encoding="utf-8"))
-        hits = search(query)
-        if not hits:
-            return {
-                "answer": "No relevant passages found.",
-                "citations": [],
-                "used": True,
-                "score": 0.0,
-            }
-
-        top = float(hits[0].get("score", 0.0))
-        context, cits = build_context_and_citations(hits)
-
-        # 1) Try the standard structured renderer first (works great when vectors are available)
-        points = make_answer_from_hits(hits)
-        answer = render_answer_with_citations(points, cits)
-
-        # --------------------------------------------------------------------
-        # 2) Robust task extractor operating on COMBINED CONTEXT (top hits)
-        TASKY_Q = re.search(
-            r"(main\s*tasks?|dut(?:y|ies)|responsibilit(?:y|ies)|key\s*tasks?|core\s*duties?)",
-            query,
-            re.IGNORECASE,
+def _error_result(e: Exception) -> Dict[str, Any]:
+    tb = traceback.format_exc(limit=3)
+    return {
+        "answer": "",
+        "citations": [],
+        "used": False,
+        "score": 0.0,
+        "error": f"{type(e).__name__}: {e}",
+        "trace": tb,
+    }
+
+
+def _answer_from_hits(query: str, hits: List[Dict[str, Any]], cfg) -> Dict[str, Any]:
+    if not hits:
+        return {
+            "answer": "No relevant passages found.",
+            "citations": [],
+            "used": True,
+            "score": 0.0,
+        }
+
+    top = float(hits[0].get("score", 0.0))
+    context, cits = build_context_and_citations(hits)
+
+    # 1) Try the standard structured renderer first (works great when vectors are available)
+    points = make_answer_from_hits(hits)
+    answer = render_answer_with_citations(points, cits)
+
+    # --------------------------------------------------------------------
+    # 2) Robust task extractor operating on COMBINED CONTEXT (top hits)
+    TASKY_Q = re.search(
+        r"(main\s*tasks?|dut(?:y|ies)|responsibilit(?:y|ies)|key\s*tasks?|core\s*duties?)",
+        query,
+        re.IGNORECASE,
+    )
+
+    def normalize_bullets(s: str) -> str:
+        # unify common bullet/separator characters to " * "
+        s = s.replace("•", " * ")
+        s = s.replace("·", " * ")
+        s = s.replace("‧", " * ")
+        s = s.replace("∙", " * ")
+        s = re.sub(r"[–—\-]{2,}", " - ", s)  # long dash runs
+        return s
+
+    def extract_tasks_global(txt: str) -> list[str]:
+        t = normalize_bullets(txt)
+
+        # Try to zoom into "Main tasks" (tolerate odd spacing)
+        m = re.search(
+            r"(?is)m\s*a\s*i\s*n\s*[\s\-–—]*\s*t\s*a\s*s\s*k\s*s?\s*[:\-–—]?\s*(.+)",
+            t,
         )
+        section = m.group(1).strip() if m else t
 
-        def normalize_bullets(s: str) -> str:
-            # unify common bullet/separator characters to " * "
-            s = s.replace("•", " * ")
-            s = s.replace("·", " * ")
-            s = s.replace("‧", " * ")
-            s = s.replace("∙", " * ")
-            s = re.sub(r"[–—\-]{2,}", " - ", s)  # long dash runs
-            return s
-
-        def extract_tasks_global(txt: str) -> list[str]:
-            t = normalize_bullets(txt)
-
-            # Try to zoom into "Main tasks" (tolerate odd spacing)
-            m = re.search(
-                r"(?is)m\s*a\s*i\s*n\s*[\s\-–—]*\s*t\s*a\s*s\s*k\s*s?\s*[:\-–—]?\s*(.+)",
-                t,
+        # First pass: split on asterisks
+        parts = re.split(r"\*\s+", section)
+        parts = [p.strip(" -•\n\r\t .") for p in parts if p.strip()]
+        # Filter obviously non-task lines
+        parts = [
+            p
+            for p in parts
+            if len(p.split()) >= 3
+            and not p.lower().startswith(
+                ("business analysts (non", "business analysts (non-")
             )
-            section = m.group(1).strip() if m else t
+        ]
 
-            # First pass: split on asterisks
-            parts = re.split(r"\*\s+", section)
-            parts = [p.strip(" -•\n\r\t .") for p in parts if p.strip()]
-            # Filter obviously non-task lines
+        # If too few, try line-bullets
+        if len(parts) <= 1:
+            bullets = re.findall(r"(?m)^[\-\•\*]\s+(.+)$", section)
+            parts = [b.strip(" -•\n\r\t .") for b in bullets if len(b.split()) >= 3]
+
+        # Last resort: sentence split, keep plausible task-like clauses
+        if len(parts) <= 1:
+            sents = re.split(r"(?<=[\.\!\?])\s+", section)
+            parts = [
+                s.strip() for s in sents if len(s.split()) >= 6 and len(s) <= 220
+            ]
             parts = [
                 p
                 for p in parts
-                if len(p.split()) >= 3
-                and not p.lower().startswith(
+                if not p.lower().startswith(
                     ("business analysts (non", "business analysts (non-")
                 )
             ]
 
-            # If too few, try line-bullets
-            if len(parts) <= 1:
-                bullets = re.findall(r"(?m)^[\-\•\*]\s+(.+)$", section)
-                parts = [b.strip(" -•\n\r\t .") for b in bullets if len(b.split()) >= 3]
-
-            # Last resort: sentence split, keep plausible task-like clauses
-            if len(parts) <= 1:
-                sents = re.split(r"(?<=[\.\!\?])\s+", section)
-                parts = [
-                    s.strip() for s in sents if len(s.split()) >= 6 and len(s) <= 220
-                ]
-                parts = [
-                    p
-                    for p in parts
-                    if not p.lower().startswith(
-                        ("business analysts (non", "business analysts (non-")
-                    )
-                ]
-
-            # Keep it tidy
-            parts = parts[:10]
-            return parts
-
-        def infer_role_from_hits(hs: list[dict]) -> str | None:
-            # try meta; otherwise scan lines for "273232 ICT ..." style
-            for h in hs[:6]:
-                meta_role = h.get("meta", {}).get("role_title")
-                if meta_role:
-                    return meta_role
-            pat = re.compile(r"(?m)^\s*(\d{6}\s+[A-Za-z].+)$")
-            for h in hs[:6]:
-                doc = h.get("doc") or ""
-                m = pat.search(doc)
-                if m:
-                    return m.group(1).strip()
-            return None
-
-        empty_structured = (
-            (not points)
-            or (not answer)
-            or (answer.strip() in {"**Answer:**", "**Answer:**\n"})
+        # Keep it tidy
+        parts = parts[:10]
+        return parts
+
+    def infer_role_from_hits(hs: list[dict]) -> str | None:
+        # try meta; otherwise scan lines for "273232 ICT ..." style
+        for h in hs[:6]:
+            meta_role = h.get("meta", {}).get("role_title")
+            if meta_role:
+                return meta_role
+        pat = re.compile(r"(?m)^\s*(\d{6}\s+[A-Za-z].+)$")
+        for h in hs[:6]:
+            doc = h.get("doc") or ""
+            m = pat.search(doc)
+            if m:
+                return m.group(1).strip()
+        return None
+
+    empty_structured = (
+        (not points)
+        or (not answer)
+        or (answer.strip() in {"**Answer:**", "**Answer:**\n"})
+    )
+
+    if TASKY_Q and empty_structured:
+        # Build a combined context from the top few hits so we don't miss the right chunk
+        combined = "\n\n".join([(h.get("doc") or "") for h in hits[:6]])
+        tasks = extract_tasks_global(combined)
+        if tasks:
+            lines = ["**Answer:**"]
+            maybe_role = infer_role_from_hits(hits)
+            if maybe_role:
+                lines.append(f"- {maybe_role}")
+            lines += [f"- {t}" for t in tasks]
+
+            if cits:
+                lines.append("\nReferences:")
+                for i, c in enumerate(cits, 1):
+                    src = c.get("source") or c.get("role_title") or "OSCA ICT Roles"
+                    lines.append(f"[{i}] {src} · chunk {c.get('chunk_id')}")
+            answer = "\n".join(lines)
+    # --------------------------------------------------------------------
+
+    # 3) Final safety net: stitched summary (rarely needed now)
+    if not answer or answer.strip() in {"**Answer:**", "**Answer:**\n"}:
+        stitched = []
+        for h in hits[:2]:
+            doc = (h.get("doc") or "").strip()
+            if doc:
+                stitched.append(doc[:600])
+        fallback_text = (
+            "\n\n".join(stitched).strip()
+            or "I retrieved passages, but couldn't compose a structured answer."
         )
-
-        if TASKY_Q and empty_structured:
-            # Build a combined context from the top few hits so we don't miss the right chunk
-            combined = "\n\n".join([(h.get("doc") or "") for h in hits[:6]])
-            tasks = extract_tasks_global(combined)
-            if tasks:
-                lines = ["**Answer:**"]
-                maybe_role = infer_role_from_hits(hits)
-                if maybe_role:
-                    lines.append(f"- {maybe_role}")
-                lines += [f"- {t}" for t in tasks]
-
-                if cits:
-                    lines.append("\nReferences:")
-                    for i, c in enumerate(cits, 1):
-                        src = c.get("source") or c.get("role_title") or "OSCA ICT Roles"
-                        lines.append(f"[{i}] {src} · chunk {c.get('chunk_id')}")
-                answer = "\n".join(lines)
-        # --------------------------------------------------------------------
-
-        # 3) Final safety net: stitched summary (rarely needed now)
-        if not answer or answer.strip() in {"**Answer:**", "**Answer:**\n"}:
-            stitched = []
-            for h in hits[:2]:
-                doc = (h.get("doc") or "").strip()
-                if doc:
-                    stitched.append(doc[:600])
-            fallback_text = (
-                "\n\n".join(stitched).strip()
-                or "I retrieved passages, but couldn't compose a structured answer."
-            )
-            answer = (
-                "**Answer (best-effort):**\n"
-                + fallback_text
-                + "\n\n"
-                + "References:\n"
-                + "\n".join(
-                    f"[{i+1}] {(c.get('source') or c.get('role_title') or 'OSCA ICT Roles')} · chunk {c.get('chunk_id')}"
-                    for i, c in enumerate(cits)
-                )
+        answer = (
+            "**Answer (best-effort):**\n"
+            + fallback_text
+            + "\n\n"
+            + "References:\n"
+            + "\n".join(
+                f"[{i+1}] {(c.get('source') or c.get('role_title') or 'OSCA ICT Roles')} · chunk {c.get('chunk_id')}"
+                for i, c in enumerate(cits)
             )
+        )
 
-        low_conf = float(cfg.get("low_conf_score", 0.55)) if cfg else 0.55
-        if top < low_conf:
-            answer = (
-                "⚠️ I'm not fully confident about this answer; based on retrieved snippets, it might be:\n"
-                + answer
-            )
+    low_conf = cfg.low_conf_score
+    if top < low_conf:
+        answer = (
+            "⚠️ I'm not fully confident about this answer; based on retrieved snippets, it might be:\n"
+            + answer
+        )
 
-        return {"answer": answer, "citations": cits, "used": True, "score": top}
+    return {"answer": answer, "citations": cits, "used": True, "score": top}
+
+
+def _safe_role_answer(query: str) -> Optional[Dict[str, Any]]:
+    # a broken role index only costs the shortcut: the question goes to retrieval
+    try:
+        return role_answer(query)
+    except Exception:
+        return None
+
+
+def answer_with_rag(query: str, on_citations=None) -> Dict[str, Any]:
+    """
+    `on_citations`, if given, is called with the citation list as soon as
+    retrieval returns, before the answer is composed (used for streaming).
+    """
+    try:
+        # "main tasks of <known role>": answered from the structured role index
+        with tracing.span("role_index") as sp:
+            direct = _safe_role_answer(query)
+            sp["hit"] = direct is not None
+        if direct is not None:
+            return direct
+        cfg = get_config()
+        hits = search(query)
+        if on_citations is not None:
+            on_citations(build_context_and_citations(hits)[1])
+        with tracing.span("compose", hits=len(hits)):
+            return _answer_from_hits(query, hits, cfg)
     except Exception as e:
-        tb = traceback.format_exc(limit=3)
-        return {
-            "answer": "",
-            "citations": [],
-            "used": False,
-            "score": 0.0,
-            "error": f"{type(e).__name__}: {e}",
-            "trace": tb,
-        }
+        return _error_result(e)
+
+
+def answer_with_rag_batch(queries: List[str]) -> List[Dict[str, Any]]:
+    """
+    answer_with_rag for many questions: one batched retrieval (single
+    embedding batch + single Chroma query), then per-question composition.
+    """
+    queries = list(queries)
+    out: List[Any] = [_safe_role_answer(q) for q in queries]
+    todo = [i for i, r in enumerate(out) if r is None]
+    if not todo:
+        return out
+    try:
+        cfg = get_config()
+        all_hits = search_many([queries[i] for i in todo])
+    except Exception as e:
+        for i in todo:
+            out[i] = _error_result(e)
+        return out
+    for i, hits in zip(todo, all_hits):
+        try:
+            out[i] = _answer_from_hits(queries[i], hits, cfg)
+        except Exception as e:
+            out[i] = _error_result(e)
+    return out
@@ -0,0 +1,115 @@
+# tools/salary_cache.py — on-disk (SQLite) cache for live salary lookups
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_PATH = os.path.join(BASE_DIR, "index", "salary_cache.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS salary (
+    key        TEXT PRIMARY KEY,
+    value      TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+)
+"""
+
+
+class SalaryCache:
+    """
+    Normalized salary query -> {estimate_aud, samples_used, hits}.
+
+    Entries older than `ttl_s` are still served (stale-while-revalidate);
+    get_or_refresh() hands the stale value back immediately and refreshes it
+    on a background thread, at most one refresh per key at a time.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, ttl_s: float = 24 * 3600):
+        self.path = path
+        self.ttl_s = ttl_s
+        self._inflight: set = set()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        con = self._connect()
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+            with con:
+                con.execute(_SCHEMA)
+        finally:
+            con.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # one short-lived connection per call: safe across threads and worker processes
+        return sqlite3.connect(self.path, timeout=5.0)
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """(value, age in seconds) or None."""
+        con = self._connect()
+        try:
+            row = con.execute(
+                "SELECT value, fetched_at FROM salary WHERE key = ?", (key,)
+            ).fetchone()
+        finally:
+            con.close()
+        if row is None:
+            return None
+        return json.loads(row[0]), max(0.0, time.time() - row[1])
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        con = self._connect()
+        try:
+            with con:
+                con.execute(
+                    "INSERT OR REPLACE INTO salary (key, value, fetched_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), time.time()),
+                )
+        finally:
+            con.close()
+
+    def _refresh(self, key: str, fetch: Callable[[], Dict[str, Any]], keep: Callable[[Dict[str, Any]], bool]) -> None:
+        try:
+            value = fetch()
+            if keep(value):
+                self.put(key, value)
+        except Exception:
+            pass  # the stale entry stays; the next request tries again
+        finally:
+            with self._lock:
+                self._inflight.discard(key)
+
+    def refresh_in_background(self, key: str, fetch, keep=lambda v: True) -> bool:
+        with self._lock:
+            if key in self._inflight:
+                return False
+            self._inflight.add(key)
+        threading.Thread(
+            target=self._refresh, args=(key, fetch, keep), daemon=True, name="salary-refresh"
+        ).start()
+        return True
+
+    def get_or_refresh(
+        self,
+        key: str,
+        fetch: Callable[[], Dict[str, Any]],
+        keep: Callable[[Dict[str, Any]], bool] = lambda v: True,
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        Returns (value, status) where status is "fresh", "stale" (a background
+        refresh was started) or "miss" (fetched synchronously).
+        """
+        entry = self.get(key)
+        if entry is not None:
+            value, age = entry
+            if age < self.ttl_s:
+                return value, "fresh"
+            self.refresh_in_background(key, fetch, keep)
+            return value, "stale"
+        value = fetch()
+        if keep(value):
+            self.put(key, value)
+        return value, "miss"
@@ -1,6 +1,8 @@
 from __future__ import annotations
-from typing import Dict, Any, List
-import re, time, random
+from typing import Dict, Any, List, Optional, Tuple, Callable
+import asyncio, os, re, time, random
+
+from rag import tracing
 
 # Prefer duckduckgo_search (v6.1.0) which needs 'keywords'; fall back to ddgs if needed.
 DDG_KIND = None  # "dds" | "ddgs" | None
@@ -54,42 +56,50 @@ def _extract_numbers(text: str) -> List[int]:
         except: pass
     return nums
 
-def _search_with_backoff_dds(keywords: str, max_results: int) -> List[dict]:
+def _dds_once(keywords: str, max_results: int) -> List[dict]:
     # duckduckgo_search v6.1.0 -> keywords=
+    with DDGS_DDS() as ddgs:
+        return list(ddgs.text(
+            keywords,
+            max_results=max_results,
+            region="au-en",
+            safesearch="off"
+        ))
+
+def _ddgs_once(query: str, max_results: int) -> List[dict]:
+    # ddgs -> query=
+    ddgs = DDGS_DDGS()
+    return list(ddgs.text(
+        query=query,
+        max_results=max_results,
+        region="au-en",
+        safesearch="off",
+        backend="lite"
+    ))
+
+def _search_with_backoff_dds(keywords: str, max_results: int) -> List[dict]:
     attempts = 4
     delays = [0.7, 1.4, 2.8, 5.0]
     for i in range(attempts):
         try:
-            with DDGS_DDS() as ddgs:
-                return list(ddgs.text(
-                    keywords,
-                    max_results=max_results,
-                    region="au-en",
-                    safesearch="off"
-                ))
+            return _dds_once(keywords, max_results)
         except Exception as e:
             if i == attempts - 1:
                 raise
+            tracing.note(retries=i + 1, last_error=f"{type(e).__name__}: {e}")
             time.sleep(delays[i] + random.uniform(0, 0.4))
     return []
 
 def _search_with_backoff_ddgs(query: str, max_results: int) -> List[dict]:
-    # ddgs -> query=
     attempts = 4
     delays = [0.7, 1.4, 2.8, 5.0]
     for i in range(attempts):
         try:
-            ddgs = DDGS_DDGS()
-            return list(ddgs.text(
-                query=query,
-                max_results=max_results,
-                region="au-en",
-                safesearch="off",
-                backend="lite"
-            ))
+            return _ddgs_once(query, max_results)
         except Exception as e:
             if i == attempts - 1:
                 raise
+            tracing.note(retries=i + 1, last_error=f"{type(e).__name__}: {e}")
             time.sleep(delays[i] + random.uniform(0, 0.4))
     return []
 
@@ -100,27 +110,62 @@ def _ddg_text_auto(q: str, max_results: int) -> List[dict]:
         return _search_with_backoff_ddgs(q, max_results)
     raise RuntimeError("No DDGS implementation available.")
 
-def salary_tool(query: str, region_hint: str = "Australia", max_results: int = 6) -> Dict[str, Any]:
-    q = _normalize_query(query, region_hint)
+def _summarize(results: List[dict], error: Optional[str] = None) -> Dict[str, Any]:
     hits: List[Dict[str, Any]] = []
     nums: List[int] = []
-    error = None
-    fallback_used = False
+    for r in results:
+        title = (r.get("title") or "").strip()
+        href  = (r.get("href")  or "").strip()
+        body  = (r.get("body")  or "").strip()
+        if not (title or body):
+            continue
+        hits.append({"title": title, "href": href, "body": body})
+        nums.extend(_extract_numbers(f"{title} {body}"))
+    return {
+        "estimate_aud": int(sum(nums)/len(nums)) if nums else None,
+        "samples_used": len(nums),
+        "hits": hits[:3],
+        "error": error,
+    }
+
+def _live_lookup(q: str, max_results: int) -> Dict[str, Any]:
+    with tracing.span("salary.live", impl=DDG_KIND, retries=0):
+        try:
+            return _summarize(_ddg_text_auto(q, max_results=max_results))
+        except Exception as e:
+            return _summarize([], f"{type(e).__name__}: {e}")
 
-    try:
-        results = _ddg_text_auto(q, max_results=max_results)
-        for r in results:
-            title = (r.get("title") or "").strip()
-            href  = (r.get("href")  or "").strip()
-            body  = (r.get("body")  or "").strip()
-            if not (title or body):
-                continue
-            hits.append({"title": title, "href": href, "body": body})
-            nums.extend(_extract_numbers(f"{title} {body}"))
-    except Exception as e:
-        error = f"{type(e).__name__}: {e}"
-
-    estimate = int(sum(nums)/len(nums)) if nums else None
+# only real search results are worth caching; errors are retried next time
+def _keep(v: Dict[str, Any]) -> bool:
+    return v.get("error") is None and v.get("estimate_aud") is not None
+
+_CACHE: Optional[Tuple[Any, Any]] = None  # (cache config section, SalaryCache | False)
+
+def _salary_cache():
+    """The SQLite result cache for the current tools.salary_tool.cache settings (rebuilt when they change)."""
+    global _CACHE
+    from rag.config import get_config
+    sec = get_config().section("tools", "salary_tool", "cache")
+    cached = _CACHE
+    if cached is not None and cached[0] == sec:
+        return cached[1] or None
+    from tools.salary_cache import DEFAULT_PATH, SalaryCache
+    cache: Any = False
+    if sec.get("enabled", True):
+        path = sec.get("path") or DEFAULT_PATH
+        if not os.path.isabs(path):
+            path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), path)
+        try:
+            cache = SalaryCache(path, float(sec.get("ttl_s", 24 * 3600)))
+        except Exception:
+            cache = False  # unwritable location: run uncached
+    _CACHE = (dict(sec), cache)
+    return cache or None
+
+def _compose(query: str, q: str, live: Dict[str, Any], cache_status: Optional[str],
+             impl: Optional[str] = DDG_KIND) -> Dict[str, Any]:
+    estimate = live.get("estimate_aud")
+    fallback_used = False
 
     if estimate is None:
         # fallback for common AU roles
@@ -134,9 +179,149 @@ def salary_tool(query: str, region_hint: str = "Australia", max_results: int = 6
     return {
         "query": q,
         "estimate_aud": estimate,
-        "samples_used": len(nums),
-        "hits": hits[:3],
-        "error": error,
+        "samples_used": live.get("samples_used", 0),
+        "hits": live.get("hits", []),
+        "error": live.get("error"),
         "fallback_used": fallback_used,
-        "ddg_impl": DDG_KIND
+        "ddg_impl": impl,
+        "cache": cache_status,
     }
+
+def salary_tool(query: str, region_hint: str = "Australia", max_results: int = 6) -> Dict[str, Any]:
+    q = _normalize_query(query, region_hint)
+    fetch = lambda: _live_lookup(q, max_results)
+
+    cache = _salary_cache()
+    with tracing.span("salary.lookup") as sp:
+        if cache is not None:
+            live, cache_status = cache.get_or_refresh(q, fetch, _keep)
+        else:
+            live, cache_status = fetch(), None
+        sp["cache"] = cache_status
+    return _compose(query, q, live, cache_status)
+
+# --- asyncio: hedged search across both DDG backends ------------------------
+
+Backend = Tuple[str, Callable[[str, int], Any]]
+
+def default_backends() -> List[Backend]:
+    """Installed DDG clients, preferred one first; each is a single attempt (no sleeps)."""
+    out: List[Backend] = []
+    if DDGS_DDS is not None:
+        out.append(("dds", _dds_once))
+    if DDGS_DDGS is not None:
+        out.append(("ddgs", _ddgs_once))
+    if DDG_KIND == "ddgs":
+        out.reverse()
+    return out
+
+async def _call_backend(fn: Callable[[str, int], Any], q: str, max_results: int) -> List[dict]:
+    if asyncio.iscoroutinefunction(fn):
+        return list(await fn(q, max_results))
+    # blocking clients run in a worker thread; cancelling the task abandons the
+    # thread's result but cannot interrupt the HTTP call itself
+    return list(await asyncio.to_thread(fn, q, max_results))
+
+async def ahedged_search(q: str, max_results: int = 6, backends: Optional[List[Backend]] = None,
+                         hedge_delay_s: float = 0.4, deadline_s: float = 8.0) -> Tuple[List[dict], str]:
+    """
+    Start the first backend, then the next one after `hedge_delay_s` (or as
+    soon as an earlier one fails). The first non-empty result wins and the
+    other requests are cancelled. Raises TimeoutError past `deadline_s` and
+    RuntimeError if every backend failed.
+
+    Traced as a "salary.hedge" span: one {backend, start_ms, ms, outcome}
+    entry per attempt, the errors, and the winning backend.
+    """
+    backends = default_backends() if backends is None else list(backends)
+    if not backends:
+        raise RuntimeError("No DDGS implementation available.")
+
+    with tracing.span("salary.hedge", backends=[n for n, _ in backends]) as sp:
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        deadline = t0 + deadline_s
+        pending: Dict[asyncio.Task, Dict[str, Any]] = {}
+        attempts: List[Dict[str, Any]] = []
+        errors: List[str] = []
+        queue = list(backends)
+        sp.update(attempts=attempts, errors=errors, winner=None)
+
+        def launch():
+            name, fn = queue.pop(0)
+            rec = {"backend": name, "start_ms": round((loop.time() - t0) * 1000.0, 3)}
+            attempts.append(rec)
+            pending[asyncio.ensure_future(_call_backend(fn, q, max_results))] = rec
+
+        def finish(rec: Dict[str, Any], outcome: str) -> None:
+            rec["ms"] = round((loop.time() - t0) * 1000.0 - rec["start_ms"], 3)
+            rec["outcome"] = outcome
+
+        launch()
+        try:
+            while pending:
+                now = loop.time()
+                if now >= deadline:
+                    raise asyncio.TimeoutError(f"salary search exceeded {deadline_s}s")
+                wait_for = deadline - now
+                if queue:
+                    wait_for = min(wait_for, hedge_delay_s)
+                done, _ = await asyncio.wait(pending, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    rec = pending.pop(task)
+                    name = rec["backend"]
+                    try:
+                        results = task.result()
+                    except Exception as e:
+                        errors.append(f"{name}: {type(e).__name__}: {e}")
+                        finish(rec, "error")
+                        continue
+                    if results:
+                        finish(rec, "ok")
+                        sp["winner"] = name
+                        return results, name
+                    errors.append(f"{name}: no results")
+                    finish(rec, "empty")
+                # hedge timer fired, or a backend failed: bring in the next one
+                if queue:
+                    launch()
+            raise RuntimeError("; ".join(errors) or "no results")
+        finally:
+            for task, rec in pending.items():
+                task.cancel()
+                finish(rec, "cancelled")
+
+async def asalary_tool(query: str, region_hint: str = "Australia", max_results: int = 6,
+                       backends: Optional[List[Backend]] = None,
+                       hedge_delay_s: Optional[float] = None,
+                       deadline_s: Optional[float] = None) -> Dict[str, Any]:
+    """asyncio counterpart of salary_tool: same cache and result shape, hedged live lookup."""
+    from rag.config import get_config
+    sec = get_config().section("tools", "salary_tool")
+    hedge = float(sec.get("hedge_delay_s", 0.4)) if hedge_delay_s is None else hedge_delay_s
+    deadline = float(sec.get("deadline_s", 8.0)) if deadline_s is None else deadline_s
+
+    q = _normalize_query(query, region_hint)
+    cache = _salary_cache()
+    with tracing.span("salary.cache") as sp:
+        # sqlite I/O: keep it off the event loop
+        entry = await asyncio.to_thread(cache.get, q) if cache is not None else None
+        sp["hit"] = entry is not None
+    if entry is not None:
+        live, age = entry
+        status = "fresh" if age < cache.ttl_s else "stale"
+        if status == "stale":
+            cache.refresh_in_background(q, lambda: _live_lookup(q, max_results), _keep)
+        return _compose(query, q, live, status)
+
+    impl = None
+    with tracing.span("salary.live", hedge_delay_s=hedge, deadline_s=deadline) as sp:
+        try:
+            results, impl = await ahedged_search(q, max_results, backends, hedge, deadline)
+            live = _summarize(results)
+        except Exception as e:
+            live = _summarize([], f"{type(e).__name__}: {e}")
+        sp["impl"] = impl
+    if cache is not None and _keep(live):
+        await asyncio.to_thread(cache.put, q, live)
+    return _compose(query, q, live, "miss" if cache is not None else None, impl)